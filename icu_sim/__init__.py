@@ -0,0 +1,7 @@
+'''
+Shared simulation code for the ICU resource allocation scripts
+
+Importing the package only loads NumPy; pandas and matplotlib (icu_sim.plotting) are imported on first use.
+'''
+from icu_sim.config import SimConfig
+from icu_sim.simulation import SimulationResult, run_simulation
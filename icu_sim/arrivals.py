@@ -0,0 +1,148 @@
+################################################################################################################################################
+'''
+Non-stationary arrival processes
+
+An ArrivalProcess is a minute-level intensity built from three parts:
+    daily profile (piecewise-constant buckets, interpolated knots or a sinusoid) x day-of-week factor x surges
+Arrival minutes are drawn from the whole horizon at once in NumPy: `sample` places a fixed number of arrivals
+(one multinomial draw of per-minute counts, the same distribution as n inverse-CDF draws but O(minutes + n)),
+`thinning` draws a Poisson number of arrivals by thinning a homogeneous process at the peak rate. A year of
+minute-level intensity is one 525,600-element array.
+
+    process = ArrivalProcess.from_buckets(ARRIVAL_TIMES['urgent'], weekday=(1.1, 1.0, 1.0, 1.0, 1.0, 0.85, 0.8),
+                                          surges=[Surge(start=10 * 1440, end=13 * 1440, factor=1.5, ramp=360)])
+    arrival_time = process.sample(30000, days=30, rng=np.random.default_rng(1))
+'''
+################################################################################################################################################
+import numpy as np
+################################################################################################################################################
+'''Constants'''
+MINUTES_PER_DAY = 24 * 60
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+################################################################################################################################################
+'''Helpers'''
+def _bucket_bounds(label: str):
+    '''"360 - 839" -> (360, 839)'''
+    lo, hi = label.split('-')
+    return int(lo), int(hi)
+################################################################################################################################################
+'''Surges'''
+class Surge:
+    '''Intensity multiplied by `factor` on [start, end) minutes, reached linearly over `ramp` minutes at both ends'''
+    def __init__(self, start: int, end: int, factor: float, ramp: int = 0):
+        self.start = start
+        self.end = end
+        self.factor = factor
+        self.ramp = ramp
+
+    def multiplier(self, t):
+        '''Multiplier at minutes t (array)'''
+        if self.ramp > 0:
+            # Trapezoid: 0 outside, rising over `ramp` minutes after start, falling over `ramp` minutes before end
+            weight = np.clip(np.minimum(t - self.start, self.end - t) / self.ramp, 0.0, 1.0)
+        else:
+            weight = ((t >= self.start) & (t < self.end)).astype(float)
+        return 1.0 + (self.factor - 1.0) * weight
+
+    def __repr__(self):
+        return f"Surge(start={self.start}, end={self.end}, factor={self.factor}, ramp={self.ramp})"
+################################################################################################################################################
+'''Arrival Process'''
+class ArrivalProcess:
+    daily: np.ndarray # float64 (1440,) share of a baseline day's arrivals in each minute, sums to 1
+    weekday: np.ndarray # float64 (7,) day-of-week factors, Monday first
+    surges: list # Surge
+    start_weekday: int # weekday of day 0 (0 = Monday)
+    def __init__(self, daily, weekday=None, surges=(), start_weekday: int = 0):
+        daily = np.asarray(daily, dtype=np.float64)
+        if daily.shape != (MINUTES_PER_DAY,) or daily.min() < 0 or daily.sum() <= 0:
+            raise ValueError(f"Daily profile must be {MINUTES_PER_DAY} non-negative rates with a positive sum")
+        self.daily = daily / daily.sum()
+        self.weekday = np.ones(7) if weekday is None else np.asarray(weekday, dtype=np.float64)
+        self.surges = list(surges)
+        self.start_weekday = start_weekday
+
+    # Daily profiles
+    @classmethod
+    def from_buckets(cls, buckets: dict, **kwargs):
+        '''
+        Piecewise-constant profile from the scripts' arrival_times tables ({'0-359': percent, ...}): each bucket's share
+        spread evenly over its minutes (the same distribution as the uniform day/bucket/minute draw)
+        '''
+        daily = np.zeros(MINUTES_PER_DAY)
+        for label, share in buckets.items():
+            lo, hi = _bucket_bounds(label)
+            daily[lo:hi + 1] += share / (hi - lo + 1)
+        return cls(daily, **kwargs)
+
+    @classmethod
+    def interpolated(cls, knots: dict, **kwargs):
+        '''Smooth periodic profile through {minute of day: relative rate} knots (linear between knots, wrapping midnight)'''
+        minutes = np.array(sorted(knots), dtype=np.float64)
+        rates = np.array([knots[m] for m in sorted(knots)], dtype=np.float64)
+        daily = np.interp(np.arange(MINUTES_PER_DAY), minutes, rates, period=MINUTES_PER_DAY)
+        return cls(daily, **kwargs)
+
+    @classmethod
+    def sinusoidal(cls, amplitude: float = 0.5, peak_minute: int = 0, **kwargs):
+        '''1 + amplitude * cos(...) peaking at `peak_minute`; amplitude in [0, 1]'''
+        phase = 2 * np.pi * (np.arange(MINUTES_PER_DAY) - peak_minute) / MINUTES_PER_DAY
+        return cls(1 + amplitude * np.cos(phase), **kwargs)
+
+    def with_effects(self, weekday=None, surges=None, start_weekday: int = None):
+        '''Copy with other day-of-week factors or surges'''
+        return ArrivalProcess(self.daily, self.weekday if weekday is None else weekday,
+                              self.surges if surges is None else surges,
+                              self.start_weekday if start_weekday is None else start_weekday)
+
+    def shifted(self, days: int):
+        '''The same process seen from `days` days later: day 0 of the copy is day `days` of this one'''
+        offset = days * MINUTES_PER_DAY
+        return ArrivalProcess(self.daily, self.weekday, [Surge(s.start - offset, s.end - offset, s.factor, s.ramp) for s in self.surges],
+                              (self.start_weekday + days) % 7)
+
+    # Intensity
+    def intensity(self, days: int):
+        '''Relative arrival rate of every minute in [0, days * 1440); a baseline day sums to 1'''
+        t = np.arange(days * MINUTES_PER_DAY)
+        rate = np.tile(self.daily, days) * np.repeat(self.weekday[(np.arange(days) + self.start_weekday) % 7], MINUTES_PER_DAY)
+        for surge in self.surges:
+            rate *= surge.multiplier(t)
+        return rate
+
+    # Sampling
+    def sample(self, n: int, days: int, rng=None):
+        '''
+        n arrival minutes (int64, in random order), each independently distributed as intensity / total intensity
+        Drawn as multinomial counts per minute, which avoids n random lookups into the cumulative intensity;
+        the minutes are shuffled so that the i-th arrival is not tied to the i-th patient's position in a cohort
+        '''
+        rng = np.random.default_rng() if rng is None else rng
+        rate = self.intensity(days)
+        counts = rng.multinomial(n, rate / rate.sum())
+        minutes = np.repeat(np.arange(len(rate), dtype=np.int64), counts)
+        rng.shuffle(minutes)
+        return minutes
+
+    def thinning(self, per_day: float, days: int, rng=None):
+        '''
+        Poisson arrivals with rate per_day * intensity (per_day = expected arrivals on a baseline day), by thinning:
+        candidates from a homogeneous process at the peak rate, each kept with probability rate / peak
+        Returns sorted arrival minutes (int64)
+        '''
+        rng = np.random.default_rng() if rng is None else rng
+        rate = per_day * self.intensity(days)
+        peak = rate.max()
+        candidates = rng.uniform(0, len(rate), rng.poisson(peak * len(rate)))
+        minute = candidates.astype(np.int64)
+        kept = rng.random(len(minute)) * peak < rate[minute]
+        return np.sort(minute[kept])
+
+    def __repr__(self):
+        peak = int(np.argmax(self.daily))
+        return (f"ArrivalProcess(peak minute={peak}, weekday={tuple(np.round(self.weekday, 3).tolist())}, "
+                f"surges={self.surges})")
+
+def severity_processes(arrival_times: dict, **kwargs):
+    '''{severity: ArrivalProcess.from_buckets(...)} for a scripts-style arrival_times table, sharing weekday and surge effects'''
+    return {severity: ArrivalProcess.from_buckets(buckets, **kwargs) for severity, buckets in arrival_times.items()}
@@ -0,0 +1,220 @@
+################################################################################################################################################
+'''
+Benchmark suite for the simulation engine
+
+Every benchmark times one stage of the scripts on a generated cohort: cohort generation, the utility admission loop,
+FCFS, the age-discriminated variant (age_disc_sim.py's parameters plus its per-age tallies), results writing and
+plotting. Cases are the product of benchmarks x n_day x beds x horizon. Each case runs in a fresh process, so its
+peak RSS is its own, and reports the best wall time over `repeat` runs, patients per second and peak RSS.
+
+Results can be saved as a JSON baseline and compared with a later run: any case slower (or bigger) than the
+baseline by more than the tolerance is flagged as a regression, and the CLI exits with status 1.
+
+    python -m icu_sim.benchmark --n-day 1000 10000 100000 --save baseline.json
+    python -m icu_sim.benchmark --n-day 1000 10000 100000 --compare baseline.json --tolerance 0.15
+'''
+################################################################################################################################################
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.policies import make_policy
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Constants'''
+BASELINE_FORMAT = 1
+DEFAULT_TOLERANCE = 0.10 # relative slowdown (or RSS growth) flagged as a regression
+METRICS = ('wall_s', 'patients_per_s', 'peak_rss_mb')
+SEED = 1
+################################################################################################################################################
+'''Benchmarks'''
+BENCHMARKS = {} # {name: setup(config, workdir) -> function timed by the runner}
+
+def benchmark(name: str):
+    '''Register setup(config, workdir): prepares inputs outside the timed region and returns the function to time'''
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def _cohort(config: SimConfig):
+    return config.cohort(RandomStreams(SEED))
+
+def _run(config: SimConfig, patients, *names):
+    return simulate_policies(patients, config.m, config.t_n, {name: make_policy(name, config) for name in names})
+
+@benchmark('cohort')
+def _bench_cohort(config, workdir):
+    return lambda: _cohort(config)
+
+@benchmark('utility')
+def _bench_utility(config, workdir):
+    patients = _cohort(config)
+    return lambda: _run(config, patients, 'utility')
+
+@benchmark('fcfs')
+def _bench_fcfs(config, workdir):
+    patients = _cohort(config)
+    return lambda: _run(config, patients, 'fcfs')
+
+@benchmark('age_disc')
+def _bench_age_disc(config, workdir):
+    from icu_sim.results import from_run
+    # age_disc_sim.py's stays and growth factor, at this case's scale
+    average = 24 * 60
+    config = config.replace(e=1.00181, average_minutes_in_hospital=average, std_dev_minutes=average / 2,
+                            stay_scale=(1.0, 0.6, 0.4), max_stay=average * 2)
+    patients = _cohort(config)
+    def run():
+        results = from_run(_run(config, patients, 'utility')['utility'], patients)
+        return results.crosstab('age', 'decision')
+    return run
+
+@benchmark('results')
+def _bench_results(config, workdir):
+    from icu_sim.simulation import replay
+    from icu_sim.sinks import CSVSink, ColumnarSink, TeeSink
+    patients = _cohort(config)
+    run = _run(config, patients, 'utility')['utility']
+    def write():
+        with TeeSink(CSVSink(os.path.join(workdir, 'results.csv')), ColumnarSink(os.path.join(workdir, 'results.cols'))) as sink:
+            replay(run, patients, sink)
+    return write
+
+@benchmark('plotting')
+def _bench_plotting(config, workdir):
+    import matplotlib
+    matplotlib.use('Agg')
+    from icu_sim.plotting import plot_comparison
+    from icu_sim.simulation import SimulationResult
+    patients = _cohort(config)
+    result = SimulationResult(config, patients, _run(config, patients, 'utility', 'fcfs'))
+    def plot():
+        fig = plot_comparison(result, path=os.path.join(workdir, 'comparison.png'))
+        matplotlib.pyplot.close(fig)
+    return plot
+################################################################################################################################################
+'''Runner'''
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError: # not available on Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10 # bytes on macOS, KiB on Linux
+
+def case_id(name: str, n_day: int, m: int, days: int):
+    return f"{name}[n_day={n_day},m={m},days={days}]"
+
+def run_case(name: str, n_day: int, m: int, days: int, repeat: int = 3):
+    '''Set up and time one case in this process; returns its metrics dict'''
+    config = SimConfig(m=m, n_day=n_day, days=days)
+    with tempfile.TemporaryDirectory() as workdir:
+        fn = BENCHMARKS[name](config, workdir)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    wall = min(times)
+    return {'benchmark': name, 'n_day': n_day, 'm': m, 'days': days, 'patients': config.n, 'repeat': repeat,
+            'wall_s': wall, 'patients_per_s': config.n / wall if wall > 0 else float('inf'), 'peak_rss_mb': _peak_rss_mb()}
+
+def run_benchmarks(names=None, n_day=(1000,), m=(722,), days=(30,), repeat: int = 3, isolate: bool = True, progress=None):
+    '''
+    {case id: metrics} for every benchmark x n_day x m x days
+    isolate=True runs each case in a freshly spawned process, so peak RSS is per case and earlier cases cannot
+    warm caches for later ones; progress(case_id, metrics) is called after every case
+    '''
+    names = list(BENCHMARKS) if names is None else list(names)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {sorted(unknown)}, expected some of {sorted(BENCHMARKS)}")
+    results = {}
+    for name, n, beds, horizon in itertools.product(names, n_day, m, days):
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                metrics = pool.submit(run_case, name, n, beds, horizon, repeat).result()
+        else:
+            metrics = run_case(name, n, beds, horizon, repeat)
+        key = case_id(name, n, beds, horizon)
+        results[key] = metrics
+        if progress is not None:
+            progress(key, metrics)
+    return results
+################################################################################################################################################
+'''Baselines'''
+def machine_info():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+def save_baseline(results: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump({'format': BASELINE_FORMAT, 'machine': machine_info(), 'cases': results}, f, indent=2)
+
+def load_baseline(path: str):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('format') != BASELINE_FORMAT:
+        raise ValueError(f"{path} is baseline format {baseline.get('format')}, expected {BASELINE_FORMAT}")
+    return baseline
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE, rss_tolerance: float = None):
+    '''
+    Regressions of `results` against a loaded baseline: [(case id, metric, baseline value, current value, ratio)]
+    for cases whose wall time grew by more than `tolerance` or whose peak RSS grew by more than `rss_tolerance`
+    (default: tolerance); cases missing from the baseline are skipped
+    '''
+    rss_tolerance = tolerance if rss_tolerance is None else rss_tolerance
+    regressions = []
+    for key, metrics in results.items():
+        base = baseline['cases'].get(key)
+        if base is None:
+            continue
+        for metric, limit in (('wall_s', tolerance), ('peak_rss_mb', rss_tolerance)):
+            ratio = metrics[metric] / base[metric] if base[metric] else float('nan')
+            if ratio > 1 + limit:
+                regressions.append((key, metric, base[metric], metrics[metric], ratio))
+    return regressions
+
+def format_row(key: str, metrics: dict, base: dict = None):
+    row = f"{key:<48} {metrics['wall_s']:>10.4f}s {metrics['patients_per_s']:>14,.0f} patients/s {metrics['peak_rss_mb']:>9.1f} MB"
+    if base is not None:
+        row += f"   x{metrics['wall_s'] / base['wall_s']:.2f} time, x{metrics['peak_rss_mb'] / base['peak_rss_mb']:.2f} RSS vs baseline"
+    return row
+################################################################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark cohort generation, admission loops, results writing and plotting')
+    parser.add_argument('--bench', nargs='+', choices=sorted(BENCHMARKS), default=None)
+    parser.add_argument('--n-day', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--m', type=int, nargs='+', default=[722])
+    parser.add_argument('--days', type=int, nargs='+', default=[30])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-isolate', action='store_true', help='run every case in this process')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to flag regressions against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--rss-tolerance', type=float, default=None)
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    progress = lambda key, metrics: print(format_row(key, metrics, None if baseline is None else baseline['cases'].get(key)), flush=True)
+    results = run_benchmarks(args.bench, args.n_day, args.m, args.days, args.repeat, not args.no_isolate, progress)
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"\nBaseline written to {args.save}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+        for key, metric, before, after, ratio in regressions:
+            print(f"REGRESSION {key} {metric}: {before:.4g} -> {after:.4g} (x{ratio:.2f})")
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
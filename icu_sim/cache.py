@@ -0,0 +1,207 @@
+################################################################################################################################################
+'''
+Content-addressed cache of simulation runs
+
+Entries are named after a hash of everything that determines them: the full SimConfig (bed count, thresholds,
+n_day, stay and arrival models, distribution tables), the seed of the run's RandomStreams and, for runs, the
+policy. A cohort entry holds the PatientTable drawn from (config, seed); a run entry holds one policy's totals,
+event log (the time series) and per-patient decisions, so a policy run before on the same config and seed is
+loaded instead of simulated, and new policies are simulated on the cached cohort. Sweeps store summary entries
+(the totals only) per grid point.
+
+Entries are .npz files in one directory. Reading an entry refreshes its modification time, and whenever the
+directory grows past max_bytes the least recently used entries are deleted.
+
+    cache = RunCache()
+    result = run_simulation(config, seed=42, cache=cache) # simulated once, then loaded in milliseconds
+'''
+################################################################################################################################################
+import hashlib
+import json
+import os
+import numpy as np
+from icu_sim.engine import Run
+from icu_sim.hospitals import CACHE_DIR, write_atomic
+from icu_sim.patients import PatientTable
+from icu_sim.resources import POOL_STATS
+from icu_sim.waitlist import WAITLIST_STATS
+################################################################################################################################################
+'''Constants'''
+CACHE_FORMAT = 4 # bump when entry contents or the simulation itself change, so stale entries are never read
+DEFAULT_MAX_BYTES = 512 * 2 ** 20
+RUNS_DIR = os.path.join(CACHE_DIR, 'runs')
+COHORT_FIELDS = ('severity', 'age', 'arrival_time', 'dispatch_time', 'u')
+LOG_FIELDS = ('times', 'captured', 'rejected', 'at_home', 'beds')
+TOTALS = ('total_u_captured', 'total_u_rejected', 'total_stay_at_home_u', 'total_pool_u')
+################################################################################################################################################
+'''Keys'''
+def fingerprint(value):
+    '''
+    JSON-able canonical form of a config, policy or seed: arrays by content hash, floats by exact repr, objects by
+    type and attributes (generators are skipped, they are derived from the seed)
+    '''
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, np.generic):
+        return fingerprint(value.item())
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value)
+        return {'dtype': data.dtype.str, 'shape': list(data.shape),
+                'blake2b': hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()}
+    if isinstance(value, dict):
+        return {'items': sorted([fingerprint(k), fingerprint(v)] for k, v in value.items())}
+    if isinstance(value, (list, tuple)):
+        return [fingerprint(v) for v in value]
+    if isinstance(value, np.random.SeedSequence):
+        return {'entropy': str(value.entropy), 'spawn_key': list(value.spawn_key)}
+    if isinstance(value, np.random.Generator):
+        return None
+    if hasattr(value, 'seed_sequence'): # RandomStreams
+        return fingerprint(value.seed_sequence)
+    if hasattr(value, '__dict__'):
+        return {'type': f"{type(value).__module__}.{type(value).__qualname__}",
+                'state': fingerprint({k: v for k, v in vars(value).items() if k != 'rng'})}
+    raise TypeError(f"Cannot fingerprint {type(value).__name__} for the run cache")
+
+def cache_key(kind: str, *parts):
+    text = json.dumps([CACHE_FORMAT, kind, [fingerprint(part) for part in parts]], sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+################################################################################################################################################
+'''Run Cache'''
+class RunCache:
+    directory: str
+    max_bytes: int # total size kept on disk, least recently used entries are evicted beyond it
+    def __init__(self, directory: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = RUNS_DIR if directory is None else directory
+        self.max_bytes = max_bytes
+
+    # Keys
+    def cohort_key(self, config, streams):
+        # m, e, base_threshold, the waitlist and pools do not change the cohort, so every threshold setting shares it
+        cohort_config = {k: v for k, v in vars(config).items() if k not in ('m', 'e', 'base_threshold', 'waitlist', 'pools')}
+        return cache_key('cohort', cohort_config, streams)
+
+    def run_key(self, config, streams, name, policy):
+        '''policy: registered name (built from config) or AdmissionPolicy instance; name keys its random sub-stream'''
+        return cache_key('run', config, streams, str(name), policy)
+
+    # Entries
+    def _path(self, kind: str, key: str):
+        return os.path.join(self.directory, f"{kind}-{key}.npz")
+
+    def _load(self, kind: str, key: str):
+        path = self._path(kind, key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path) # most recently used
+        except OSError:
+            pass
+        return arrays
+
+    def _save(self, kind: str, key: str, arrays: dict):
+        try:
+            write_atomic(self._path(kind, key), lambda tmp: np.savez(tmp, **arrays), suffix='.npz')
+        except OSError:
+            return
+        self.evict()
+
+    def entries(self):
+        '''[(mtime, bytes, path)] of every entry, least recently used first'''
+        found = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return found
+        for name in names:
+            if name.endswith('.npz') and '.tmp' not in name:
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        return sorted(found)
+
+    def size(self):
+        return sum(nbytes for _, nbytes, _ in self.entries())
+
+    def evict(self, max_bytes: int = None):
+        '''Delete least recently used entries until the cache fits in max_bytes (default: self.max_bytes)'''
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(nbytes for _, nbytes, _ in entries)
+        for _, nbytes, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= nbytes
+
+    def clear(self):
+        self.evict(0)
+
+    # Cohorts
+    def load_cohort(self, key: str):
+        arrays = self._load('cohort', key)
+        return None if arrays is None else PatientTable(*(arrays[name] for name in COHORT_FIELDS))
+
+    def save_cohort(self, key: str, patients):
+        self._save('cohort', key, {name: getattr(patients, name) for name in COHORT_FIELDS})
+
+    # Runs
+    def load_run(self, key: str):
+        arrays = self._load('run', key)
+        if arrays is None:
+            return None
+        run = Run(int(arrays['m']))
+        for name, value in zip(TOTALS, arrays['totals'].tolist()):
+            setattr(run, name, value)
+        run.status = arrays['status']
+        run.decision = arrays['decision']
+        run.pool_index = arrays['pool_index']
+        run.remaining_beds = arrays['remaining_beds'] if 'remaining_beds' in arrays else None
+        run.admission_time = arrays['admission_time']
+        for name in LOG_FIELDS:
+            # Kept as arrays (series() reads either), converting 10^5 events to lists would dominate a cache hit
+            setattr(run.log, name, arrays[f"log_{name}"])
+        if 'waitlist' in arrays:
+            run.waitlist = dict(zip(WAITLIST_STATS, arrays['waitlist'].tolist()))
+        run.pools = {name: dict(zip(POOL_STATS, counts), utility=recovered)
+                     for name, counts, recovered in zip(arrays['pool_names'].tolist(), arrays['pools'].tolist(), arrays['pool_utility'].tolist())}
+        return run
+
+    def save_run(self, key: str, run):
+        arrays = {'m': np.int64(run.log.m), 'totals': np.array([getattr(run, name) for name in TOTALS]),
+                  'status': run.status, 'decision': run.decision, 'pool_index': run.pool_index,
+                  'admission_time': run.admission_time}
+        if run.remaining_beds is not None:
+            arrays['remaining_beds'] = run.remaining_beds
+        if run.waitlist is not None:
+            arrays['waitlist'] = np.array([run.waitlist[name] for name in WAITLIST_STATS], dtype=np.int64)
+        arrays['pool_names'] = np.array(list(run.pools), dtype=str)
+        arrays['pools'] = np.array([[counts[name] for name in POOL_STATS] for counts in run.pools.values()], dtype=np.int64).reshape(-1, len(POOL_STATS))
+        arrays['pool_utility'] = np.array([counts['utility'] for counts in run.pools.values()], dtype=np.float64)
+        arrays['log_times'] = np.asarray(run.log.times, dtype=np.int64)
+        arrays['log_beds'] = np.asarray(run.log.beds, dtype=np.int64)
+        for name in ('captured', 'rejected', 'at_home'):
+            arrays[f"log_{name}"] = np.asarray(getattr(run.log, name), dtype=np.float64)
+        self._save('run', key, arrays)
+
+    # Summaries (totals only, e.g. sweep grid points)
+    def load_summary(self, key: str):
+        arrays = self._load('summary', key)
+        return None if arrays is None else arrays['totals']
+
+    def save_summary(self, key: str, totals):
+        self._save('summary', key, {'totals': np.asarray(totals, dtype=np.float64)})
+
+    def __repr__(self):
+        return f"RunCache({self.directory!r}, max_bytes={self.max_bytes})"
@@ -0,0 +1,144 @@
+################################################################################################################################################
+'''
+Engine checkpoints
+
+A checkpoint is one binary .npz file holding an EngineState at time t: the cohort, per-policy bed counts and
+running totals, patient status/decision arrays, event logs, the pending discharge heap, waitlist queues, resource
+pool slots and stays, the policies' generator states and the seed the cohort was drawn from. Loading it and advancing gives exactly the run that would have
+continued from t, so a run can be resumed, extended past its horizon, or forked into what-if branches that
+change policies from t onwards (see icu_sim.simulation.resume_simulation).
+
+    run_simulation(config, seed=1, checkpoint_every=24 * 60, checkpoint_dir='checkpoints')
+    state = load_checkpoint('checkpoints/checkpoint-000028800.npz')    # day 20
+'''
+################################################################################################################################################
+import json
+import os
+import numpy as np
+from array import array
+from icu_sim.engine import EngineState, EventLog
+from icu_sim.hospitals import write_atomic
+from icu_sim.patients import PatientTable
+from icu_sim.resources import ResourcePool
+from icu_sim.waitlist import Waitlist, WaitQueue
+################################################################################################################################################
+'''Constants'''
+CHECKPOINT_FORMAT = 5 # bump when the saved layout changes; only checkpoints of this format are read
+PATIENT_FIELDS = ('severity', 'age', 'arrival_time', 'dispatch_time', 'u')
+LOG_FIELDS = (('times', np.int32), ('captured', np.float64), ('rejected', np.float64), ('at_home', np.float64), ('beds', np.int32))
+################################################################################################################################################
+'''Files'''
+def checkpoint_path(directory: str, t: int):
+    return os.path.join(directory, f"checkpoint-{int(t):09d}.npz")
+
+def list_checkpoints(directory: str):
+    '''[(t, path)] of the checkpoints in `directory`, oldest first'''
+    found = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('checkpoint-') and name.endswith('.npz'):
+            found.append((int(name[len('checkpoint-'):-len('.npz')]), os.path.join(directory, name)))
+    return found
+################################################################################################################################################
+'''Save / Load'''
+def save_checkpoint(state: EngineState, path: str, compress: bool = False):
+    '''
+    Write `state` to an .npz file (atomically, via a temporary name); compress=True deflates it to about a quarter
+    of the size, at over ten times the cost of writing the raw arrays
+    '''
+    if not all(isinstance(log, EventLog) for log in state.logs):
+        raise TypeError("Only runs keeping EventLogs can be checkpointed")
+    seed = state.seed_sequence
+    meta = {
+        'format': CHECKPOINT_FORMAT, 't': state.t, 'names': [str(name) for name in state.names],
+        'capacity': state.capacity, 'beds': state.beds, 'captured': state.captured, 'rejected': state.rejected,
+        'at_home': state.at_home, 'rng_states': state.rng_states, 'days': state.days,
+        'has_remaining_beds': [r is not None for r in state.remaining_beds],
+        'waitlists': [None if q is None else {'rule': q.rule.to_dict(), 'seq': q.seq, 'admitted': q.admitted,
+                                              'reneged': q.reneged, 'longest': q.longest} for q in state.queues],
+        'pools': [pool.to_dict() for pool in state.pools], 'pool_free': state.pool_free, 'pool_placed': state.pool_placed,
+        'pool_full': state.pool_full, 'pool_utility': state.pool_utility,
+        'seed': None if seed is None else {'entropy': str(seed.entropy), 'spawn_key': list(seed.spawn_key),
+                                          'pool_size': seed.pool_size},
+    }
+    arrays = {'meta': np.array(json.dumps(meta))}
+    for name in PATIENT_FIELDS:
+        arrays[f"patients_{name}"] = getattr(state.patients, name)
+    arrays['status'] = np.array([np.frombuffer(s, dtype=np.int8) for s in state.status]).reshape(len(state.names), -1)
+    arrays['decision'] = np.array([np.frombuffer(d, dtype=np.int8) for d in state.decision]).reshape(len(state.names), -1)
+    arrays['pool_index'] = np.array([np.frombuffer(p, dtype=np.int8) for p in state.pool_index]).reshape(len(state.names), -1)
+    kept = [np.frombuffer(r, dtype=np.int32) for r in state.remaining_beds if r is not None]
+    arrays['remaining_beds'] = np.array(kept, dtype=np.int32).reshape(len(kept), len(state.patients))
+    arrays['discharges'] = np.array(state.discharges, dtype=np.int64).reshape(-1, 4) # a list in heap order is a valid heap
+    for p, stays in enumerate(state.pool_stays):
+        if stays is not None:
+            arrays[f"pool_stays_{p}"] = stays
+    # (policy index, patient index, arrival time, entry order) of every waiting patient
+    arrays['waiting'] = np.array([(k, i, t, seq) for k, q in enumerate(state.queues) if q is not None
+                                  for i, (t, seq) in q.entered.items()], dtype=np.int64).reshape(-1, 4)
+    # (policy index, patient index, admission time) of every patient admitted from a waitlist
+    arrays['admitted_at'] = np.array([(k, i, t) for k, admitted in enumerate(state.admitted_at) for i, t in admitted.items()],
+                                     dtype=np.int64).reshape(-1, 3)
+    arrays['log_lengths'] = np.array([len(log.times) for log in state.logs], dtype=np.int64)
+    for name, dtype in LOG_FIELDS:
+        arrays[f"log_{name}"] = np.concatenate([np.asarray(getattr(log, name), dtype=dtype) for log in state.logs] or [np.empty(0, dtype)])
+
+    write_atomic(path, lambda tmp: (np.savez_compressed if compress else np.savez)(tmp, **arrays), suffix='.npz')
+    return path
+
+def load_checkpoint(path: str):
+    '''EngineState saved by save_checkpoint'''
+    with np.load(path, allow_pickle=False) as saved:
+        arrays = {name: saved[name] for name in saved.files}
+    meta = json.loads(str(arrays['meta']))
+    if meta.get('format') != CHECKPOINT_FORMAT:
+        raise ValueError(f"{path} is checkpoint format {meta.get('format')}, this version only reads format {CHECKPOINT_FORMAT}")
+
+    state = EngineState.__new__(EngineState)
+    state.t = meta['t']
+    state.patients = PatientTable(*(arrays[f"patients_{name}"] for name in PATIENT_FIELDS))
+    state.names = meta['names']
+    state.capacity = meta['capacity']
+    state.beds = meta['beds']
+    state.captured = meta['captured']
+    state.rejected = meta['rejected']
+    state.at_home = meta['at_home']
+    state.status = [bytearray(row.tobytes()) for row in arrays['status']]
+    state.decision = [bytearray(row.tobytes()) for row in arrays['decision']]
+    kept = iter(arrays['remaining_beds'])
+    state.remaining_beds = [array('i', next(kept).tobytes()) if has else None for has in meta['has_remaining_beds']]
+    state.discharges = [tuple(row) for row in arrays['discharges'].tolist()]
+    # Pools come back without their stay models; resume_simulation takes them from the config
+    state.pools = tuple(ResourcePool.from_dict(params) for params in meta['pools'])
+    state.pool_free = meta['pool_free']
+    state.pool_placed = meta['pool_placed']
+    state.pool_full = meta['pool_full']
+    state.pool_utility = meta['pool_utility']
+    state.pool_stays = [arrays.get(f"pool_stays_{p}") for p in range(len(state.pools))] # only capacity-limited pools have stays
+    state.pool_index = [bytearray(row.tobytes()) for row in arrays['pool_index']]
+    state.logs = []
+    ends = np.cumsum(arrays['log_lengths']).tolist()
+    for k, (start, end) in enumerate(zip([0] + ends[:-1], ends)):
+        log = EventLog(state.capacity[k])
+        for name, _ in LOG_FIELDS:
+            setattr(log, name, arrays[f"log_{name}"][start:end].tolist())
+        state.logs.append(log)
+    state.queues = [None if params is None else WaitQueue(Waitlist.from_dict(params['rule'])) for params in meta['waitlists']]
+    waiting = arrays['waiting']
+    severity, u = state.patients.severity, state.patients.u
+    for k, i, t, seq in waiting[np.argsort(waiting[:, 3], kind='stable')].tolist():
+        # Keys are unique, so the rebuilt heaps pop in the same order as the saved ones
+        state.queues[k].push(i, t, u[i].item(), severity[i].item(), seq)
+    for queue, params in zip(state.queues, meta['waitlists']):
+        if queue is not None:
+            queue.seq, queue.admitted, queue.reneged, queue.longest = (params['seq'], params['admitted'],
+                                                                       params['reneged'], params['longest'])
+    state.admitted_at = [{} for _ in state.names]
+    for k, i, t in arrays['admitted_at'].tolist():
+        state.admitted_at[k][i] = t
+    state.rng_states = meta['rng_states'] # JSON keeps bit generator states exact (ints of any size)
+    seed = meta['seed']
+    state.seed_sequence = None if seed is None else np.random.SeedSequence(int(seed['entropy']), spawn_key=tuple(seed['spawn_key']),
+                                                                           pool_size=seed['pool_size'])
+    state.days = meta['days']
+    state._arrival_order = None
+    return state
@@ -0,0 +1,110 @@
+################################################################################################################################################
+'''
+Vectorized patient cohort generator shared by sim.py, two_way_sim.py and age_disc_sim.py
+
+The whole cohort is sampled as column arrays (severity, age, arrival, utility, stay) instead of
+one patient at a time, and returned as a columnar PatientTable.
+'''
+################################################################################################################################################
+import numpy as np
+from icu_sim.arrivals import _bucket_bounds
+from icu_sim.durations import StayModel, matched_stay_model
+from icu_sim.patients import SEVERITIES, PatientTable
+from icu_sim.streams import stream
+################################################################################################################################################
+'''Per-severity parameters (indexed by severity code)'''
+UTILITY_RANGES = ((0.66, 0.99), (0.33, 0.66), (0.0, 0.33)) # per severity
+BASE_DURATION_RANGES = ((0.4, 2.5), (0.4, 2.0), (0.4, 2.0)) # multiplier of the scaled average stay, per severity
+MIN_STAY = 30 # minutes, lower clip of the normal stay model
+################################################################################################################################################
+'''Helpers'''
+def _categorical(rng, cum_probs, size, group=None):
+    '''
+    Draw category indices against cumulative probabilities
+    cum_probs is either one row shared by every draw, or one row per group (indexed by `group`)
+    '''
+    x = rng.random(size)
+    if group is None:
+        idx = np.searchsorted(cum_probs, x, side='right')
+    else:
+        idx = np.empty(size, dtype=np.int64)
+        for g, row in enumerate(cum_probs):
+            mask = group == g
+            idx[mask] = np.searchsorted(row, x[mask], side='right')
+    return np.minimum(idx, cum_probs.shape[-1] - 1) # rows that sum to slightly under 1 fall in the last category
+
+def _bucket_arrivals(rng, arrival_times: dict, severity, days: int, n: int):
+    '''The scripts' arrival model: a uniform day, a bucket from the severity's arrival_times shares, a uniform minute in it'''
+    bucket_labels = list(arrival_times[SEVERITIES[0]].keys())
+    bucket_lo, bucket_hi = np.array([_bucket_bounds(label) for label in bucket_labels]).T
+    bucket_cum = np.cumsum([[arrival_times[s][label] for label in bucket_labels] for s in SEVERITIES], axis=1)
+    bucket = _categorical(rng, bucket_cum / 100, n, severity)
+    day = rng.integers(0, days, n)
+    daily_arrival = rng.integers(bucket_lo[bucket], bucket_hi[bucket] + 1)
+    return day * 24 * 60 + daily_arrival
+################################################################################################################################################
+'''Generator'''
+def generate_cohort(n: int, days: int, average_minutes_in_hospital: float, std_dev_minutes: float,
+                    overall_probs: dict, arrival_times: dict, distribution_data: dict,
+                    stay_scale=(1.0, 0.66, 0.33), max_stay=None, arrival_process=None, stay_model=None, rng=None):
+    '''
+    Sample n patients arriving over `days` days
+
+    overall_probs / arrival_times / distribution_data: the per-severity tables used by the scripts
+    average_minutes_in_hospital / std_dev_minutes: scalars, or per-patient arrays of length n (network cohorts)
+    stay_scale: per-severity multiplier of average_minutes_in_hospital for the base stay duration
+    max_stay: optional upper clip on stay duration (age_disc_sim.py uses 2x the average stay)
+    rng: icu_sim.streams.RandomStreams (patient attributes, arrivals and stays each from their own stream),
+         or one np.random.Generator for every draw
+    arrival_process: optional icu_sim.arrivals.ArrivalProcess, or {severity: ArrivalProcess}, replacing the uniform
+                     day / bucket / minute draw from arrival_times (time-varying rates, day-of-week effects, surges)
+    stay_model: optional length-of-stay model (icu_sim.durations) replacing the clipped normal draw:
+                'lognormal' or 'gamma' matches the normal model's per-severity mean and variance and scales with
+                average_minutes_in_hospital; a StayModel instance gives stays in minutes as it is
+    '''
+    if rng is None:
+        rng = np.random.default_rng()
+    rng_patients = stream(rng, 'patients')
+    rng_arrivals = stream(rng, 'arrivals')
+    rng_durations = stream(rng, 'durations')
+
+    # Determine urgency level
+    severity = _categorical(rng_patients, np.cumsum([overall_probs[s] for s in SEVERITIES]), n)
+
+    # Determine age group based on severity distribution
+    age_cum = np.cumsum([distribution_data[s] for s in SEVERITIES], axis=1)
+    age = _categorical(rng_patients, age_cum, n, severity)
+
+    # Determine arrival time based on arrival distribution data and day
+    if arrival_process is None:
+        arrival_time = _bucket_arrivals(rng_arrivals, arrival_times, severity, days, n)
+    else:
+        arrival_time = np.empty(n, dtype=np.int64)
+        for code, name in enumerate(SEVERITIES):
+            process = arrival_process[name] if isinstance(arrival_process, dict) else arrival_process
+            mask = severity == code
+            arrival_time[mask] = process.sample(int(mask.sum()), days, rng_arrivals)
+
+    # Determine utility
+    u_lo, u_hi = np.array(UTILITY_RANGES).T
+    u = rng_patients.uniform(u_lo[severity], u_hi[severity])
+
+    # Determine stay duration
+    if isinstance(stay_model, StayModel):
+        stay_duration = stay_model.sample(severity, age, rng_durations)
+    elif stay_model is not None:
+        std_ratio = float(np.mean(np.asarray(std_dev_minutes) / np.asarray(average_minutes_in_hospital)))
+        model = matched_stay_model(stay_model, tuple(stay_scale), BASE_DURATION_RANGES, std_ratio)
+        stay_duration = model.sample(severity, age, rng_durations, scale=average_minutes_in_hospital)
+    else:
+        d_lo, d_hi = np.array(BASE_DURATION_RANGES).T
+        base_duration = average_minutes_in_hospital * np.asarray(stay_scale)[severity] * rng_durations.uniform(d_lo[severity], d_hi[severity])
+        stay_duration = rng_durations.normal(base_duration, std_dev_minutes * 2).astype(np.int64) # truncates like int()
+
+    # Ensure stay duration is reasonable (the skewed models are already positive, so only the normal draw is clipped below)
+    if max_stay is not None:
+        stay_duration = np.minimum(stay_duration, int(max_stay))
+    if stay_model is None:
+        stay_duration = np.maximum(MIN_STAY, stay_duration)
+
+    return PatientTable(severity, age, arrival_time, arrival_time + stay_duration, u)
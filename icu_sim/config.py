@@ -0,0 +1,99 @@
+################################################################################################################################################
+'''
+Simulation parameters bundled into one picklable object, so a run can be shipped to a worker process
+Defaults match sim.py (Mass General Hospital, 30 days)
+'''
+################################################################################################################################################
+from icu_sim.cohort import generate_cohort
+################################################################################################################################################
+'''Distribution Data'''
+DISTRIBUTION_DATA = { # Per age group
+    # Severity: [0-17, 18-44, 45-64, 65+]
+    'urgent': [0.19, 0.403, 0.219, 0.188],
+    'semi_urgent': [0.283, 0.446, 0.175, 0.096],
+    'non_urgent': [0.277, 0.469, 0.173, 0.081]
+}
+
+OVERALL_PROBS = { # Overall probability of each urgency level
+    'urgent': 0.612,
+    'semi_urgent': 0.287,
+    'non_urgent': 0.101
+}
+
+ARRIVAL_TIMES = {
+    'urgent': {
+        '0-359': 43.3,
+        '360 - 839': 41.3,
+        '840 - 1439': 15.5,
+    },
+    'semi_urgent': {
+        '0-359': 43.5,
+        '360 - 839': 42.8,
+        '840 - 1439': 13.7,
+    },
+    'non_urgent': {
+        '0-359': 45.7,
+        '360 - 839': 41.3,
+        '840 - 1439': 13.0,
+    }
+}
+################################################################################################################################################
+'''Config'''
+class SimConfig:
+    m: int # number of beds
+    e: float # growth factor for acceptance threshold
+    base_threshold: float # acceptance threshold when every bed is free
+    n_day: int # patients per day
+    days: int
+    average_minutes_in_hospital: float
+    std_dev_minutes: float
+    stay_scale: tuple # per-severity multiplier of the average stay
+    max_stay: float # optional upper clip on stay duration
+    arrival_process: object # optional ArrivalProcess or {severity: ArrivalProcess} (icu_sim.arrivals)
+    stay_model: object # optional 'lognormal', 'gamma' or StayModel (icu_sim.durations) instead of the clipped normal stay
+    waitlist: object # optional Waitlist or {policy name: Waitlist} (icu_sim.waitlist) queueing patients who find no bed
+    pools: tuple # optional ResourcePools (icu_sim.resources) for rejected patients, default: the unlimited at-home program
+    def __init__(self, m: int = 722, e: float = 1.00165, base_threshold: float = 0.1, n_day: int = 1000, days: int = 30,
+                 average_minutes_in_hospital: float = 14.1 * 60, std_dev_minutes: float = None,
+                 stay_scale: tuple = (1.0, 0.66, 0.33), max_stay: float = None,
+                 overall_probs: dict = None, arrival_times: dict = None, distribution_data: dict = None,
+                 arrival_process=None, stay_model=None, waitlist=None, pools=None):
+        self.m = m
+        self.e = e
+        self.base_threshold = base_threshold
+        self.n_day = n_day
+        self.days = days
+        self.average_minutes_in_hospital = average_minutes_in_hospital
+        self.std_dev_minutes = average_minutes_in_hospital / 2 if std_dev_minutes is None else std_dev_minutes
+        self.stay_scale = stay_scale
+        self.max_stay = max_stay
+        self.overall_probs = OVERALL_PROBS if overall_probs is None else overall_probs
+        self.arrival_times = ARRIVAL_TIMES if arrival_times is None else arrival_times
+        self.distribution_data = DISTRIBUTION_DATA if distribution_data is None else distribution_data
+        self.arrival_process = arrival_process
+        self.stay_model = stay_model
+        self.waitlist = waitlist
+        self.pools = pools
+
+    @property
+    def t_n(self):
+        return 24 * 60 * self.days # total time in minutes
+
+    @property
+    def n(self):
+        return self.n_day * self.days
+
+    def replace(self, **changes):
+        '''Copy of this config with some parameters changed'''
+        params = dict(vars(self))
+        params.update(changes)
+        return SimConfig(**params)
+
+    def cohort(self, rng=None):
+        return generate_cohort(self.n, self.days, self.average_minutes_in_hospital, self.std_dev_minutes,
+                               self.overall_probs, self.arrival_times, self.distribution_data,
+                               stay_scale=self.stay_scale, max_stay=self.max_stay, arrival_process=self.arrival_process,
+                               stay_model=self.stay_model, rng=rng)
+
+    def __repr__(self):
+        return 'SimConfig(' + ', '.join(f'{k}={v!r}' for k, v in vars(self).items() if not isinstance(v, dict)) + ')'
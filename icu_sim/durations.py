@@ -0,0 +1,225 @@
+################################################################################################################################################
+'''
+Length-of-stay models
+
+A StayModel draws stay durations for a whole cohort at once, with parameters per (severity, age group) cell held
+in (3, 4) arrays indexed by SEVERITIES and AGE_GROUPS codes, so sampling is one vectorized call with no per-patient
+loop. Lognormal and gamma stays are positive and right-skewed, so no clipping is needed and no mass piles up at a
+minimum stay; an empirical model resamples observed stays of the same cell.
+
+Models are either built from moments (mean and coefficient of variation) or fitted to observed stays with
+fit_stay_model. Fitted parameters are cached in memory and in CACHE_DIR, keyed by a hash of the data.
+
+    model = LognormalStay.from_moments(mean=[1200, 600, 300], cv=0.8) # per severity, shared by age groups
+    stay = model.sample(patients.severity, patients.age, rng)
+'''
+################################################################################################################################################
+import functools
+import hashlib
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+from icu_sim.hospitals import CACHE_DIR, write_atomic
+from icu_sim.patients import SEVERITIES, AGE_GROUPS
+################################################################################################################################################
+'''Constants'''
+CELLS = (len(SEVERITIES), len(AGE_GROUPS))
+MIN_CELL_COUNT = 30 # cells with fewer observed stays are fitted from their whole severity instead
+################################################################################################################################################
+'''Helpers'''
+def _cells(values):
+    '''Broadcast a scalar, per-severity (3,) or per-cell (3, 4) parameter to a (3, 4) float64 array'''
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    return np.broadcast_to(values, CELLS).astype(np.float64)
+
+def _minutes(stay):
+    '''Continuous stays to whole minutes, at least 1'''
+    return np.maximum(np.ceil(stay), 1).astype(np.int64)
+################################################################################################################################################
+'''Stay Models'''
+class StayModel(ABC):
+    @abstractmethod
+    def sample(self, severity, age, rng=None, scale=1.0):
+        '''
+        Stay in minutes (int64) per patient; scale multiplies every stay (scalar or per-patient array, e.g. the
+        ratio of a hospital's average stay to the model's)
+        '''
+
+    @abstractmethod
+    def mean(self):
+        '''(3, 4) expected stay per cell in minutes'''
+
+class LognormalStay(StayModel):
+    mu: np.ndarray # (3, 4) mean of log stay
+    sigma: np.ndarray # (3, 4) std of log stay
+    def __init__(self, mu, sigma):
+        self.mu = _cells(mu)
+        self.sigma = _cells(sigma)
+
+    @classmethod
+    def from_moments(cls, mean, cv):
+        '''Lognormal with the given mean (minutes) and coefficient of variation per cell'''
+        sigma2 = np.log1p(_cells(cv) ** 2)
+        return cls(np.log(_cells(mean)) - sigma2 / 2, np.sqrt(sigma2))
+
+    def sample(self, severity, age, rng=None, scale=1.0):
+        rng = np.random.default_rng() if rng is None else rng
+        return _minutes(scale * np.exp(self.mu[severity, age] + self.sigma[severity, age] * rng.standard_normal(len(severity))))
+
+    def mean(self):
+        return np.exp(self.mu + self.sigma ** 2 / 2)
+
+    def __repr__(self):
+        return f"LognormalStay(mean={np.round(self.mean()[:, 0], 1).tolist()} min per severity)"
+
+class GammaStay(StayModel):
+    shape: np.ndarray # (3, 4)
+    scale: np.ndarray # (3, 4) minutes
+    def __init__(self, shape, scale):
+        self.shape = _cells(shape)
+        self.scale = _cells(scale)
+
+    @classmethod
+    def from_moments(cls, mean, cv):
+        shape = 1 / _cells(cv) ** 2
+        return cls(shape, _cells(mean) / shape)
+
+    def sample(self, severity, age, rng=None, scale=1.0):
+        rng = np.random.default_rng() if rng is None else rng
+        return _minutes(scale * rng.gamma(self.shape[severity, age], self.scale[severity, age]))
+
+    def mean(self):
+        return self.shape * self.scale
+
+    def __repr__(self):
+        return f"GammaStay(mean={np.round(self.mean()[:, 0], 1).tolist()} min per severity)"
+
+class EmpiricalStay(StayModel):
+    '''Resamples observed stays of the patient's cell (or of the whole severity for sparse cells)'''
+    values: np.ndarray # observed stays grouped by cell, cell k in values[offsets[k]:offsets[k] + counts[k]]
+    offsets: np.ndarray # (3, 4) int64
+    counts: np.ndarray # (3, 4) int64
+    def __init__(self, values, offsets, counts):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64).reshape(CELLS)
+        self.counts = np.asarray(counts, dtype=np.int64).reshape(CELLS)
+
+    @classmethod
+    def from_observations(cls, stays, severity, age, min_count: int = MIN_CELL_COUNT):
+        stays = np.asarray(stays, dtype=np.float64)
+        severity = np.asarray(severity, dtype=np.int64)
+        age = np.asarray(age, dtype=np.int64)
+        blocks, offsets, counts = [], np.zeros(CELLS, dtype=np.int64), np.zeros(CELLS, dtype=np.int64)
+        position = 0
+        for s in range(CELLS[0]):
+            for a in range(CELLS[1]):
+                cell = stays[(severity == s) & (age == a)]
+                if len(cell) < min_count:
+                    cell = stays[severity == s]
+                if len(cell) == 0:
+                    cell = stays
+                blocks.append(cell)
+                offsets[s, a], counts[s, a] = position, len(cell)
+                position += len(cell)
+        return cls(np.concatenate(blocks), offsets, counts)
+
+    def sample(self, severity, age, rng=None, scale=1.0):
+        rng = np.random.default_rng() if rng is None else rng
+        pick = (rng.random(len(severity)) * self.counts[severity, age]).astype(np.int64)
+        return _minutes(scale * self.values[self.offsets[severity, age] + pick])
+
+    def mean(self):
+        return np.array([[self.values[o:o + c].mean() for o, c in zip(row_o, row_c)]
+                         for row_o, row_c in zip(self.offsets, self.counts)])
+
+    def __repr__(self):
+        return f"EmpiricalStay({len(self.values)} observations)"
+################################################################################################################################################
+'''Fitting'''
+STAY_MODELS = {'lognormal': LognormalStay, 'gamma': GammaStay, 'empirical': EmpiricalStay}
+_FITTED = {} # {data hash: StayModel} models already fitted by this process
+
+@functools.lru_cache(maxsize=64)
+def matched_stay_model(kind: str, stay_scale: tuple, duration_ranges: tuple, std_ratio: float):
+    '''
+    Model in units of the average stay (sample with scale=average minutes) with the same per-severity mean and
+    variance as the scripts' model: normal(average * stay_scale * uniform(duration range), 2 * std) stays
+    std_ratio: std_dev_minutes / average_minutes_in_hospital; built once per parameter set
+    '''
+    if kind not in ('lognormal', 'gamma'):
+        raise ValueError(f"Stay model {kind!r} cannot be built from moments, expected 'lognormal' or 'gamma'")
+    lo, hi = np.array(duration_ranges, dtype=np.float64).T
+    scale = np.asarray(stay_scale, dtype=np.float64)
+    mean = scale * (lo + hi) / 2
+    std = np.sqrt((scale * (hi - lo)) ** 2 / 12 + (2 * std_ratio) ** 2)
+    return STAY_MODELS[kind].from_moments(mean, std / mean)
+
+def _cell_moments(x, severity, age, min_count: int, log: bool):
+    '''(3, 4) mean and std of x (or log x) per cell; sparse cells use their severity, then every observation'''
+    x = np.log(x) if log else x
+    mean = np.empty(CELLS)
+    std = np.empty(CELLS)
+    for s in range(CELLS[0]):
+        for a in range(CELLS[1]):
+            cell = x[(severity == s) & (age == a)]
+            if len(cell) < min_count:
+                cell = x[severity == s]
+            if len(cell) < 2:
+                cell = x
+            mean[s, a], std[s, a] = cell.mean(), cell.std(ddof=1)
+    return mean, std
+
+def fit_stay_model(kind: str, stays, severity, age, min_count: int = MIN_CELL_COUNT, cache: bool = True):
+    '''
+    Fit a StayModel per (severity, age) cell to observed stays in minutes
+    lognormal: mean and std of log stays; gamma: method of moments; empirical: the observations themselves
+    With cache=True the parameters are kept in memory and saved in CACHE_DIR, keyed by a hash of the inputs
+    '''
+    if kind not in STAY_MODELS:
+        raise ValueError(f"Unknown stay model {kind!r}, expected one of {sorted(STAY_MODELS)}")
+    stays = np.asarray(stays, dtype=np.float64)
+    severity = np.asarray(severity, dtype=np.int64)
+    age = np.asarray(age, dtype=np.int64)
+    if np.any(stays <= 0):
+        raise ValueError("Observed stays must be positive")
+
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (kind.encode(), np.int64(min_count).tobytes(), stays.tobytes(), severity.tobytes(), age.tobytes()):
+        digest.update(part)
+    key = digest.hexdigest()
+    if cache and key in _FITTED:
+        return _FITTED[key]
+    cache_file = os.path.join(CACHE_DIR, f"stay-{kind}-{key}.npz")
+    model = None
+    if cache:
+        try:
+            with np.load(cache_file, allow_pickle=False) as saved:
+                model = STAY_MODELS[kind](*(saved[name] for name in saved.files))
+        except (OSError, ValueError, TypeError):
+            model = None
+
+    if model is None:
+        if kind == 'empirical':
+            model = EmpiricalStay.from_observations(stays, severity, age, min_count)
+            params = {'values': model.values, 'offsets': model.offsets, 'counts': model.counts}
+        elif kind == 'lognormal':
+            mu, sigma = _cell_moments(stays, severity, age, min_count, log=True)
+            model = LognormalStay(mu, sigma)
+            params = {'mu': model.mu, 'sigma': model.sigma}
+        else:
+            mean, std = _cell_moments(stays, severity, age, min_count, log=False)
+            model = GammaStay.from_moments(mean, std / mean)
+            params = {'shape': model.shape, 'scale': model.scale}
+        if cache:
+            _save(cache_file, params)
+    if cache:
+        _FITTED[key] = model
+    return model
+
+def _save(cache_file: str, params: dict):
+    try:
+        write_atomic(cache_file, lambda tmp: np.savez(tmp, **params), suffix='.npz')
+    except OSError:
+        pass
@@ -0,0 +1,489 @@
+################################################################################################################################################
+'''
+Discrete-event simulation core shared by sim.py, two_way_sim.py and age_disc_sim.py
+
+Arrivals are replayed in time order and discharges are kept on a heap, so a run costs
+time proportional to the number of patients instead of the number of minutes in the horizon.
+Per-minute series (captured utility, available beds, ...) are rebuilt from the event log on demand.
+Any number of admission policies can be evaluated together in one pass over the same arrival stream;
+each policy keeps its own bed count, status and decision arrays, so policies never share patient state.
+With a waitlist (icu_sim.waitlist) a policy's blocked patients queue for the next freed bed instead of being
+rejected on arrival. Rejected patients go to the first eligible resource pool with a free slot (icu_sim.resources,
+the at-home program by default); pool slots are freed by discharge events on the same heap as ICU beds.
+'''
+################################################################################################################################################
+import copy
+import heapq
+import numpy as np
+from array import array
+from icu_sim.patients import (AGE_GROUPS, DECISIONS, ACCEPTED, REJECTED, AT_HOME, POOLED, UNDECIDED,
+                              PENDING, IN_BED, DISCHARGED, AT_HOME_PROGRAM, REJECTED_STATUS, WAITLIST, IN_POOL)
+from icu_sim.resources import DEFAULT_POOLS, NO_POOL, pool_stays
+from icu_sim.streams import RandomStreams
+from icu_sim.waitlist import WaitQueue
+################################################################################################################################################
+'''Event Log'''
+class EventLog:
+    times: list # time of each recorded event
+    captured: list # running totals after each event
+    rejected: list
+    at_home: list
+    beds: list
+    def __init__(self, m: int):
+        self.m = m
+        self.times = []
+        self.captured = []
+        self.rejected = []
+        self.at_home = []
+        self.beds = []
+
+    def record(self, t, captured: float, rejected: float, at_home: float, beds: int):
+        self.times.append(t)
+        self.captured.append(captured)
+        self.rejected.append(rejected)
+        self.at_home.append(at_home)
+        self.beds.append(beds)
+
+    def copy(self):
+        log = EventLog(self.m)
+        log.times, log.captured, log.rejected, log.at_home, log.beds = (list(self.times), list(self.captured), list(self.rejected),
+                                                                          list(self.at_home), list(self.beds))
+        return log
+
+    def series(self, name: str, t_n, tau=1):
+        '''
+        Value of `name` at the end of every step 0, tau, 2*tau, ... < t_n
+        (same shape as the old per-minute lists, e.g. utility_over_time)
+        '''
+        initial = self.m if name == 'beds' else 0.0
+        values = np.concatenate(([initial], np.asarray(getattr(self, name), dtype=float)))
+        grid = np.arange(0, t_n, tau)
+        # Index of the last event at or before each grid point (0 -> no event yet)
+        idx = np.searchsorted(np.asarray(self.times, dtype=float), grid, side='right')
+        return values[idx]
+################################################################################################################################################
+'''Simulation Result'''
+class Run:
+    total_u_captured: float
+    total_u_rejected: float
+    total_stay_at_home_u: float # utility recovered by the at-home pool
+    total_pool_u: float # utility recovered by every pool, the at-home pool included
+    status: np.ndarray # int8 status code per patient under this policy
+    decision: np.ndarray # int8 decision code per patient under this policy (UNDECIDED if never arrived)
+    remaining_beds: np.ndarray # int32 beds left right after each patient's decision (None when streamed to a sink)
+    admission_time: np.ndarray # int32 minute each patient got an ICU bed (later than arrival from a waitlist), -1 if never
+    log: EventLog
+    pool_index: np.ndarray # int8 index into pools of the pool each patient was placed in (NO_POOL if none)
+    waitlist: dict # {admitted, reneged, waiting, longest} patient counts of the policy's waitlist, None without one
+    pools: dict # {pool name: {placed, turned_away, utility}} (icu_sim.resources)
+    def __init__(self, m: int):
+        self.total_u_captured = 0.0
+        self.total_u_rejected = 0.0
+        self.total_stay_at_home_u = 0.0
+        self.total_pool_u = 0.0
+        self.status = None
+        self.pool_index = None
+        self.decision = None
+        self.remaining_beds = None
+        self.admission_time = None
+        self.log = EventLog(m)
+        self.waitlist = None
+        self.pools = {}
+
+    @property
+    def net_utility(self):
+        return (self.total_u_captured + self.total_pool_u) - self.total_u_rejected
+
+    def utilities(self, patients, *decisions: int):
+        '''Utilities of the patients that got any of `decisions` in this run'''
+        return patients.u[np.isin(self.decision, decisions)]
+
+    def results_frame(self, patients):
+        '''
+        One row per arrived patient in arrival order (the layout of sim_results_1month.csv)
+        remaining_beds is left out when the decisions were streamed to a sink instead; patients admitted from a
+        waitlist are discharged after their stay counted from admission_time, so their dispatch_time moves with it
+        '''
+        import pandas as pd
+        arrived = np.flatnonzero(self.decision >= 0)
+        arrived = arrived[np.argsort(patients.arrival_time[arrived], kind='stable')]
+        frame = pd.DataFrame({
+            'person_id': patients.id[arrived],
+            'age': pd.Categorical.from_codes(patients.age[arrived], AGE_GROUPS),
+            'arrival_time': patients.arrival_time[arrived],
+            'dispatch_time': patients.dispatch_time[arrived],
+            'utility': patients.u[arrived],
+            'decision': pd.Categorical.from_codes(self.decision[arrived], DECISIONS),
+        })
+        if self.admission_time is not None:
+            admitted = self.admission_time[arrived]
+            frame['dispatch_time'] += np.where(admitted >= 0, admitted - patients.arrival_time[arrived], 0)
+            frame.insert(3, 'admission_time', admitted)
+        if self.remaining_beds is not None:
+            frame['remaining_beds'] = self.remaining_beds[arrived]
+        if self.pool_index is not None:
+            frame['pool'] = pd.Categorical.from_codes(self.pool_index[arrived], list(self.pools)) # NaN when not placed
+        return frame
+################################################################################################################################################
+'''Engine State'''
+class EngineState:
+    '''
+    Everything the engine needs to continue a run from time t: the cohort, per-policy bed counts, running totals,
+    patient status/decision arrays and event logs, and the pending discharge heap
+    Policies are not part of the state (they are passed to advance by name), so a state can be continued with
+    different policies from time t onwards; see icu_sim.checkpoint for saving states to disk
+    '''
+    t: int # every event before t has been processed
+    patients: object # PatientTable
+    names: list # policy names, in the order policies are decided
+    capacity: list # beds per policy
+    beds: list # free beds per policy
+    captured: list # running utility totals per policy
+    rejected: list
+    at_home: list # utility recovered by the at-home pool per policy
+    status: list # bytearray of status codes per policy
+    decision: list # bytearray of decision codes per policy
+    remaining_beds: list # array('i') per policy, None for policies streamed to a sink
+    discharges: list # heap of (time, patient index, policy index, 0 for an ICU bed or 1 + pool index)
+    logs: list # EventLog per policy
+    queues: list # icu_sim.waitlist.WaitQueue per policy, None for policies without a waitlist
+    admitted_at: list # {patient index: minute} per policy of the patients admitted from its waitlist
+    pools: tuple # icu_sim.resources.ResourcePool tried in order for rejected patients
+    pool_free: list # free slots per policy and pool (None for unlimited pools)
+    pool_placed: list # patients placed per policy and pool
+    pool_full: list # eligible patients turned away by a full pool, per policy and pool
+    pool_utility: list # utility recovered per policy and pool
+    pool_index: list # bytearray of the pool each patient was placed in per policy (NO_POOL if none)
+    pool_stays: list # int64 slot-holding minutes per patient for each capacity-limited pool, None for the others
+    rng_states: dict # {policy name: bit generator state} of the policies' generators at time t
+    seed_sequence: object # optional np.random.SeedSequence the cohort was drawn from (to extend it later)
+    days: int # optional horizon of the cohort in days
+    def __init__(self, patients, m, names: list, sinks: dict = None, waitlist=None, pools=None, rng=None, log=None):
+        '''
+        waitlist: optional icu_sim.waitlist.Waitlist for every policy, or {name: Waitlist}
+        pools: ResourcePools for rejected patients (default: the unlimited at-home program); rng: RandomStreams or
+               Generator the pools' stays are drawn from
+        log: optional log(m) -> event log replacing EventLog, e.g. an icu_sim.metrics.StreamingLog factory
+        '''
+        n = len(patients)
+        self.t = 0
+        self.patients = patients
+        self.names = list(names)
+        self.capacity = [m[name] if isinstance(m, dict) else m for name in self.names]
+        self.beds = list(self.capacity)
+        self.captured = [0.0] * len(self.names)
+        self.rejected = [0.0] * len(self.names)
+        self.at_home = [0.0] * len(self.names)
+        self.status = [bytearray([PENDING]) * n for _ in self.names]
+        self.decision = [bytearray([UNDECIDED & 0xff]) * n for _ in self.names]
+        self.remaining_beds = [array('i', bytes(4 * n)) if (sinks or {}).get(name) is None else None for name in self.names]
+        self.discharges = []
+        self.logs = [(EventLog if log is None else log)(c) for c in self.capacity]
+        rules = [waitlist.get(name) if isinstance(waitlist, dict) else waitlist for name in self.names]
+        self.queues = [None if rule is None else WaitQueue(rule) for rule in rules]
+        self.admitted_at = [{} for _ in self.names]
+        self.pools = DEFAULT_POOLS if pools is None else tuple(pools)
+        self.pool_free = [[pool.capacity for pool in self.pools] for _ in self.names]
+        self.pool_placed = [[0] * len(self.pools) for _ in self.names]
+        self.pool_full = [[0] * len(self.pools) for _ in self.names]
+        self.pool_utility = [[0.0] * len(self.pools) for _ in self.names]
+        self.pool_index = [bytearray([NO_POOL & 0xff]) * n for _ in self.names]
+        self.pool_stays = pool_stays(self.pools, patients, rng=rng)
+        self.rng_states = {}
+        self.seed_sequence = None
+        self.days = None
+        self._arrival_order = None
+
+    def arrival_order(self):
+        '''Patients sorted by arrival time (stable, so same-minute ties keep generation order), computed once'''
+        if self._arrival_order is None:
+            self._arrival_order = np.argsort(self.patients.arrival_time, kind='stable')
+        return self._arrival_order
+
+    def extend(self, patients, rng=None):
+        '''
+        Continue with a longer cohort: `patients` must start with the current cohort (e.g. icu_sim.cohort.extend_cohort)
+        Pool stays of the new patients are drawn per arrival day d from rng.branch(d) when rng is a RandomStreams,
+        so extending in one step or several gives the same stays
+        '''
+        n = len(self.patients)
+        extra = len(patients) - n
+        if extra < 0 or not np.array_equal(patients.arrival_time[:n], self.patients.arrival_time):
+            raise ValueError("The new cohort must start with the patients of this state")
+        if any(stays is not None for stays in self.pool_stays):
+            rows = np.arange(n, len(patients))
+            days = patients.arrival_time[rows] // (24 * 60)
+            groups = ([(rows[days == day], rng.branch(int(day))) for day in np.unique(days)] if isinstance(rng, RandomStreams)
+                      else [(rows, rng)])
+            for day_rows, day_rng in groups:
+                drawn = pool_stays(self.pools, patients, day_rows, day_rng)
+                self.pool_stays = [None if stays is None else np.concatenate((stays, new)) for stays, new in zip(self.pool_stays, drawn)]
+        for k in range(len(self.names)):
+            self.status[k] += bytearray([PENDING]) * extra
+            self.decision[k] += bytearray([UNDECIDED & 0xff]) * extra
+            self.pool_index[k] += bytearray([NO_POOL & 0xff]) * extra
+            if self.remaining_beds[k] is not None:
+                self.remaining_beds[k].extend(array('i', bytes(4 * extra)))
+        self.patients = patients
+        self._arrival_order = None
+
+    def fork(self):
+        '''Independent copy, e.g. to continue a what-if branch with other policies'''
+        fork = copy.copy(self)
+        fork.beds, fork.captured, fork.rejected, fork.at_home = (list(self.beds), list(self.captured),
+                                                                 list(self.rejected), list(self.at_home))
+        fork.status = [bytearray(s) for s in self.status]
+        fork.decision = [bytearray(d) for d in self.decision]
+        fork.remaining_beds = [None if r is None else array('i', r) for r in self.remaining_beds]
+        fork.discharges = list(self.discharges)
+        fork.logs = [log.copy() for log in self.logs]
+        fork.queues = copy.deepcopy(self.queues)
+        fork.admitted_at = [dict(admitted) for admitted in self.admitted_at]
+        fork.pool_free, fork.pool_placed, fork.pool_full, fork.pool_utility = (
+            [list(row) for row in self.pool_free], [list(row) for row in self.pool_placed], [list(row) for row in self.pool_full],
+            [list(row) for row in self.pool_utility])
+        fork.pool_index = [bytearray(p) for p in self.pool_index]
+        fork.rng_states = dict(self.rng_states)
+        return fork
+
+    def runs(self, copy: bool = True):
+        '''
+        {name: Run} as of time t; with copy=False the runs share buffers with the state (only safe when the state
+        is not advanced any further)
+        '''
+        runs = {}
+        for k, name in enumerate(self.names):
+            run = Run(self.capacity[k])
+            run.total_u_captured = self.captured[k]
+            run.total_u_rejected = self.rejected[k]
+            run.total_stay_at_home_u = self.at_home[k]
+            run.total_pool_u = sum(self.pool_utility[k])
+            run.status = np.frombuffer(self.status[k], dtype=np.int8)
+            run.decision = np.frombuffer(self.decision[k], dtype=np.int8)
+            run.pool_index = np.frombuffer(self.pool_index[k], dtype=np.int8)
+            if self.remaining_beds[k] is not None:
+                run.remaining_beds = np.frombuffer(self.remaining_beds[k], dtype=np.int32)
+            run.admission_time = admission_times(self.patients, run.decision, self.admitted_at[k])
+            run.log = self.logs[k]
+            if self.queues[k] is not None:
+                run.waitlist = self.queues[k].stats()
+            run.pools = {pool.name: {'placed': placed, 'turned_away': full, 'utility': recovered}
+                         for pool, placed, full, recovered in zip(self.pools, self.pool_placed[k], self.pool_full[k], self.pool_utility[k])}
+            if copy:
+                run.status, run.decision, run.pool_index = run.status.copy(), run.decision.copy(), run.pool_index.copy()
+                run.remaining_beds = None if run.remaining_beds is None else run.remaining_beds.copy()
+                run.log = run.log.copy()
+            runs[name] = run
+        return runs
+
+def admission_times(patients, decision, admitted_at: dict):
+    '''int32 minute each patient got an ICU bed: arrival for ACCEPTED patients unless admitted_at has a waitlist admission, else -1'''
+    times = np.where(decision == ACCEPTED, patients.arrival_time, -1).astype(np.int32)
+    if admitted_at:
+        times[np.fromiter(admitted_at, dtype=np.int64, count=len(admitted_at))] = list(admitted_at.values())
+    return times
+################################################################################################################################################
+'''Engine'''
+def advance(state: EngineState, policies: dict, t_stop, sinks: dict = None):
+    '''
+    Process every event before t_stop, continuing from state.t; the state is updated in place
+    policies: {name: AdmissionPolicy} for every name in state.names; sinks: optional {name: ResultSink}
+    Advancing to t1 and then to t2 gives exactly the same run as advancing straight to t2; policies' generators
+    are set to the state's rng_states first, and the states they end in are recorded again
+    '''
+    patients = state.patients
+    names = state.names
+    deciders = [policies[name] for name in names]
+    capacity = state.capacity
+    policy_ids = range(len(names))
+    for name, rng_state in state.rng_states.items():
+        if policies[name].rng is not None:
+            policies[name].rng.bit_generator.state = rng_state
+
+    # Per-policy state
+    beds = state.beds
+    captured = state.captured
+    rejected = state.rejected
+    at_home = state.at_home
+    status = state.status
+    decision = state.decision
+    remaining_beds = state.remaining_beds
+    sinks = [(sinks or {}).get(name) for name in names]
+    for k, sink in enumerate(sinks):
+        if sink is not None:
+            if remaining_beds[k] is not None:
+                raise ValueError(f"Policy {names[k]!r} was started without a sink")
+            sink.bind(patients)
+        elif remaining_beds[k] is None:
+            raise ValueError(f"Policy {names[k]!r} was started with a sink and needs one to continue")
+    logs = state.logs
+    discharges = state.discharges # heap of (dispatch_time, patient index, policy index)
+    queues = state.queues
+    admitted_at = state.admitted_at
+    pool_free = state.pool_free
+    pool_placed = state.pool_placed
+    pool_full = state.pool_full
+    pool_utility = state.pool_utility
+    pool_index = state.pool_index
+    stays = [None if s is None else s.tolist() for s in state.pool_stays]
+    fallbacks = [(p, pool.utility_range[0], pool.utility_range[1], pool.factor, pool.at_home) for p, pool in enumerate(state.pools)]
+
+    dispatch = patients.dispatch_time.tolist()
+    u = patients.u.tolist()
+    if any(queue is not None for queue in queues):
+        severity = patients.severity.tolist()
+        stay = (patients.dispatch_time - patients.arrival_time).tolist()
+
+    # Arrivals are known up front, so they are sorted once (stable, so same-minute ties keep generation order)
+    # and cut into one batch per arrival minute; only discharges go through the heap
+    arrival_order = state.arrival_order()
+    sorted_times = patients.arrival_time[arrival_order]
+    first = int(np.searchsorted(sorted_times, state.t, side='left'))
+    arrival_order, sorted_times = arrival_order[first:], sorted_times[first:]
+    starts = np.flatnonzero(np.diff(sorted_times, prepend=sorted_times[:1] - 1)).tolist()
+    ends = starts[1:] + [len(sorted_times)]
+
+    def place(k, i, t):
+        # A patient the ICU did not take goes to the first eligible pool with a free slot; returns the decision
+        ui = u[i]
+        free = pool_free[k]
+        for p, low, high, factor, home in fallbacks:
+            if low <= ui <= high:
+                if free[p] is not None:
+                    if free[p] == 0:
+                        pool_full[k][p] += 1
+                        continue
+                    free[p] -= 1
+                    heapq.heappush(discharges, (t + stays[p][i], i, k, p + 1))
+                pool_placed[k][p] += 1
+                pool_utility[k][p] += ui * factor
+                pool_index[k][i] = p
+                if home:
+                    at_home[k] += ui * factor
+                    status[k][i] = AT_HOME_PROGRAM
+                    return AT_HOME
+                status[k][i] = IN_POOL
+                return POOLED
+        status[k][i] = REJECTED_STATUS
+        return REJECTED
+
+    def decided(k, i, code, t):
+        decision[k][i] = code
+        if sinks[k] is None:
+            remaining_beds[k][i] = beds[k]
+        else:
+            sinks[k].add(i, code, beds[k], t if code == ACCEPTED else -1)
+
+    def renege_until(k, t_stop):
+        # Waiting patients whose deadline is before t_stop leave unserved, rejected at their deadline
+        queue = queues[k]
+        while queue.deadlines and queue.next_deadline() < t_stop:
+            t, i = queue.renege()
+            rejected[k] += u[i]
+            decided(k, i, place(k, i, t), t)
+            logs[k].record(t, captured[k], rejected[k], at_home[k], beds[k])
+
+    def discharge_until(t_stop, inclusive=True):
+        # Discharges at time t are processed before arrivals at time t
+        while discharges and (discharges[0][0] <= t_stop if inclusive else discharges[0][0] < t_stop):
+            t, i, k, p = heapq.heappop(discharges)
+            if p:
+                # A pool slot: no ICU bed or running total changes
+                pool_free[k][p - 1] += 1
+                status[k][i] = DISCHARGED
+                continue
+            queue = queues[k]
+            if queue is not None:
+                renege_until(k, t)
+            beds[k] = min(beds[k] + 1, capacity[k]) # Don't exceed max capacity
+            status[k][i] = DISCHARGED
+            if queue is not None and len(queue) and beds[k] > 0:
+                # The freed bed goes to the highest-priority waiting patient, whose stay starts now
+                j = queue.pop()
+                beds[k] -= 1
+                captured[k] += u[j]
+                status[k][j] = IN_BED
+                admitted_at[k][j] = t
+                decided(k, j, ACCEPTED, t)
+                heapq.heappush(discharges, (t + stay[j], j, k, 0))
+            logs[k].record(t, captured[k], rejected[k], at_home[k], beds[k])
+
+    for start, end in zip(starts, ends):
+        t = int(sorted_times[start])
+        if t >= t_stop:
+            break
+        discharge_until(t)
+
+        batch = arrival_order[start:end]
+        batch_ids = batch.tolist()
+        for k in policy_ids:
+            queue = queues[k]
+            if queue is not None:
+                renege_until(k, t)
+            admit = deciders[k].decide(patients, batch, beds[k], capacity[k], t)
+            for i, ok in zip(batch_ids, admit):
+                if ok and beds[k] > 0:
+                    beds[k] -= 1
+                    captured[k] += u[i]
+                    status[k][i] = IN_BED
+                    code = ACCEPTED
+                    # Only admitted patients ever free a bed
+                    heapq.heappush(discharges, (dispatch[i], i, k, 0))
+                elif (queue is not None and (beds[k] == 0 or queue.rule.declined)
+                      and queue.push(i, t, u[i], severity[i])):
+                    # Decided when a bed frees up for them or they renege
+                    status[k][i] = WAITLIST
+                    continue
+                else:
+                    rejected[k] += u[i]
+                    code = place(k, i, t)
+                decided(k, i, code, t)
+            logs[k].record(t, captured[k], rejected[k], at_home[k], beds[k])
+
+    discharge_until(t_stop, inclusive=False)
+    for k in policy_ids:
+        if queues[k] is not None:
+            renege_until(k, t_stop)
+    state.t = max(state.t, int(t_stop))
+    state.rng_states = {name: policy.rng.bit_generator.state for name, policy in zip(names, deciders) if policy.rng is not None}
+    for sink in sinks:
+        if sink is not None:
+            sink.flush()
+    return state
+
+def simulate_policies(patients, m, t_n, policies: dict, sinks: dict = None, checkpoint_every: int = None, on_checkpoint=None,
+                      waitlist=None, pools=None, rng=None, log=None):
+    '''
+    Run every admission policy in `policies` ({name: AdmissionPolicy}) over `patients` in a single pass until time t_n
+
+    patients: PatientTable from icu_sim.cohort.generate_cohort (rows in generation order)
+    m: number of beds, either shared by every policy or a {name: beds} dict
+    Each policy is called once per arrival minute with all of that minute's arrivals (see icu_sim.policies)
+    sinks: optional {name: ResultSink}; those policies' decisions are streamed to disk as they are made
+    (see icu_sim.sinks) instead of keeping a remaining_beds column in memory
+    checkpoint_every / on_checkpoint: call on_checkpoint(EngineState) every checkpoint_every minutes and at t_n
+    (e.g. to write icu_sim.checkpoint files), so the run can be resumed, extended or forked from there
+    waitlist: optional icu_sim.waitlist.Waitlist, shared by every policy or a {name: Waitlist} dict
+    pools / rng: ResourcePools for rejected patients (icu_sim.resources, default: the unlimited at-home program) and
+    the RandomStreams or Generator their stays are drawn from
+    log: optional log(m) factory replacing each policy's EventLog (e.g. icu_sim.metrics.StreamingLog rollups)
+    Returns {name: Run}
+    '''
+    state = EngineState(patients, m, list(policies), sinks, waitlist, pools, rng, log)
+    run_until(state, policies, t_n, sinks, checkpoint_every, on_checkpoint)
+    return state.runs(copy=False)
+
+def run_until(state: EngineState, policies: dict, t_n, sinks: dict = None, checkpoint_every: int = None, on_checkpoint=None):
+    '''advance() to t_n, stopping at every multiple of checkpoint_every after state.t and at t_n to call on_checkpoint(state)'''
+    if checkpoint_every:
+        for t in range((state.t // checkpoint_every + 1) * checkpoint_every, int(t_n), checkpoint_every):
+            advance(state, policies, t, sinks)
+            on_checkpoint(state)
+    advance(state, policies, t_n, sinks)
+    if checkpoint_every:
+        on_checkpoint(state)
+    return state
+
+def simulate(patients, m: int, t_n, policy, sink=None):
+    '''Run a single admission policy; see simulate_policies'''
+    return simulate_policies(patients, m, t_n, {'policy': policy}, {'policy': sink})['policy']
@@ -0,0 +1,283 @@
+################################################################################################################################################
+'''
+Fairness and equity analytics across age groups
+
+A run's decisions are reduced to contingency tables of policy x age group x severity x decision, as patient counts,
+summed utility and utility recovered by resource pools, in one bincount pass each over every policy's decision codes
+(instead of one DataFrame filter per age group and decision). Every disparity metric is a few array operations on
+these tables:
+
+    acceptance rates        ACCEPTED / decided patients per group (age, severity or both)
+    rate ratios             acceptance rate of each group over a reference group's (the highest by default);
+                            below 0.8 fails the four-fifths rule of disparate impact
+    utility loss            utility of the group's patients the ICU did not admit, less what the pools they were
+                            placed in recovered (each pool's own factor, icu_sim.resources), per patient of the group
+
+Tables are kept per unit (a replication, or a block of arrivals of one run), which costs 3 x 48 numbers per unit and
+policy, so thousands of replications are analysed in memory without writing or reloading per-run CSVs. Bootstrap
+confidence intervals resample units with multinomial weights, so a resample is one matrix product over the tables.
+Only independent replications are resampled: consecutive blocks of one run share the beds and queue carried over
+from the previous block, so treating them as independent draws would give intervals that are too narrow. Blocks
+are kept for per-period point estimates.
+
+    tables = fairness_replications(SimConfig(), 1000, seed=42)
+    rate, lo, hi = tables.bootstrap('rate_ratios', policy='utility')
+    print(tables.report())
+
+    python -m icu_sim.fairness --reps 1000 --seed 42
+'''
+################################################################################################################################################
+import argparse
+import numpy as np
+from icu_sim.patients import AGE_GROUPS, SEVERITIES, DECISIONS, ACCEPTED
+from icu_sim.resources import DEFAULT_POOLS
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Constants'''
+AXES = ('policy', 'age', 'severity', 'decision') # axes of a table, after the leading unit axis
+GROUPS = ('age', 'severity') # axes metrics can be broken down by
+METRICS = ('acceptance_rates', 'rate_ratios', 'utility_loss')
+DAY = 24 * 60 # minutes per block when one run is split into bootstrap units
+BOOTSTRAP_CHUNK = 250 # resamples drawn per matrix product, bounds the (resamples, units) weight matrix
+FOUR_FIFTHS = 0.8 # rate ratio below which a group is flagged for disparate impact
+################################################################################################################################################
+'''Contingency Tables'''
+def contingency(decisions, age, severity, u, unit=None, n_units: int = 1, recovered=None):
+    '''
+    (n_units, policies, ages, severities, decisions) tables of patient counts (int64), summed utility (float64) and
+    summed utility recovered by resource pools (float64)
+    decisions: (policies, n) decision codes, UNDECIDED patients are skipped; unit: optional (n,) unit index per patient
+    recovered: optional (policies, n) utility each patient's pool recovered (0 for patients not placed in one)
+    One key per patient and policy, then one bincount per table
+    '''
+    decisions = np.atleast_2d(np.asarray(decisions))
+    n_policies = len(decisions)
+    shape = (n_units, n_policies, len(AGE_GROUPS), len(SEVERITIES), len(DECISIONS))
+    # Key of every patient without the policy and decision, shared by all policies
+    cell = np.asarray(age, dtype=np.int64) * len(SEVERITIES) + severity
+    if unit is not None:
+        cell += np.asarray(unit, dtype=np.int64) * (n_policies * len(AGE_GROUPS) * len(SEVERITIES))
+    per_policy = len(AGE_GROUPS) * len(SEVERITIES)
+    key = (cell[None, :] + np.arange(n_policies)[:, None] * per_policy) * len(DECISIONS) + decisions
+    decided = decisions >= 0
+    key, weights = key[decided], np.broadcast_to(np.asarray(u, dtype=np.float64), decisions.shape)[decided]
+    size = int(np.prod(shape))
+    counts = np.bincount(key, minlength=size).reshape(shape)
+    utility = np.bincount(key, weights=weights, minlength=size).reshape(shape)
+    if recovered is None:
+        return counts, utility, np.zeros(shape)
+    recovered = np.bincount(key, weights=np.asarray(recovered, dtype=np.float64)[decided], minlength=size).reshape(shape)
+    return counts, utility, recovered
+
+def recovered_utility(run, patients, pools=None):
+    '''Utility the resource pool of each patient recovered in `run` (u x the pool's factor, 0 if not placed)'''
+    factors = np.array([pool.factor for pool in (pools or DEFAULT_POOLS)] + [0.0]) # NO_POOL (-1) picks the 0
+    return patients.u * factors[run.pool_index]
+################################################################################################################################################
+'''Metrics'''
+# Each metric takes tables with any leading axes (units, bootstrap resamples) ending in AXES and returns
+# (..., policies, groups...) arrays; groups with no decided patients give nan
+
+def _by(by):
+    by = (by,) if isinstance(by, str) else tuple(by)
+    for name in by:
+        if name not in GROUPS:
+            raise ValueError(f"Unknown group {name!r}, expected one of {GROUPS}")
+    return by
+
+def _grouped(table, by):
+    '''Sum a table's age and severity axes that are not in `by`'''
+    by = _by(by)
+    if 'severity' not in by:
+        table = table.sum(axis=-2)
+    if 'age' not in by:
+        table = table.sum(axis=-3 if 'severity' in by else -2)
+    elif by == ('severity', 'age'):
+        table = np.swapaxes(table, -3, -2)
+    return table
+
+def acceptance_rates(counts, utility=None, recovered=None, by='age'):
+    '''Share of each group's decided patients the ICU accepted'''
+    grouped = _grouped(counts, by)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return grouped[..., ACCEPTED] / grouped.sum(axis=-1)
+
+def rate_ratios(counts, utility=None, recovered=None, by='age', reference=None):
+    '''
+    Acceptance rate of each group over the reference group's
+    reference: index (or tuple of indices for two groups) into the last `by` axes, default: the highest rate
+    '''
+    rates = acceptance_rates(counts, by=by)
+    n_groups = len(_by(by))
+    if reference is None:
+        ref = np.nanmax(rates.reshape(rates.shape[:rates.ndim - n_groups] + (-1,)), axis=-1)
+    else:
+        reference = (reference,) if np.isscalar(reference) else tuple(reference)
+        ref = rates[(Ellipsis,) + reference]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return rates / ref.reshape(ref.shape + (1,) * n_groups)
+
+def utility_loss(counts, utility, recovered, by='age', gross: bool = False):
+    '''
+    Utility lost per patient of each group: utility of the patients the ICU did not admit, less what the pools they
+    were placed in recovered, over the group's decided patients (gross=True: without the pools' recovery)
+    '''
+    grouped_u, grouped_n = _grouped(utility, by), _grouped(counts, by)
+    lost = grouped_u.sum(axis=-1) - grouped_u[..., ACCEPTED]
+    if not gross:
+        lost = lost - _grouped(recovered, by).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return lost / grouped_n.sum(axis=-1)
+
+_METRICS = {'acceptance_rates': acceptance_rates, 'rate_ratios': rate_ratios, 'utility_loss': utility_loss}
+################################################################################################################################################
+'''Tables'''
+class FairnessTables:
+    counts: np.ndarray # int64 (units, policies, ages, severities, decisions) patient counts
+    utility: np.ndarray # float64, same shape, summed utility
+    recovered: np.ndarray # float64, same shape, summed utility recovered by resource pools
+    policies: tuple # policy names along the policy axis
+    unit: str # what a unit is: 'replication' or a block of arrivals ('1440-minute block')
+    def __init__(self, counts, utility, recovered, policies, unit: str = 'replication'):
+        self.counts = np.asarray(counts)
+        self.utility = np.asarray(utility)
+        self.recovered = np.asarray(recovered)
+        self.policies = tuple(policies)
+        self.unit = unit
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_result(cls, result, policies=None, block: int = None):
+        '''
+        Tables of one SimulationResult as one replication, or one unit per `block` minutes of arrivals (e.g. DAY)
+        for per-period estimates; blocks of one run are not independent, so they get no bootstrap intervals
+        '''
+        policies = tuple(policies or result.runs)
+        patients = result.patients
+        decisions = np.stack([result[policy].decision for policy in policies])
+        recovered = np.stack([recovered_utility(result[policy], patients, result.config.pools) for policy in policies])
+        if block is None:
+            unit, n_units = None, 1
+        else:
+            unit = patients.arrival_time // block
+            n_units = int(unit.max()) + 1 if len(unit) else 1
+        tables = contingency(decisions, patients.age, patients.severity, patients.u, unit, n_units, recovered)
+        return cls(*tables, policies, 'replication' if block is None else f"{block}-minute block")
+
+    @classmethod
+    def concatenate(cls, tables: list):
+        '''Units of several FairnessTables over the same policies, e.g. chunks of replications'''
+        first = tables[0]
+        if any(t.policies != first.policies for t in tables):
+            raise ValueError("FairnessTables cover different policies")
+        return cls(np.concatenate([t.counts for t in tables]), np.concatenate([t.utility for t in tables]),
+                   np.concatenate([t.recovered for t in tables]), first.policies, first.unit)
+
+    def total(self):
+        '''(counts, utility, recovered) summed over units'''
+        return self.counts.sum(axis=0), self.utility.sum(axis=0), self.recovered.sum(axis=0)
+
+    def metric(self, name: str, policy: str = None, **kwargs):
+        '''Metric `name` (in METRICS) of the pooled units, (policies, groups...) or (groups...) for one policy'''
+        if name not in _METRICS:
+            raise ValueError(f"Unknown metric {name!r}, expected one of {METRICS}")
+        values = _METRICS[name](*self.total(), **kwargs)
+        return values if policy is None else values[self.policies.index(policy)]
+
+    def acceptance_rates(self, policy: str = None, by='age'):
+        return self.metric('acceptance_rates', policy, by=by)
+
+    def rate_ratios(self, policy: str = None, by='age', reference=None):
+        return self.metric('rate_ratios', policy, by=by, reference=reference)
+
+    def utility_loss(self, policy: str = None, by='age', gross: bool = False):
+        return self.metric('utility_loss', policy, by=by, gross=gross)
+
+    def bootstrap(self, name: str, policy: str = None, n_boot: int = 1000, confidence: float = 0.95, seed=None, **kwargs):
+        '''
+        (estimate, ci_low, ci_high) of metric `name` with percentile bootstrap intervals over replications
+        Each resample draws len(self) replications with replacement as multinomial weights, so its tables are one
+        weights @ tables product; resamples are drawn BOOTSTRAP_CHUNK at a time
+        seed: int, Generator or RandomStreams (its 'bootstrap' stream, so intervals never share draws with a run)
+        '''
+        if self.unit != 'replication':
+            raise ValueError(f"Units are {self.unit}s of one run, which are autocorrelated; bootstrap independent "
+                             f"replications instead (fairness_replications)")
+        if len(self) < 2:
+            raise ValueError("Bootstrap intervals need at least two replications")
+        estimate = self.metric(name, policy, **kwargs)
+        rng = _generator(seed)
+        n_units, cell_shape = len(self), self.counts.shape[1:]
+        tables = [table.reshape(n_units, -1) for table in (self.counts, self.utility, self.recovered)]
+        resamples = []
+        for start in range(0, n_boot, BOOTSTRAP_CHUNK):
+            weights = rng.multinomial(n_units, np.full(n_units, 1 / n_units), size=min(BOOTSTRAP_CHUNK, n_boot - start))
+            values = _METRICS[name](*((weights @ table).reshape((-1,) + cell_shape) for table in tables), **kwargs)
+            resamples.append(values if policy is None else values[:, self.policies.index(policy)])
+        resamples = np.concatenate(resamples)
+        alpha = (1 - confidence) / 2
+        with np.errstate(invalid='ignore'):
+            lo, hi = np.nanquantile(resamples, [alpha, 1 - alpha], axis=0)
+        return estimate, lo, hi
+
+    def report(self, confidence: float = 0.95, n_boot: int = 1000, seed=None):
+        '''
+        Acceptance rates, rate ratios and utility loss per age group and policy, with bootstrap intervals over
+        replications (point estimates only, repeated in the brackets, for a single run or blocks of one)
+        '''
+        n_patients = int(self.counts.sum()) // max(len(self.policies), 1)
+        intervals = self.unit == 'replication' and len(self) > 1
+        lines = [f"{len(self)} units ({self.unit}), {n_patients} decided patients per policy, "
+                 + (f"{confidence:.0%} bootstrap intervals over replications" if intervals else "no intervals")]
+        results = {name: self.bootstrap(name, n_boot=n_boot, confidence=confidence, seed=seed) if intervals
+                   else (self.metric(name),) * 3 for name in METRICS}
+        for k, policy in enumerate(self.policies):
+            lines.append(f"\n{policy}:")
+            lines.append(f"  {'age':<8} {'acceptance rate':>28} {'rate ratio':>28} {'utility loss / patient':>28}")
+            for a, group in enumerate(AGE_GROUPS):
+                cells = []
+                for name in METRICS:
+                    est, lo, hi = (values[k, a] for values in results[name])
+                    cells.append(f"{est:8.3f} [{lo:.3f}, {hi:.3f}]")
+                flag = '  < 4/5' if results['rate_ratios'][0][k, a] < FOUR_FIFTHS else ''
+                lines.append(f"  {group:<8} " + ' '.join(f"{cell:>28}" for cell in cells) + flag)
+        return '\n'.join(lines)
+
+def _generator(seed):
+    if isinstance(seed, RandomStreams):
+        return seed.generator('bootstrap')
+    return np.random.default_rng(seed)
+################################################################################################################################################
+'''Replications'''
+def replication_tables(config, seeds: list, policies):
+    '''FairnessTables with one unit per replication of `seeds`, in order'''
+    from icu_sim.simulation import run_simulation
+    tables = [FairnessTables.from_result(run_simulation(config, policies, seed=seed), policies, block=None) for seed in seeds]
+    return FairnessTables.concatenate(tables)
+
+def fairness_replications(config, n_reps: int, seed=None, policies=None, workers: int = None, chunk: int = 16):
+    '''
+    Tables of n_reps replications across `workers` processes (default: all cores, 1 = in-process)
+    Replication k uses child k of RandomStreams(seed), the same cohorts as icu_sim.replications.run_replications
+    '''
+    from icu_sim.replications import POLICIES, pool_map
+    policies = tuple(policies or POLICIES)
+    seeds = RandomStreams(seed).spawn(n_reps)
+    tasks = [(config, seeds[start:start + chunk], policies) for start in range(0, n_reps, chunk)]
+    return FairnessTables.concatenate(pool_map(replication_tables, tasks, workers))
+################################################################################################################################################
+if __name__ == '__main__':
+    from icu_sim.config import SimConfig
+    parser = argparse.ArgumentParser(description='Acceptance-rate disparities and utility loss per age group across replications')
+    parser.add_argument('--reps', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--n-day', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--boot', type=int, default=1000, help='bootstrap resamples')
+    args = parser.parse_args()
+
+    tables = fairness_replications(SimConfig(n_day=args.n_day, days=args.days), args.reps, seed=args.seed, workers=args.workers)
+    print(tables.report(n_boot=args.boot, seed=args.seed))
@@ -0,0 +1,151 @@
+################################################################################################################################################
+'''
+Hospital table read from patients.csv (one row per Massachusetts hospital)
+
+Numbers in the file are text with thousands separators ("4,472") and currency formatting ("$62,427 "), so every
+numeric column is parsed once into typed NumPy columns. The parsed table is cached as a structured .npy file named
+after a hash of the CSV contents: an edited CSV gets a new cache entry, an unchanged one is loaded without parsing,
+and repeated loads in the same process return the table already in memory.
+'''
+################################################################################################################################################
+import csv
+import hashlib
+import io
+import os
+import numpy as np
+################################################################################################################################################
+'''Constants'''
+HOSPITALS_CSV = 'patients.csv'
+CACHE_DIR = os.environ.get('ICU_SIM_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'icu_sim'))
+CACHE_VERSION = 1 # bump when the parsed layout changes
+COLUMNS = ( # (attribute, patients.csv header, dtype)
+    ('name', 'Hospital Name', str),
+    ('city', 'City', str),
+    ('staffed_beds', 'Staffed Beds', np.int32),
+    ('total_discharges', 'Total Discharges', np.float64),
+    ('patient_days', 'Patient Days', np.float64),
+    ('gross_patient_revenue', 'Gross Patient Revenue ($000)', np.float64),
+)
+HEADERS = {header: name for name, header, _ in COLUMNS}
+################################################################################################################################################
+'''Hospital Table'''
+class HospitalTable:
+    name: np.ndarray # str
+    city: np.ndarray # str
+    staffed_beds: np.ndarray # int32, 0 when missing
+    total_discharges: np.ndarray # float64 per year, NaN when missing
+    patient_days: np.ndarray # float64 per year, NaN when missing
+    gross_patient_revenue: np.ndarray # float64 in $000, NaN when missing
+    def __init__(self, name, city, staffed_beds, total_discharges, patient_days, gross_patient_revenue=None):
+        self.name = np.asarray(name, dtype=str)
+        self.city = np.asarray(city, dtype=str)
+        self.staffed_beds = np.asarray(staffed_beds, dtype=np.int32)
+        self.total_discharges = np.asarray(total_discharges, dtype=np.float64)
+        self.patient_days = np.asarray(patient_days, dtype=np.float64)
+        self.gross_patient_revenue = (np.full(len(self.name), np.nan) if gross_patient_revenue is None
+                                      else np.asarray(gross_patient_revenue, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.name)
+
+    def __getitem__(self, column: str):
+        '''Column by attribute or patients.csv header, e.g. table['Total Discharges']'''
+        return getattr(self, HEADERS.get(column, column))
+
+    def subset(self, index):
+        '''Table of the hospitals at `index` (boolean mask or positions)'''
+        return HospitalTable(*(getattr(self, name)[index] for name, _, _ in COLUMNS))
+
+    def city_codes(self):
+        '''(codes, cities): integer code per hospital into the sorted unique city names'''
+        cities, codes = np.unique(self.city, return_inverse=True)
+        return codes, cities
+
+    def to_records(self):
+        '''One structured array with a field per column (the cache layout)'''
+        columns = [getattr(self, name) for name, _, _ in COLUMNS]
+        records = np.empty(len(self), dtype=[(name, values.dtype) for (name, _, _), values in zip(COLUMNS, columns)])
+        for (name, _, _), values in zip(COLUMNS, columns):
+            records[name] = values
+        return records
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(*(records[name] for name, _, _ in COLUMNS))
+
+    def to_frame(self):
+        '''pandas DataFrame with the patients.csv headers and typed columns'''
+        import pandas as pd
+        return pd.DataFrame({header: getattr(self, name) for name, header, _ in COLUMNS})
+################################################################################################################################################
+'''Parsing'''
+def _number(text: str):
+    '''"4,472" -> 4472.0, "$62,427 " -> 62427.0, "" -> NaN'''
+    text = text.replace(',', '').replace('$', '').strip()
+    return float(text) if text else np.nan
+
+def parse_hospitals(text: str):
+    '''Parse the text of patients.csv into a HospitalTable'''
+    rows = list(csv.DictReader(io.StringIO(text)))
+    columns = []
+    for name, header, dtype in COLUMNS:
+        if dtype is str:
+            columns.append([row[header].strip() for row in rows])
+        else:
+            values = np.array([_number(row[header]) for row in rows])
+            if np.issubdtype(dtype, np.integer):
+                values = np.nan_to_num(values)
+            columns.append(values.astype(dtype))
+    return HospitalTable(*columns)
+################################################################################################################################################
+'''Loading'''
+_LOADED = {} # {content hash: HospitalTable} tables already loaded by this process
+
+def load_hospitals(path=HOSPITALS_CSV, cache: bool = True):
+    '''
+    Typed HospitalTable of patients.csv
+    With cache=True the table is kept in memory and in CACHE_DIR, keyed by the hash of the file contents;
+    the returned arrays are read-only because the same table is shared by every caller
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not cache:
+        return parse_hospitals(data.decode('utf-8-sig'))
+
+    key = f"{CACHE_VERSION}-{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+    if key in _LOADED:
+        return _LOADED[key]
+    cache_file = os.path.join(CACHE_DIR, f"hospitals-{key}.npy")
+    try:
+        table = HospitalTable.from_records(np.load(cache_file, allow_pickle=False))
+    except (OSError, ValueError):
+        table = parse_hospitals(data.decode('utf-8-sig'))
+        _write_cache(cache_file, table.to_records())
+    for name, _, _ in COLUMNS:
+        getattr(table, name).flags.writeable = False
+    _LOADED[key] = table
+    return table
+
+def _write_cache(cache_file: str, records):
+    try:
+        write_atomic(cache_file, lambda tmp: np.save(tmp, records, allow_pickle=False), suffix='.npy')
+    except OSError:
+        pass # a read-only cache directory only costs a re-parse next time
+
+def write_atomic(path: str, write, suffix: str = ''):
+    '''
+    Call write(tmp) on a temporary name next to `path` and rename it to `path`, so a concurrent reader never sees a
+    partial file; the temporary file is removed if writing fails
+    suffix: extension the writer adds itself (np.save adds '.npy', np.savez '.npz'), so the temporary name already has it
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp{suffix}"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
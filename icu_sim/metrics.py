@@ -0,0 +1,362 @@
+################################################################################################################################################
+'''
+Streaming metrics with memory independent of run length
+
+Running aggregates that are updated one value (or one chunk) at a time and never keep the values themselves:
+
+    Welford         count, mean and variance (optionally weighted, e.g. by time); works elementwise on arrays, so
+                    one Welford holds mean and variance curves across thousands of replications; merge() combines
+                    partial results (Chan et al.)
+    Histogram       weighted counts over fixed bins, with mean and interpolated quantiles
+    P2Quantile      one quantile of an unbounded stream in five markers (Jain & Chlamtac's P-squared algorithm)
+    StreamingLog    drop-in for the engine's EventLog: instead of one entry per event it keeps every series at
+                    bucket starts plus per-bucket bed rollups at a configurable resolution, and a time-weighted
+                    occupancy histogram; O(t_n / resolution + m) memory
+    MetricsSink     ResultSink that aggregates decisions (utility per decision, remaining beds) instead of writing them
+
+    result = run_simulation(config, seed=1, metrics=60)     # hourly rollups instead of per-event logs
+    log = result['utility'].log
+    log.utilization(), log.occupancy_quantile(0.95), log.rollup()['mean']
+'''
+################################################################################################################################################
+import bisect
+import copy
+import numpy as np
+from icu_sim.patients import DECISIONS
+from icu_sim.sinks import ResultSink
+################################################################################################################################################
+'''Constants'''
+DEFAULT_RESOLUTION = 60 # minutes per rollup bucket
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+LOG_SERIES = ('captured', 'rejected', 'at_home', 'beds') # EventLog.series names
+################################################################################################################################################
+'''Welford'''
+class Welford:
+    count: int # values added
+    weight: float # total weight (= count when unweighted)
+    mean: object # float or array
+    m2: object # weighted sum of squared deviations from the mean
+    def __init__(self):
+        self.count = 0
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x, weight: float = 1.0):
+        if weight <= 0:
+            return
+        self.count += 1
+        self.weight += weight
+        delta = x - self.mean
+        self.mean = self.mean + delta * (weight / self.weight)
+        self.m2 = self.m2 + weight * delta * (x - self.mean)
+
+    def add_many(self, values, weights=None):
+        '''Add every value along axis 0 at once (one vectorized pass, then merge)'''
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        batch = Welford()
+        batch.count = len(values)
+        if weights is None:
+            batch.weight = float(len(values))
+            batch.mean = values.mean(axis=0)
+            batch.m2 = ((values - batch.mean) ** 2).sum(axis=0)
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            batch.weight = float(weights.sum())
+            if batch.weight <= 0:
+                return
+            shaped = weights.reshape((-1,) + (1,) * (values.ndim - 1))
+            batch.mean = (shaped * values).sum(axis=0) / batch.weight
+            batch.m2 = (shaped * (values - batch.mean) ** 2).sum(axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        '''Combine with another Welford in place, as if its values had been added here'''
+        if other.weight <= 0:
+            return self
+        if self.weight <= 0:
+            self.count, self.weight, self.mean, self.m2 = other.count, other.weight, copy.copy(other.mean), copy.copy(other.m2)
+            return self
+        weight = self.weight + other.weight
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.weight / weight)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.weight * other.weight / weight)
+        self.count += other.count
+        self.weight = weight
+        return self
+
+    def variance(self, ddof: int = 0):
+        '''m2 / (weight - ddof); ddof=1 gives the sample variance of unweighted values'''
+        return self.m2 / (self.weight - ddof) if self.weight > ddof else self.m2 * np.nan
+
+    def std(self, ddof: int = 0):
+        return np.sqrt(self.variance(ddof))
+
+    def __repr__(self):
+        return f"Welford(count={self.count}, mean={self.mean!r}, std={self.std()!r})"
+################################################################################################################################################
+'''Histogram'''
+class Histogram:
+    edges: np.ndarray # bin edges, values outside them are counted in the first or last bin
+    counts: np.ndarray # float64 weight per bin
+    def __init__(self, edges, counts=None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1) if counts is None else np.asarray(counts, dtype=np.float64)
+
+    @classmethod
+    def integers(cls, high: int, counts=None):
+        '''One bin per integer 0..high (e.g. occupied beds)'''
+        return cls(np.arange(high + 2) - 0.5, counts)
+
+    def _bin(self, x):
+        return min(max(bisect.bisect_right(self.edges, x) - 1, 0), len(self.counts) - 1)
+
+    def add(self, x, weight: float = 1.0):
+        self.counts[self._bin(x)] += weight
+
+    def add_many(self, values, weights=None):
+        bins = np.clip(np.searchsorted(self.edges, values, side='right') - 1, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, weights=weights, minlength=len(self.counts))
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different edges cannot be merged")
+        self.counts += other.counts
+        return self
+
+    @property
+    def total(self):
+        return float(self.counts.sum())
+
+    @property
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def mean(self):
+        return float(self.counts @ self.centers / self.total) if self.total else float('nan')
+
+    def quantile(self, q):
+        '''Quantile(s) interpolated linearly within bins of the cumulative weight'''
+        if not self.total:
+            return np.full(np.shape(q), np.nan)[()]
+        cumulative = np.concatenate(([0.0], np.cumsum(self.counts))) / self.total
+        return np.interp(q, cumulative, self.edges)
+
+    def __repr__(self):
+        return f"Histogram({len(self.counts)} bins [{self.edges[0]:g}, {self.edges[-1]:g}], total={self.total:g})"
+################################################################################################################################################
+'''P-squared Quantile'''
+class P2Quantile:
+    '''Streaming estimate of quantile p from five markers (Jain & Chlamtac 1985); exact for the first five values'''
+    p: float
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"Quantile must be in (0, 1), got {p}")
+        self.p = p
+        self.count = 0
+        self._heights = [] # marker heights, the first values until there are five
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        self.count += 1
+        q = self._heights
+        if self.count <= 5:
+            bisect.insort(q, x)
+            return
+        n = self._positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self._desired
+        for i in range(5):
+            desired[i] += self._increments[i]
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise-parabolic prediction, linear when it would leave the neighbours' range
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                                                           + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def add_many(self, values):
+        for x in np.asarray(values, dtype=np.float64).tolist():
+            self.add(x)
+
+    @property
+    def value(self):
+        if self.count == 0:
+            return float('nan')
+        if self.count <= 5:
+            return float(np.quantile(self._heights, self.p))
+        return self._heights[2]
+
+    def __repr__(self):
+        return f"P2Quantile(p={self.p}, value={self.value:.6g}, count={self.count})"
+################################################################################################################################################
+'''Streaming Event Log'''
+class StreamingLog:
+    '''
+    EventLog replacement with O(t_n / resolution + m) memory: the four series at every bucket start (so series()
+    with tau a multiple of the resolution equals EventLog.series), per-bucket time-weighted mean, min and max of
+    free beds, and a time-weighted histogram of occupied beds
+    '''
+    m: int
+    t_n: int
+    resolution: int # minutes per bucket
+    starts: np.ndarray # float64 (len(LOG_SERIES), buckets) value of each series at each bucket start
+    beds_mean: np.ndarray # float64 (buckets,) time-weighted mean free beds per bucket
+    beds_low: np.ndarray # free beds extremes per bucket, over every recorded value (also those within one minute)
+    beds_high: np.ndarray
+    events: int # records received
+    def __init__(self, m: int, t_n: int, resolution: int = DEFAULT_RESOLUTION):
+        self.m = m
+        self.t_n = int(t_n)
+        self.resolution = int(resolution)
+        buckets = -(-self.t_n // self.resolution)
+        self.starts = np.zeros((len(LOG_SERIES), buckets))
+        self.starts[LOG_SERIES.index('beds')] = m
+        self.beds_mean = np.zeros(buckets)
+        self.beds_low = np.zeros(buckets)
+        self.beds_high = np.zeros(buckets)
+        self.events = 0
+        self._occupancy = [0.0] * (m + 1) # minutes spent at each number of occupied beds
+        self._bucket = 0
+        self._bucket_start = 0
+        self._bucket_end = min(self.resolution, self.t_n) if buckets else float('inf')
+        self._t = 0
+        self._values = (0.0, 0.0, 0.0)
+        self._beds = m
+        self._area = 0.0
+        self._low = self._high = m
+
+    def _roll(self, t):
+        # Close every bucket that ends at or before t, carrying the current values over
+        m, beds = self.m, self._beds
+        while t >= self._bucket_end:
+            b, dt = self._bucket, self._bucket_end - self._t
+            self._area += beds * dt
+            self._occupancy[m - beds] += dt
+            self.beds_mean[b] = self._area / (self._bucket_end - self._bucket_start)
+            self.beds_low[b], self.beds_high[b] = self._low, self._high
+            self._bucket, self._t = b + 1, self._bucket_end
+            self._area, self._low, self._high = 0.0, beds, beds
+            if self._bucket == len(self.beds_mean):
+                self._bucket_start = self._bucket_end = float('inf')
+                break
+            self._bucket_start, self._bucket_end = self._t, min(self._t + self.resolution, self.t_n)
+            self.starts[:, self._bucket] = self._values + (beds,)
+
+    def record(self, t, captured: float, rejected: float, at_home: float, beds: int):
+        if t >= self._bucket_end:
+            self._roll(t)
+        dt = t - self._t
+        if dt > 0:
+            self._area += self._beds * dt
+            self._occupancy[self.m - self._beds] += dt
+            self._t = t
+        if t == self._bucket_start:
+            self.starts[:, self._bucket] = (captured, rejected, at_home, beds)
+        if beds < self._low:
+            self._low = beds
+        elif beds > self._high:
+            self._high = beds
+        self._values = (captured, rejected, at_home)
+        self._beds = beds
+        self.events += 1
+
+    def finish(self, t_n=None):
+        '''Close the buckets up to t_n (default: the horizon) as if nothing else happens; called by every reader'''
+        self._roll(self.t_n if t_n is None else min(int(t_n), self.t_n))
+        return self
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    # Readers
+    def series(self, name: str, t_n, tau=1):
+        '''
+        Value of `name` at every step 0, tau, 2*tau, ... < t_n, as EventLog.series when tau is a multiple of the
+        resolution; finer steps repeat each bucket's starting value
+        '''
+        self.finish(t_n)
+        grid = np.arange(0, min(int(t_n), self.t_n), tau)
+        return self.starts[LOG_SERIES.index(name)][grid // self.resolution]
+
+    def rollup(self):
+        '''{'start', 'mean', 'low', 'high'} free beds per bucket (bucket k covers [k * resolution, (k + 1) * resolution))'''
+        self.finish()
+        return {'start': self.starts[LOG_SERIES.index('beds')], 'mean': self.beds_mean, 'low': self.beds_low, 'high': self.beds_high}
+
+    @property
+    def occupancy(self):
+        '''Histogram of occupied beds weighted by minutes spent at each count'''
+        self.finish()
+        return Histogram.integers(self.m, self._occupancy)
+
+    def occupancy_stats(self):
+        '''Time-weighted Welford of occupied beds'''
+        stats = Welford()
+        stats.add_many(np.arange(self.m + 1), self.occupancy.counts)
+        return stats
+
+    def utilization(self):
+        '''Time-weighted mean share of beds in use'''
+        return self.occupancy.mean() / self.m if self.m else float('nan')
+
+    def occupancy_quantile(self, q=DEFAULT_QUANTILES):
+        return self.occupancy.quantile(q)
+
+    def __repr__(self):
+        return f"StreamingLog(m={self.m}, t_n={self.t_n}, resolution={self.resolution}, events={self.events})"
+################################################################################################################################################
+'''Metrics Sink'''
+class MetricsSink(ResultSink):
+    '''
+    Aggregates decisions instead of writing them: Welford and P-squared quantiles of utility per decision, and a
+    histogram of the beds left after each decision; memory does not grow with the number of patients
+    '''
+    def __init__(self, m: int, quantiles=DEFAULT_QUANTILES, chunk_size: int = 4096):
+        super().__init__(None, chunk_size)
+        self.m = m
+        self.levels = tuple(quantiles)
+        self.utility = {name: Welford() for name in DECISIONS}
+        self.quantiles = {name: [P2Quantile(q) for q in quantiles] for name in DECISIONS}
+        self.remaining_beds = Histogram.integers(m)
+
+    def _write_rows(self, index, decision, remaining_beds, admission_time):
+        u = self._patients.u[index]
+        for code, name in enumerate(DECISIONS):
+            values = u[decision == code]
+            self.utility[name].add_many(values)
+            for estimate in self.quantiles[name]:
+                estimate.add_many(values)
+        self.remaining_beds.add_many(remaining_beds)
+        self.rows_written += len(index)
+
+    def _write_chunk(self, chunk):
+        pass
+
+    def summary(self):
+        '''{decision: {count, mean, std, q<p>...}} and the remaining-beds quantiles'''
+        summary = {}
+        for name in DECISIONS:
+            stats = self.utility[name]
+            summary[name] = {'count': stats.count, 'mean': stats.mean, 'std': stats.std(ddof=1)}
+            summary[name].update({f"q{estimate.p:g}": estimate.value for estimate in self.quantiles[name]})
+        summary['remaining_beds'] = {f"q{q:g}": value for q, value in zip(self.levels, self.remaining_beds.quantile(self.levels).tolist())}
+        return summary
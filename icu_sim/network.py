@@ -0,0 +1,544 @@
+################################################################################################################################################
+'''
+Multi-hospital network simulation driven by patients.csv
+
+Every hospital is one bed pool sized from `Staffed Beds`, receiving patients at a daily rate scaled from
+`Total Discharges` and keeping them for its own average length of stay (`Patient Days` / `Total Discharges`).
+All hospitals share one event loop: free beds, thresholds and per-hospital totals are NumPy arrays, and bed
+releases, routing and totals are vectorized over every minute's arrivals across the whole network. Admissions
+themselves are decided one patient at a time in arrival order, since the threshold is re-read after every
+admission (sim.py's rule).
+
+A patient rejected by one hospital can be transferred under a Routing policy: the patient reaches the chosen
+hospital `delay` minutes later and is decided again there. Routing only looks at the bed board, a snapshot of
+free beds published every `delay` minutes, never at live counts in another hospital. Patients finally rejected go
+to config.pools (icu_sim.resources) at the hospital that made the last decision, exactly as in icu_sim.engine;
+a capacity-limited pool has `capacity` slots at every hospital. Patients still in transit at t_n stay UNDECIDED
+and are counted per destination in NetworkRun.in_transit.
+
+    python -m icu_sim.network --routing city --seed 1
+'''
+################################################################################################################################################
+import argparse
+import heapq
+from collections import deque
+import numpy as np
+from icu_sim.cohort import generate_cohort
+from icu_sim.config import SimConfig
+from icu_sim.engine import EventLog
+from icu_sim.hospitals import HOSPITALS_CSV, load_hospitals
+from icu_sim.patients import ACCEPTED, REJECTED, AT_HOME, POOLED, UNDECIDED
+from icu_sim.resources import DEFAULT_POOLS, NO_POOL, pool_stays
+from icu_sim.streams import RandomStreams
+from icu_sim.thresholds import acceptance_thresholds
+################################################################################################################################################
+'''Constants'''
+DEFAULT_TRANSFER_DELAY = 30 # minutes from a rejection to arrival at the receiving hospital
+NETWORK_POLICIES = ('utility', 'fcfs')
+ROW_FIELDS = (('index', np.int64), ('u', np.float64), ('stay', np.int64), ('origin', np.int64), ('transfers', np.int8), ('dest', np.int64))
+TRANSFER_FIELDS = (('time', np.int64),) + ROW_FIELDS # patients in transit between hospitals
+################################################################################################################################################
+'''Routing'''
+class Routing:
+    neighbors: np.ndarray # (H, H) bool, neighbors[a, b] = a may transfer patients to b
+    max_transfers: int # transfers allowed per patient
+    delay: int # minutes in transit, also the bed board refresh interval
+    def __init__(self, neighbors, max_transfers: int = 1, delay: int = DEFAULT_TRANSFER_DELAY):
+        if delay < 1:
+            raise ValueError("Transfer delay must be at least one minute")
+        self.neighbors = np.asarray(neighbors, dtype=bool).copy()
+        np.fill_diagonal(self.neighbors, False)
+        self.max_transfers = max_transfers
+        self.delay = delay
+
+    @classmethod
+    def none(cls, n_hospitals: int):
+        return cls(np.zeros((n_hospitals, n_hospitals), dtype=bool), max_transfers=0)
+
+    @classmethod
+    def same_city(cls, city_codes, max_transfers: int = 1, delay: int = DEFAULT_TRANSFER_DELAY):
+        '''Transfer only between hospitals in the same City'''
+        city_codes = np.asarray(city_codes)
+        return cls(city_codes[:, None] == city_codes[None, :], max_transfers, delay)
+
+    @classmethod
+    def statewide(cls, n_hospitals: int, max_transfers: int = 1, delay: int = DEFAULT_TRANSFER_DELAY):
+        '''Transfer to any hospital in the network'''
+        return cls(np.ones((n_hospitals, n_hospitals), dtype=bool), max_transfers, delay)
+
+    def route(self, current, origin, board):
+        '''
+        Destination per rejected patient: the neighbor of `current` with the most free beds on the board
+        (lowest index on ties), never the patient's origin hospital; -1 when no neighbor has a free bed
+        '''
+        candidates = self.neighbors[current] & (board > 0)
+        candidates[np.arange(len(current)), origin] = False
+        score = np.where(candidates, board, -1)
+        dest = score.argmax(axis=1)
+        dest[score[np.arange(len(current)), dest] <= 0] = -1
+        return dest
+
+    def __repr__(self):
+        return f"{type(self).__name__}(hospitals={len(self.neighbors)}, max_transfers={self.max_transfers}, delay={self.delay})"
+
+def make_routing(name: str, network, **kwargs):
+    '''Routing by name: 'none', 'city' (same City) or 'statewide' '''
+    if name == 'none':
+        return Routing.none(len(network))
+    if name == 'city':
+        return Routing.same_city(network.city_codes, **kwargs)
+    if name == 'statewide':
+        return Routing.statewide(len(network), **kwargs)
+    raise ValueError(f"Unknown routing {name!r}, expected 'none', 'city' or 'statewide'")
+################################################################################################################################################
+'''Network'''
+class HospitalNetwork:
+    hospitals: object # HospitalTable
+    capacity: np.ndarray # int64 beds per hospital
+    daily_arrivals: np.ndarray # float64 expected patients per day per hospital
+    average_stay: np.ndarray # float64 average minutes in hospital per hospital
+    city_codes: np.ndarray # int code per hospital into cities
+    def __init__(self, hospitals, config: SimConfig = None, arrival_scale: float = 1.0):
+        '''
+        arrival_scale: daily arrivals per hospital = arrival_scale * Total Discharges / 365
+        Hospitals with no discharge or patient-day figures fall back to no arrivals / config.average_minutes_in_hospital
+        '''
+        self.config = SimConfig() if config is None else config
+        self.hospitals = hospitals
+        self.capacity = hospitals.staffed_beds.astype(np.int64)
+        self.daily_arrivals = arrival_scale * np.nan_to_num(hospitals.total_discharges) / 365
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stay = hospitals.patient_days / hospitals.total_discharges * 24 * 60
+        self.average_stay = np.where(np.isfinite(stay), stay, self.config.average_minutes_in_hospital)
+        self.city_codes, self.cities = hospitals.city_codes()
+
+    def __len__(self):
+        return len(self.capacity)
+
+    def cohort(self, rng=None):
+        '''
+        One cohort for the whole network: (PatientTable, origin hospital per patient)
+        Severity, age, arrival time and utility follow the config tables; stays scale with the origin's average stay
+        '''
+        rng = RandomStreams() if rng is None else rng
+        counts = np.rint(self.daily_arrivals * self.config.days).astype(np.int64)
+        origin = np.repeat(np.arange(len(self), dtype=np.int32), counts)
+        average = self.average_stay[origin]
+        c = self.config
+        patients = generate_cohort(len(origin), c.days, average, average / 2, c.overall_probs, c.arrival_times,
+                                   c.distribution_data, stay_scale=c.stay_scale, arrival_process=c.arrival_process,
+                                   stay_model=c.stay_model, rng=rng)
+        return patients, origin
+
+    @property
+    def pools(self):
+        '''ResourcePools of rejected patients, from the config'''
+        return DEFAULT_POOLS if self.config.pools is None else tuple(self.config.pools)
+
+    def thresholds(self, policy: str = 'utility'):
+        '''
+        Concatenated per-hospital threshold schedules: (values, offsets), hospital h with x free beds -> values[offsets[h] + x]
+        'utility' uses each hospital's geometric schedule from config e and base_threshold, 'fcfs' admits whenever a bed is free
+        '''
+        if policy not in NETWORK_POLICIES:
+            raise ValueError(f"Unknown network policy {policy!r}, expected one of {NETWORK_POLICIES}")
+        offsets = np.concatenate(([0], np.cumsum(self.capacity + 1)[:-1]))
+        if policy == 'fcfs':
+            return np.full(int(np.sum(self.capacity + 1)), -np.inf), offsets
+        schedules = [acceptance_thresholds(int(m), self.config.e, self.config.base_threshold).values for m in self.capacity]
+        return np.concatenate(schedules), offsets
+################################################################################################################################################
+'''Network Result'''
+class NetworkRun:
+    captured: np.ndarray # float64 utility captured per hospital
+    rejected: np.ndarray # float64 utility of patients finally rejected by each hospital
+    at_home: np.ndarray # float64 utility recovered by the at-home pool per hospital
+    pool_utility: np.ndarray # float64 (hospitals, pools) utility recovered by every pool
+    pool_placed: np.ndarray # int64 (hospitals, pools) placements
+    pool_full: np.ndarray # int64 (hospitals, pools) eligible patients turned away by a full pool
+    admitted: np.ndarray # int64 admissions per hospital
+    transfers_out: np.ndarray # int64 patients each hospital sent elsewhere
+    transfers_in: np.ndarray # int64 transferred patients arriving at each hospital
+    in_transit: np.ndarray # int64 patients still on their way to each hospital at t_n (left UNDECIDED)
+    decision: np.ndarray # int8 final decision per patient (UNDECIDED if never arrived)
+    placed: np.ndarray # int32 hospital that admitted each patient, -1 if none
+    pool_index: np.ndarray # int8 index into pools of the pool each patient was placed in (NO_POOL if none)
+    transfers: np.ndarray # int8 transfers per patient
+    pools: tuple # pool names
+    log: EventLog # network-wide running totals
+    def __init__(self, n_hospitals: int, n_patients: int, beds: int, pools=DEFAULT_POOLS):
+        self.captured = np.zeros(n_hospitals)
+        self.rejected = np.zeros(n_hospitals)
+        self.at_home = np.zeros(n_hospitals)
+        self.pool_utility = np.zeros((n_hospitals, len(pools)))
+        self.pool_placed = np.zeros((n_hospitals, len(pools)), dtype=np.int64)
+        self.pool_full = np.zeros((n_hospitals, len(pools)), dtype=np.int64)
+        self.admitted = np.zeros(n_hospitals, dtype=np.int64)
+        self.transfers_out = np.zeros(n_hospitals, dtype=np.int64)
+        self.transfers_in = np.zeros(n_hospitals, dtype=np.int64)
+        self.in_transit = np.zeros(n_hospitals, dtype=np.int64)
+        self.decision = np.full(n_patients, UNDECIDED, dtype=np.int8)
+        self.placed = np.full(n_patients, -1, dtype=np.int32)
+        self.pool_index = np.full(n_patients, NO_POOL, dtype=np.int8)
+        self.transfers = np.zeros(n_patients, dtype=np.int8)
+        self.pools = tuple(pool.name for pool in pools)
+        self.log = EventLog(beds)
+
+    @property
+    def total_u_captured(self):
+        return float(self.captured.sum())
+
+    @property
+    def total_u_rejected(self):
+        return float(self.rejected.sum())
+
+    @property
+    def total_stay_at_home_u(self):
+        return float(self.at_home.sum())
+
+    @property
+    def total_pool_u(self):
+        return float(self.pool_utility.sum())
+
+    @property
+    def total_in_transit(self):
+        return int(self.in_transit.sum())
+
+    @property
+    def net_utility(self):
+        return (self.total_u_captured + self.total_pool_u) - self.total_u_rejected
+
+    def hospital_summary(self, network: HospitalNetwork):
+        '''One dict per hospital: name, city, beds and its totals'''
+        net = self.captured + self.pool_utility.sum(axis=1) - self.rejected
+        return [{'hospital': network.hospitals.name[h], 'city': network.hospitals.city[h], 'beds': int(network.capacity[h]),
+                 'admitted': int(self.admitted[h]), 'transfers_out': int(self.transfers_out[h]),
+                 'transfers_in': int(self.transfers_in[h]), 'in_transit': int(self.in_transit[h]), 'net_utility': float(net[h])}
+                for h in range(len(network))]
+################################################################################################################################################
+'''Engine'''
+def _admit_in_order(h, u, beds, values: list, offsets: list):
+    '''
+    Admission mask of rows decided one after another: a row is admitted when its hospital h has a free bed and
+    u > values[offsets[h] + free beds], re-read after every admission (ThresholdPolicy, sim.py's rule)
+    '''
+    free = beds.tolist()
+    admit = np.zeros(len(h), dtype=bool)
+    for j, (k, uj) in enumerate(zip(h.tolist(), u.tolist())):
+        b = free[k]
+        if b > 0 and uj > values[offsets[k] + b]:
+            free[k] = b - 1
+            admit[j] = True
+    return admit
+
+def _concat(parts: list, fields=TRANSFER_FIELDS):
+    '''Stack a list of {field: array} row blocks into one block'''
+    if not parts:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in fields}
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name, _ in fields}
+
+class _Shard:
+    '''
+    Event loop over a subset of the hospitals (`members`) and the patients that first arrive there
+    The shard advances one time window at a time. Transfers it sends out are handed back to the driver, which
+    delivers them to the shard owning the destination before the window they arrive in, together with the bed board.
+    '''
+    def __init__(self, members, capacity, values, offsets, routing: Routing, n_hospitals: int, patient_index, arrival_time, u, stay, origin,
+                 pools=DEFAULT_POOLS, stays=None):
+        '''stays: slot-holding minutes of every patient (global index) per pool, None for unlimited pools (pool_stays)'''
+        self.members = np.asarray(members, dtype=np.int64)
+        self.local = np.full(n_hospitals, -1, dtype=np.int64)
+        self.local[self.members] = np.arange(len(self.members))
+        self.capacity = np.asarray(capacity, dtype=np.int64)
+        self.beds = self.capacity.copy()
+        self.values = np.asarray(values).tolist() # plain floats for one-at-a-time lookups
+        self.offsets = np.asarray(offsets).tolist()
+        self.routing = routing
+        H = len(self.members)
+        self.fallbacks = [(p, pool.utility_range[0], pool.utility_range[1], pool.factor, pool.at_home) for p, pool in enumerate(pools)]
+        self.stays = [None] * len(pools) if stays is None else stays
+        self.pool_free = [[pool.capacity for pool in pools] for _ in range(H)]
+        self.pool_placed = [[0] * len(pools) for _ in range(H)]
+        self.pool_full = [[0] * len(pools) for _ in range(H)]
+        self.pool_utility = [[0.0] * len(pools) for _ in range(H)]
+
+        # Own arrivals sorted once (stable, so same-minute arrivals keep patient order) and cut into minute batches
+        order = np.argsort(arrival_time, kind='stable')
+        self.arrivals = {'index': np.asarray(patient_index, dtype=np.int64)[order], 'u': np.asarray(u, dtype=np.float64)[order],
+                         'stay': np.asarray(stay, dtype=np.int64)[order], 'origin': np.asarray(origin, dtype=np.int64)[order],
+                         'transfers': np.zeros(len(order), dtype=np.int8)}
+        self.arrival_times = np.asarray(arrival_time, dtype=np.int64)[order]
+        self.starts = np.flatnonzero(np.diff(self.arrival_times, prepend=self.arrival_times[:1] - 1)).tolist()
+        self.ends = self.starts[1:] + [len(order)]
+        self.batch = 0
+        self.in_transit = deque() # (arrival time, rows), one entry per minute, rows ordered by patient index
+        self.discharges = [] # heap of (discharge time, local hospital, 0 for an ICU bed or 1 + pool index)
+
+        self.totals = {name: np.zeros(H) for name in ('captured', 'rejected', 'at_home')}
+        self.totals.update({name: np.zeros(H, dtype=np.int64) for name in ('admitted', 'transfers_out', 'transfers_in')})
+        self.final = [] # (patient indices, decision, placed, transfers, pool index)
+        self.records = [] # per-minute deltas of the hospitals touched: (t, hospital, captured, rejected, at_home, beds)
+
+    def next_event(self):
+        return min(self.arrival_times[self.starts[self.batch]] if self.batch < len(self.starts) else np.inf,
+                   self.in_transit[0][0] if self.in_transit else np.inf,
+                   self.discharges[0][0] if self.discharges else np.inf)
+
+    def receive(self, rows: dict):
+        '''Queue incoming transfers; every minute's transfers are decided in patient order'''
+        if len(rows['index']) == 0:
+            return
+        pending = [rows] + [queued for _, queued in self.in_transit]
+        rows = _concat(pending)
+        order = np.lexsort((rows['index'], rows['time']))
+        rows = {name: values[order] for name, values in rows.items()}
+        starts = np.flatnonzero(np.diff(rows['time'], prepend=rows['time'][:1] - 1)).tolist()
+        self.in_transit = deque((int(rows['time'][s]), {name: values[s:e] for name, values in rows.items()})
+                                for s, e in zip(starts, starts[1:] + [len(order)]))
+
+    def advance(self, end, incoming: dict, board):
+        '''Process every event before `end`; returns (free beds, outgoing transfers, next event time)'''
+        self.receive(incoming)
+        H = len(self.members)
+        totals = self.totals
+        outgoing = []
+        while True:
+            t = self.next_event()
+            if t >= end:
+                break
+            t = int(t)
+
+            # Discharges at time t are processed before arrivals at time t
+            freed = []
+            while self.discharges and self.discharges[0][0] <= t:
+                _, k, p = heapq.heappop(self.discharges)
+                if p:
+                    self.pool_free[k][p - 1] += 1
+                else:
+                    freed.append(k)
+            released = np.bincount(freed, minlength=H)
+            self.beds += released
+            np.minimum(self.beds, self.capacity, out=self.beds) # Don't exceed max capacity
+
+            parts = []
+            if self.in_transit and self.in_transit[0][0] == t:
+                rows = self.in_transit.popleft()[1]
+                parts.append(rows)
+                totals['transfers_in'] += np.bincount(self.local[rows['dest']], minlength=H)
+            if self.batch < len(self.starts) and self.arrival_times[self.starts[self.batch]] == t:
+                s, e = self.starts[self.batch], self.ends[self.batch]
+                rows = {name: values[s:e] for name, values in self.arrivals.items()}
+                rows['dest'] = rows['origin']
+                parts.append(rows)
+                self.batch += 1
+
+            touched = released > 0
+            captured = np.zeros(H)
+            rejected = np.zeros(H)
+            at_home = np.zeros(H)
+            beds_before = self.beds.copy()
+            if parts:
+                rows = _concat(parts, ROW_FIELDS)
+                i, u, h = rows['index'], rows['u'], self.local[rows['dest']]
+                admit = _admit_in_order(h, u, self.beds, self.values, self.offsets)
+                touched |= np.bincount(h, minlength=H) > 0
+
+                # Admissions
+                ah = h[admit]
+                self.beds -= np.bincount(ah, minlength=H)
+                totals['admitted'] += np.bincount(ah, minlength=H)
+                captured = np.bincount(ah, weights=u[admit], minlength=H)
+                for stop, k in zip((t + rows['stay'][admit]).tolist(), ah.tolist()):
+                    heapq.heappush(self.discharges, (stop, k, 0))
+                self.final.append((i[admit], np.full(len(ah), ACCEPTED, dtype=np.int8), self.members[ah], rows['transfers'][admit],
+                                   np.full(len(ah), NO_POOL, dtype=np.int8)))
+
+                # Transfers
+                rejected_rows = ~admit
+                dest = np.full(len(i), -1)
+                can_move = rejected_rows & (rows['transfers'] < self.routing.max_transfers)
+                if can_move.any():
+                    dest[can_move] = self.routing.route(self.members[h[can_move]], rows['origin'][can_move], board)
+                moving = dest >= 0
+                if moving.any():
+                    totals['transfers_out'] += np.bincount(h[moving], minlength=H)
+                    outgoing.append({'time': np.full(int(moving.sum()), t + self.routing.delay, dtype=np.int64),
+                                     'index': i[moving], 'u': u[moving], 'stay': rows['stay'][moving],
+                                     'origin': rows['origin'][moving], 'transfers': rows['transfers'][moving] + 1,
+                                     'dest': dest[moving]})
+
+                # Final rejections, at the hospital that made the last decision
+                final = rejected_rows & ~moving
+                fi, fh, fu = i[final], h[final], u[final]
+                rejected = np.bincount(fh, weights=fu, minlength=H)
+                decision, pool_index, at_home = self._place(t, fi, fh, fu)
+                self.final.append((fi, decision, np.full(len(fh), -1, dtype=np.int64), rows['transfers'][final], pool_index))
+
+            totals['captured'] += captured
+            totals['rejected'] += rejected
+            totals['at_home'] += at_home
+            k = np.flatnonzero(touched)
+            self.records.append((np.full(len(k), t, dtype=np.int64), self.members[k], captured[k], rejected[k], at_home[k],
+                                 (self.beds - beds_before + released)[k]))
+        return self.beds.copy(), _concat(outgoing), self.next_event()
+
+    def _place(self, t: int, index, h, u):
+        '''
+        Finally rejected rows go to the first eligible pool with a free slot at their hospital (icu_sim.engine's rule)
+        Returns (decision, pool index) per row and the utility the at-home pool recovered per hospital
+        '''
+        H = len(self.members)
+        decision = np.full(len(index), REJECTED, dtype=np.int8)
+        pool_index = np.full(len(index), NO_POOL, dtype=np.int8)
+        at_home = [0.0] * H
+        for j, (i, k, ui) in enumerate(zip(index.tolist(), h.tolist(), u.tolist())):
+            free = self.pool_free[k]
+            for p, low, high, factor, home in self.fallbacks:
+                if low <= ui <= high:
+                    if free[p] is not None:
+                        if free[p] == 0:
+                            self.pool_full[k][p] += 1
+                            continue
+                        free[p] -= 1
+                        heapq.heappush(self.discharges, (t + int(self.stays[p][i]), k, p + 1))
+                    self.pool_placed[k][p] += 1
+                    self.pool_utility[k][p] += ui * factor
+                    if home:
+                        at_home[k] += ui * factor
+                    decision[j], pool_index[j] = (AT_HOME if home else POOLED), p
+                    break
+        return decision, pool_index, np.array(at_home)
+
+    def finish(self):
+        '''Per-hospital totals (in `members` order), finalized patients and per-minute deltas'''
+        final = [np.concatenate(column) if column else np.empty(0, dtype=np.int64) for column in zip(*self.final)] or [np.empty(0, dtype=np.int64)] * 5
+        records = [np.concatenate(column) for column in zip(*self.records)] or [np.empty(0)] * 6
+        totals = dict(self.totals, pool_utility=np.array(self.pool_utility), pool_placed=np.array(self.pool_placed, dtype=np.int64),
+                      pool_full=np.array(self.pool_full, dtype=np.int64))
+        return self.members, totals, final, records
+
+def _shards(network: HospitalNetwork, patients, origin, policy: str, routing: Routing, shard_of, rng=None):
+    '''
+    One _Shard per distinct value of shard_of (shard id per hospital)
+    rng: RandomStreams or Generator the stays in capacity-limited pools are drawn from
+    '''
+    values, offsets = network.thresholds(policy)
+    stay = (patients.dispatch_time - patients.arrival_time).astype(np.int64)
+    pools = network.pools
+    stays = pool_stays(pools, patients, rng=rng)
+    shard_of = np.asarray(shard_of)
+    shards = []
+    for s in np.unique(shard_of).tolist():
+        members = np.flatnonzero(shard_of == s)
+        mine = np.flatnonzero(np.isin(origin, members)) # patient order is kept
+        local_offsets = np.concatenate(([0], np.cumsum(network.capacity[members] + 1)[:-1]))
+        local_values = np.concatenate([values[offsets[h]:offsets[h] + network.capacity[h] + 1] for h in members])
+        shards.append(_Shard(members, network.capacity[members], local_values, local_offsets, routing, len(network),
+                             mine, patients.arrival_time[mine], patients.u[mine], stay[mine], origin[mine], pools, stays))
+    return shards
+
+def _run_windows(advance, n_shards: int, shard_of, network: HospitalNetwork, routing: Routing, t_n):
+    '''
+    Conservative time-window driver: every shard processes [start, start + window) on its own, where the window is the
+    transfer delay, so no transfer sent inside a window can arrive before it ends. At each boundary the driver routes
+    the transfers to the shards owning their destination and publishes the bed board (free beds of every hospital).
+    advance(messages) runs shard k's advance(*messages[k]) for every k and returns the replies in shard order.
+    Returns the transfers still in transit at t_n.
+    '''
+    shard_ids, position = np.unique(np.asarray(shard_of), return_inverse=True) # hospital -> shard position
+    window = routing.delay if routing.max_transfers > 0 else max(int(t_n), 1)
+    board = network.capacity.copy()
+    in_transit = _concat([])
+    start = 0
+    while start < t_n:
+        end = min(start + window, t_n)
+        owner = position[in_transit['dest']]
+        messages = [(end, {name: values[owner == k] for name, values in in_transit.items()}, board) for k in range(n_shards)]
+        replies = advance(messages)
+
+        board = board.copy()
+        for k, (beds, _, _) in enumerate(replies):
+            board[position == k] = beds
+        in_transit = _concat([outgoing for _, outgoing, _ in replies])
+        next_event = min([event for _, _, event in replies] + [in_transit['time'].min() if len(in_transit['time']) else np.inf])
+        if next_event >= t_n:
+            break
+        start = max(end, int(next_event) // window * window)
+    return in_transit
+
+def _collect(network: HospitalNetwork, n_patients: int, finished: list, in_transit: dict):
+    '''Assemble a NetworkRun from every shard's finish() and the transfers left in transit'''
+    run = NetworkRun(len(network), n_patients, int(network.capacity.sum()), network.pools)
+    records = []
+    for members, totals, (index, decision, placed, transfers, pool_index), shard_records in finished:
+        for name, values in totals.items():
+            getattr(run, name)[members] = values
+        run.decision[index] = decision
+        run.placed[index] = placed
+        run.transfers[index] = transfers
+        run.pool_index[index] = pool_index
+        records.append(shard_records)
+    run.transfers[in_transit['index']] = in_transit['transfers']
+    run.in_transit = np.bincount(in_transit['dest'], minlength=len(network)).astype(np.int64)
+
+    # Network running totals from the per-minute, per-hospital deltas in (minute, hospital) order
+    t, h, captured, rejected, at_home, beds = [np.concatenate(column) for column in zip(*records)]
+    order = np.lexsort((h, t))
+    last = np.flatnonzero(np.r_[t[order][1:] != t[order][:-1], True]) if len(t) else np.empty(0, dtype=np.int64)
+    run.log.times = t[order][last].tolist()
+    run.log.captured = np.cumsum(captured[order])[last].tolist()
+    run.log.rejected = np.cumsum(rejected[order])[last].tolist()
+    run.log.at_home = np.cumsum(at_home[order])[last].tolist()
+    run.log.beds = (int(network.capacity.sum()) + np.cumsum(beds[order].astype(np.int64))[last]).tolist()
+    return run
+
+def simulate_network(network: HospitalNetwork, patients, origin, policy: str = 'utility', routing: Routing = None, t_n=None, rng=None):
+    '''
+    Run one admission policy at every hospital of `network` until t_n (default config.t_n)
+
+    Each minute, transfers arriving at that minute and then new arrivals are decided together, each group in patient
+    order: a patient is admitted when its hospital has a free bed and u > thresholds[free beds], re-read after every
+    admission, so a one-hospital network decides exactly like run_simulation's policy of the same name. Rejected
+    patients with transfers left are sent to routing.route(); the others go to the config's resource pools (or are
+    rejected) at the hospital that made the final decision.
+    rng: RandomStreams or Generator of the stays in capacity-limited pools (unused with the default at-home program)
+    icu_sim.sharded runs the same windows across processes with bit-identical results.
+    '''
+    t_n = network.config.t_n if t_n is None else t_n
+    routing = Routing.none(len(network)) if routing is None else routing
+    shard_of = np.zeros(len(network), dtype=np.int64)
+    shards = _shards(network, patients, origin, policy, routing, shard_of, rng)
+    in_transit = _run_windows(lambda messages: [s.advance(*m) for s, m in zip(shards, messages)], len(shards),
+                              shard_of, network, routing, t_n)
+    return _collect(network, len(patients), [s.finish() for s in shards], in_transit)
+
+def run_network(config: SimConfig = None, hospitals=None, policy: str = 'utility', routing: str = 'city',
+                arrival_scale: float = 1.0, seed=None, **routing_kwargs):
+    '''Load patients.csv (unless `hospitals` is given), draw a network cohort and simulate it; returns (network, NetworkRun)'''
+    network = HospitalNetwork(load_hospitals() if hospitals is None else hospitals, config, arrival_scale)
+    streams = RandomStreams(seed)
+    patients, origin = network.cohort(streams)
+    return network, simulate_network(network, patients, origin, policy, make_routing(routing, network, **routing_kwargs), rng=streams)
+################################################################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate every hospital in patients.csv as one network')
+    parser.add_argument('--csv', default=HOSPITALS_CSV)
+    parser.add_argument('--policy', choices=NETWORK_POLICIES, default='utility')
+    parser.add_argument('--routing', choices=('none', 'city', 'statewide'), default='city')
+    parser.add_argument('--max-transfers', type=int, default=1)
+    parser.add_argument('--delay', type=int, default=DEFAULT_TRANSFER_DELAY)
+    parser.add_argument('--arrival-scale', type=float, default=1.0)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    routing_kwargs = {} if args.routing == 'none' else {'max_transfers': args.max_transfers, 'delay': args.delay}
+    network, run = run_network(SimConfig(days=args.days), load_hospitals(args.csv), args.policy, args.routing,
+                               args.arrival_scale, args.seed, **routing_kwargs)
+    for row in sorted(run.hospital_summary(network), key=lambda row: -row['net_utility']):
+        print(', '.join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+    print(f"\nNetwork: captured={run.total_u_captured:.2f}, rejected={run.total_u_rejected:.2f}, "
+          f"at-home={run.total_stay_at_home_u:.2f}, net utility={run.net_utility:.2f}, transfers={int(run.transfers_out.sum())}, "
+          f"in transit at the end={run.total_in_transit}")
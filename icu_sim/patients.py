@@ -0,0 +1,44 @@
+################################################################################################################################################
+'''
+Columnar (struct-of-arrays) patient store
+
+One NumPy array per attribute instead of one Person object per patient: integer ids, int8 codes for
+severity and age group, int32 times and float32 utilities (~18 bytes per patient).
+Status and decision codes depend on the admission policy, so they are kept per policy on each engine Run.
+'''
+################################################################################################################################################
+import numpy as np
+################################################################################################################################################
+'''Codes (code = index into the tuple)'''
+SEVERITIES = ('urgent', 'semi_urgent', 'non_urgent')
+AGE_GROUPS = ('0-17', '18-44', '45-64', '65+')
+STATUSES = ('pending', 'in bed', 'discharged', 'at-home program', 'rejected', 'waitlist', 'in pool')
+DECISIONS = ('ACCEPTED', 'REJECTED', 'AT-HOME', 'POOLED') # POOLED: placed in a resource pool other than the at-home program
+
+PENDING, IN_BED, DISCHARGED, AT_HOME_PROGRAM, REJECTED_STATUS, WAITLIST, IN_POOL = range(len(STATUSES))
+ACCEPTED, REJECTED, AT_HOME, POOLED = range(len(DECISIONS))
+UNDECIDED = -1 # decision of a patient who has not arrived yet
+################################################################################################################################################
+'''Patient Table'''
+class PatientTable:
+    id: np.ndarray # int32
+    severity: np.ndarray # int8 code into SEVERITIES
+    age: np.ndarray # int8 code into AGE_GROUPS
+    arrival_time: np.ndarray # int32, 0 -> Time t sub n
+    dispatch_time: np.ndarray # int32, arrival_time + stay duration
+    u: np.ndarray # float32 utility
+    def __init__(self, severity, age, arrival_time, dispatch_time, u):
+        n = len(u)
+        self.id = np.arange(n, dtype=np.int32)
+        self.severity = np.asarray(severity, dtype=np.int8)
+        self.age = np.asarray(age, dtype=np.int8)
+        self.arrival_time = np.asarray(arrival_time, dtype=np.int32)
+        self.dispatch_time = np.asarray(dispatch_time, dtype=np.int32)
+        self.u = np.asarray(u, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__annotations__)
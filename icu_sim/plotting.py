@@ -0,0 +1,219 @@
+################################################################################################################################################
+'''
+Figures of the simulation scripts, kept out of the library so that importing icu_sim never loads matplotlib
+
+matplotlib is imported the first time a figure is drawn. Every function returns the Figure, saves it when
+`path` is given and only opens a window when `show=True`, so the same calls work in headless batch jobs.
+Simulation figures draw decimated series and pre-binned histograms (icu_sim.reporting); the draw_* functions
+take that report data and an empty Figure, so icu_sim.reporting can render them without pyplot.
+'''
+################################################################################################################################################
+import numpy as np
+from icu_sim.patients import AGE_GROUPS, ACCEPTED, REJECTED, AT_HOME, POOLED
+################################################################################################################################################
+'''Helpers'''
+def _pyplot():
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError as err:
+        raise ImportError("Plotting needs matplotlib (pip install matplotlib)") from err
+    return plt
+
+def _finish(fig, path=None, show=False):
+    plt = _pyplot()
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path)
+    if show:
+        plt.show()
+    return fig
+################################################################################################################################################
+'''Simulation Figures'''
+FIGSIZES = {'comparison': (15, 15), 'run': (15, 20), 'run_by_age': (20, 25)}
+
+def _hist(ax, edges, counts: list, labels: list):
+    # Pre-binned counts drawn exactly like ax.hist of the raw values: one weighted sample per bin centre
+    centers = (edges[:-1] + edges[1:]) / 2
+    ax.hist([centers] * len(counts), bins=edges, weights=counts, label=labels, alpha=0.7)
+
+def plot_comparison(result, policy: str = 'utility', baseline: str = 'fcfs', path=None, show=False, points: int = None):
+    '''
+    sim.py's figure: captured utility, beds, utility distributions and rejected utility of two policies
+    Series are decimated to `points` vertices (icu_sim.reporting) and histograms drawn from pre-binned counts
+    '''
+    from icu_sim.reporting import DEFAULT_POINTS, comparison_data
+    plt = _pyplot()
+    fig = plt.figure(figsize=FIGSIZES['comparison'])
+    draw_comparison(fig, comparison_data(result, policy, baseline, points or DEFAULT_POINTS))
+    return _finish(fig, path, show)
+
+def draw_comparison(fig, data: dict):
+    '''Draw icu_sim.reporting.comparison_data on an empty Figure'''
+    policy, baseline, series = data['policy'], data['baseline'], data['series']
+    (ax1, ax2), (ax3, ax4) = fig.subplots(2, 2)
+
+    # Plot total utility over time for both approaches
+    ax1.plot(*series['captured', policy], label='Utility-based Captured')
+    ax1.plot(*series['captured', baseline], label='FCFS Captured', linestyle='--')
+    ax1.set_title('Captured Utility Over Time')
+    ax1.set_xlabel('Time (minutes)')
+    ax1.set_ylabel('Total Utility')
+    ax1.legend()
+
+    # Plot available beds over time for both approaches
+    ax2.plot(*series['beds', policy], label='Utility-based')
+    ax2.plot(*series['beds', baseline], label='FCFS', linestyle='--')
+    ax2.set_title('Available Beds Over Time')
+    ax2.set_xlabel('Time (minutes)')
+    ax2.set_ylabel('Number of Beds')
+    ax2.legend()
+
+    # Plot utility distributions for both approaches
+    ours, theirs = data['hists'][policy], data['hists'][baseline]
+    counts = [ours[:, ACCEPTED], ours[:, REJECTED], ours[:, AT_HOME]]
+    labels = ['Utility Accepted', 'Utility Rejected', 'Utility At-Home']
+    if ours[:, POOLED].any():
+        counts.append(ours[:, POOLED])
+        labels.append('Utility Other Pools')
+    _hist(ax3, data['edges'], counts + [theirs[:, ACCEPTED], theirs[:, REJECTED] + theirs[:, AT_HOME] + theirs[:, POOLED]],
+          labels + ['FCFS Accepted', 'FCFS Rejected'])
+    ax3.set_title('Distribution of Patient Utilities')
+    ax3.set_xlabel('Utility Value')
+    ax3.set_ylabel('Frequency')
+    ax3.legend()
+
+    # Plot rejected utility over time for both approaches
+    ax4.plot(*series['rejected', policy], label='Utility-based Rejected')
+    ax4.plot(*series['rejected', baseline], label='FCFS Rejected', linestyle='--')
+    ax4.set_title('Rejected Utility Over Time')
+    ax4.set_xlabel('Time (minutes)')
+    ax4.set_ylabel('Total Rejected Utility')
+    ax4.legend()
+    return fig
+
+def plot_run(result, policy: str = 'utility', results=None, by_age: bool = False, path=None, show=False, points: int = None):
+    '''
+    two_way_sim.py's figure (utility and beds over time, utility distribution, at-home utility), plus
+    age_disc_sim.py's acceptance-rate and count bars per age group when by_age=True
+    results: icu_sim.results.Results to read decisions from (e.g. a memory-mapped .cols artifact); built from the run by default
+    '''
+    from icu_sim.reporting import DEFAULT_POINTS, run_data
+    plt = _pyplot()
+    fig = plt.figure(figsize=FIGSIZES['run_by_age' if by_age else 'run'])
+    draw_run(fig, run_data(result, policy, results, by_age, points or DEFAULT_POINTS))
+    return _finish(fig, path, show)
+
+def draw_run(fig, data: dict):
+    '''Draw icu_sim.reporting.run_data on an empty Figure'''
+    series = data['series']
+    if data['age_counts'] is not None:
+        (ax1, ax2), (ax3, ax4), (ax5, ax6) = fig.subplots(3, 2)
+    else:
+        ax1, ax2, ax3, ax4 = fig.subplots(4, 1)
+
+    # Plot total utility over time
+    ax1.plot(*series['captured'], label='Captured Utility')
+    ax1.plot(*series['rejected'], label='Rejected Utility')
+    ax1.plot(*series['at_home'], label='Stay-at-Home Utility')
+    ax1.set_title('Utility Over Time (with growth factor)')
+    ax1.set_xlabel('Time (minutes)')
+    ax1.set_ylabel('Total Utility')
+    ax1.legend()
+
+    # Plot available beds over time
+    ax2.plot(*series['beds'])
+    ax2.set_title('Available Beds Over Time')
+    ax2.set_xlabel('Time (minutes)')
+    ax2.set_ylabel('Number of Beds')
+
+    # Plot utility distribution
+    hist = data['hist']
+    counts, labels = [hist[:, ACCEPTED], hist[:, REJECTED], hist[:, AT_HOME]], ['Accepted', 'Rejected', 'At-Home']
+    if hist[:, POOLED].any():
+        counts.append(hist[:, POOLED])
+        labels.append('Other Pools')
+    _hist(ax3, data['edges'], counts, labels)
+    ax3.set_title('Distribution of Patient Utilities')
+    ax3.set_xlabel('Utility Value')
+    ax3.set_ylabel('Frequency')
+    ax3.legend()
+
+    # Plot stay at home program utility
+    ax4.plot(*series['at_home'])
+    ax4.set_title('Stay-at-Home Program Utility Over Time')
+    ax4.set_xlabel('Time (minutes)')
+    ax4.set_ylabel('Total Stay-at-Home Utility')
+
+    if data['age_counts'] is not None:
+        draw_age_decisions(data['age_counts'], ax5, ax6)
+    return fig
+
+def plot_age_decisions(results, ax_rates, ax_counts):
+    '''Acceptance vs rejection rates and decision counts per age group, from one age x decision crosstab'''
+    draw_age_decisions(results.crosstab('age', 'decision'), ax_rates, ax_counts)
+
+def draw_age_decisions(counts, ax_rates, ax_counts):
+    '''Bars of an age x decision count table (rows follow AGE_GROUPS, columns DECISIONS)'''
+    totals = counts.sum(axis=1)
+
+    # Plot acceptance rates by age
+    x = np.arange(len(AGE_GROUPS))
+    width = 0.35
+    ax_rates.bar(x - width/2, counts[:, ACCEPTED] / totals * 100, width, label='Accepted')
+    ax_rates.bar(x + width/2, counts[:, REJECTED] / totals * 100, width, label='Rejected')
+    ax_rates.set_ylabel('Percentage')
+    ax_rates.set_title('Acceptance vs Rejection Rates by Age Group')
+    ax_rates.set_xticks(x)
+    ax_rates.set_xticklabels(AGE_GROUPS)
+    ax_rates.legend()
+
+    # Plot total counts by age and decision (placements in pools other than the at-home program only when there are any)
+    bars = [(ACCEPTED, 'Accepted'), (REJECTED, 'Rejected'), (AT_HOME, 'At-Home')]
+    if counts[:, POOLED].any():
+        bars.append((POOLED, 'Other Pools'))
+    width = 0.75 / len(bars)
+    for b, (code, label) in enumerate(bars):
+        ax_counts.bar(x + (b - (len(bars) - 1) / 2) * width, counts[:, code], width, label=label)
+    ax_counts.set_ylabel('Count')
+    ax_counts.set_title('Patient Counts by Age Group and Decision')
+    ax_counts.set_xticks(x)
+    ax_counts.set_xticklabels(AGE_GROUPS)
+    ax_counts.legend()
+################################################################################################################################################
+'''Input Data Figures'''
+def plot_distributions(distribution_data: dict, overall_probs: dict, path=None, show=False):
+    '''distributions.py's figure: age distribution per urgency level and the overall urgency distribution'''
+    plt = _pyplot()
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 12))
+
+    # First subplot - Age distribution by urgency
+    x = np.arange(len(AGE_GROUPS))
+    width = 0.25
+    ax1.bar(x - width, distribution_data['urgent'], width, label='Urgent')
+    ax1.bar(x, distribution_data['semi_urgent'], width, label='Semi-Urgent')
+    ax1.bar(x + width, distribution_data['non_urgent'], width, label='Non-Urgent')
+    ax1.set_ylabel('Probability')
+    ax1.set_title('Age Distribution by Urgency Level')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(AGE_GROUPS)
+    ax1.legend()
+
+    # Second subplot - Overall urgency distribution
+    x_points = np.arange(len(overall_probs))
+    ax2.bar(x_points, list(overall_probs.values()))
+    ax2.set_xticks(x_points)
+    ax2.set_xticklabels(list(overall_probs))
+    ax2.set_ylabel('Probability')
+    ax2.set_title('Overall Distribution of Urgency Levels')
+    return _finish(fig, path, show)
+
+def plot_discharges(hospitals, path=None, show=False):
+    '''total_discharges.py's figure: total discharges per hospital (hospitals: frame with the patients.csv columns)'''
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(15, 8))
+    ax.bar(hospitals['Hospital Name'], hospitals['Total Discharges'])
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.set_xlabel('Hospital Name')
+    ax.set_ylabel('Total Discharges')
+    ax.set_title('Total Discharges by Hospital')
+    return _finish(fig, path, show)
@@ -0,0 +1,143 @@
+################################################################################################################################################
+'''
+Admission policies
+
+An AdmissionPolicy is handed every patient arriving in the same minute at once, together with the current bed
+state, and returns one admit/decline decision per arrival. The engine books admissions in arrival order and never
+admits more patients than there are free beds. New policies are added with @register_policy and built by name
+with make_policy, so they can be benchmarked without forking another simulation script.
+'''
+################################################################################################################################################
+from abc import ABC, abstractmethod
+import numpy as np
+from icu_sim.patients import AGE_GROUPS
+from icu_sim.thresholds import ThresholdSchedule, acceptance_thresholds
+################################################################################################################################################
+'''Registry'''
+POLICY_REGISTRY = {} # {name: AdmissionPolicy subclass}
+
+def register_policy(*names: str):
+    '''Class decorator adding an AdmissionPolicy subclass to the registry under each of `names`'''
+    def register(cls):
+        for name in names:
+            if name in POLICY_REGISTRY:
+                raise ValueError(f"Policy {name!r} is already registered")
+            POLICY_REGISTRY[name] = cls
+        return cls
+    return register
+
+def make_policy(name: str, config=None, **kwargs):
+    '''
+    Build a registered policy by name
+    With a SimConfig, policies take their defaults (threshold schedule, bed count) from it
+    '''
+    if name not in POLICY_REGISTRY:
+        raise ValueError(f"Unknown policy {name!r}, expected one of {sorted(POLICY_REGISTRY)}")
+    cls = POLICY_REGISTRY[name]
+    return cls.from_config(config, **kwargs) if config is not None else cls(**kwargs)
+################################################################################################################################################
+'''Interface'''
+class AdmissionPolicy(ABC):
+    rng = None # np.random.Generator for randomized decisions, set from the run's 'policies' stream (icu_sim.streams)
+    @abstractmethod
+    def decide(self, patients, arrivals: np.ndarray, beds: int, capacity: int, t):
+        '''
+        patients: PatientTable; arrivals: indices of the patients arriving at time t, in arrival order
+        beds: free beds before these arrivals; capacity: total beds for this policy
+        Returns a sequence of booleans aligned with arrivals (True = admit)
+        '''
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls(**kwargs)
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+################################################################################################################################################
+'''Built-in Policies'''
+@register_policy('fcfs')
+class FCFSPolicy(AdmissionPolicy):
+    '''First come first served: admit whenever a bed is free'''
+    def decide(self, patients, arrivals, beds, capacity, t):
+        return [j < beds for j in range(len(arrivals))]
+
+@register_policy('threshold', 'utility')
+class ThresholdPolicy(AdmissionPolicy):
+    '''Admit when u > thresholds[free beds], re-reading the threshold after every admission (sim.py's rule)'''
+    def __init__(self, thresholds):
+        self.thresholds = ThresholdSchedule(thresholds) # ThresholdSchedule, dict or sequence indexed by free beds
+        self._values = self.thresholds.values.tolist() # plain floats are faster for one-at-a-time lookups
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        kwargs.setdefault('thresholds', acceptance_thresholds(config.m, config.e, config.base_threshold))
+        return cls(**kwargs)
+
+    def _scores(self, patients, arrivals):
+        return patients.u[arrivals].tolist()
+
+    def decide(self, patients, arrivals, beds, capacity, t):
+        admit = []
+        for score in self._scores(patients, arrivals):
+            ok = beds > 0 and score > self._values[beds]
+            beds -= ok
+            admit.append(ok)
+        return admit
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.thresholds!r})"
+
+@register_policy('age_weighted')
+class AgeWeightedPolicy(ThresholdPolicy):
+    '''Threshold rule applied to u * weights[age group] (weights indexed by AGE_GROUPS code, default: all ones)'''
+    def __init__(self, thresholds, weights=None):
+        super().__init__(thresholds)
+        self.weights = np.ones(len(AGE_GROUPS), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+
+    def _scores(self, patients, arrivals):
+        return (patients.u[arrivals] * self.weights[patients.age[arrivals]]).tolist()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.thresholds!r}, weights={tuple(self.weights.tolist())})"
+
+@register_policy('severity_priority')
+class SeverityPriorityPolicy(AdmissionPolicy):
+    '''
+    Serve same-minute arrivals most severe first, and keep a share of the beds for more severe patients:
+    a patient of severity s is only admitted while free beds > reserve[s] * capacity
+    '''
+    def __init__(self, reserve=(0.0, 0.05, 0.15)):
+        self.reserve = np.asarray(reserve, dtype=float) # per SEVERITIES code, fraction of capacity
+
+    def decide(self, patients, arrivals, beds, capacity, t):
+        severity = patients.severity[arrivals]
+        admit = [False] * len(arrivals)
+        for j in np.argsort(severity, kind='stable').tolist():
+            if beds > self.reserve[severity[j]] * capacity:
+                admit[j] = True
+                beds -= 1
+        return admit
+
+    def __repr__(self):
+        return f"{type(self).__name__}(reserve={tuple(self.reserve.tolist())})"
+
+@register_policy('batch_threshold')
+class BatchThresholdPolicy(AdmissionPolicy):
+    '''
+    Vectorized threshold rule: every arrival in the minute is compared with thresholds[free beds at the start of
+    the minute] in one NumPy operation, then admissions are capped at the free beds in arrival order
+    '''
+    def __init__(self, thresholds):
+        self.thresholds = ThresholdSchedule(thresholds)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        kwargs.setdefault('thresholds', acceptance_thresholds(config.m, config.e, config.base_threshold))
+        return cls(**kwargs)
+
+    def decide(self, patients, arrivals, beds, capacity, t):
+        admit = self.thresholds.accept(patients.u[arrivals], beds)
+        return admit & (np.cumsum(admit) <= beds)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.thresholds!r})"
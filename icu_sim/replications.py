@@ -0,0 +1,178 @@
+################################################################################################################################################
+'''
+Monte Carlo replication runner
+
+Runs N independent replications of the same SimConfig across a process pool. Each replication gets its own
+RandomStreams child (icu_sim.streams), draws one cohort, and runs every policy on that cohort, so policies are
+compared on common random numbers. Nothing here imports matplotlib or pandas.
+
+With a resolution, every replication also keeps icu_sim.metrics rollups (series at bucket starts, mean occupied
+beds per bucket) and the curves are folded into one Welford per policy in fixed chunks of replications, so
+mean curves and their confidence bands cost O(buckets) memory however many replications run.
+
+    python -m icu_sim.replications --reps 1000 --seed 42 --resolution 60
+'''
+################################################################################################################################################
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
+from icu_sim.config import SimConfig
+from icu_sim.metrics import LOG_SERIES, Welford
+from icu_sim.simulation import run_simulation
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Constants'''
+METRICS = ('net_utility', 'captured', 'rejected', 'at_home')
+POLICIES = ('utility', 'fcfs') # names in icu_sim.policies.POLICY_REGISTRY
+CURVES = LOG_SERIES + ('occupancy',) # series at bucket starts, then mean occupied beds per bucket
+CURVE_CHUNK = 16 # replications folded per task, fixed so curves do not depend on the number of workers
+################################################################################################################################################
+'''Single Replication'''
+def run_replication(config: SimConfig, seed, policies=POLICIES, resolution: int = None):
+    '''
+    One replication: a fresh cohort from `seed` (int, SeedSequence or RandomStreams), then every policy over it in one pass
+    Returns {policy: array of METRICS}, and with a resolution also {policy: (len(CURVES), buckets) curves}
+    '''
+    result = run_simulation(config, policies, seed=seed, metrics=resolution)
+    totals = {policy: np.array([run.net_utility, run.total_u_captured, run.total_u_rejected, run.total_stay_at_home_u])
+              for policy, run in result.runs.items()}
+    if resolution is None:
+        return totals
+    curves = {}
+    for policy, run in result.runs.items():
+        rollup = run.log.rollup()
+        curves[policy] = np.vstack((run.log.starts, run.log.m - rollup['mean']))
+    return totals, curves
+
+def run_curve_chunk(config: SimConfig, seeds: list, policies=POLICIES, resolution: int = None):
+    '''Replications of `seeds` in order: ({policy: (len(seeds), len(METRICS)) totals}, {policy: Welford of curves})'''
+    totals = {policy: [] for policy in policies}
+    curves = {policy: Welford() for policy in policies}
+    for seed in seeds:
+        rep_totals, rep_curves = run_replication(config, seed, policies, resolution)
+        for policy in policies:
+            totals[policy].append(rep_totals[policy])
+            curves[policy].add(rep_curves[policy])
+    return {policy: np.array(values) for policy, values in totals.items()}, curves
+################################################################################################################################################
+'''Process Pool'''
+def _run_chunk(fn, tasks):
+    return [fn(*args) for args in tasks]
+
+def pool_map(fn, tasks: list, workers: int = None):
+    '''
+    [fn(*args) for args in tasks], spread across `workers` processes (default: all cores, 1 = in-process)
+    fn must be a module-level function so it can be pickled
+    '''
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        return _run_chunk(fn, tasks)
+
+    # A few chunks per worker keeps pickling overhead low while still balancing load
+    n_chunks = min(workers * 4, len(tasks))
+    outputs = [None] * len(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = [tasks[i::n_chunks] for i in range(n_chunks)]
+        for i, chunk_outputs in enumerate(pool.map(_run_chunk, [fn] * n_chunks, chunks)):
+            outputs[i::n_chunks] = chunk_outputs
+    return outputs
+################################################################################################################################################
+'''Aggregation'''
+class Replications:
+    samples: dict # {policy: (n_reps, len(METRICS)) array}
+    curves: dict # {policy: Welford of (len(CURVES), buckets) curves}, None without a resolution
+    resolution: int # minutes per curve bucket
+    capacity: int # beds, to turn occupancy curves into utilization
+    def __init__(self, samples: dict, curves: dict = None, resolution: int = None, capacity: int = None):
+        self.samples = samples
+        self.curves = curves
+        self.resolution = resolution
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(next(iter(self.samples.values())))
+
+    def summary(self, confidence: float = 0.95):
+        '''{policy: {metric: (mean, ci_low, ci_high)}} using a normal-approximation confidence interval'''
+        return {policy: _summarize(values, confidence) for policy, values in self.samples.items()}
+
+    def difference(self, policy: str = 'utility', baseline: str = 'fcfs', confidence: float = 0.95):
+        '''Paired difference policy - baseline per replication (both ran on the same cohort)'''
+        return _summarize(self.samples[policy] - self.samples[baseline], confidence)
+
+    def curve(self, policy: str, name: str, confidence: float = 0.95):
+        '''Mean, ci_low and ci_high per bucket of curve `name` (in CURVES) across replications'''
+        if self.curves is None:
+            raise ValueError("Replications were run without a resolution, so no curves were kept")
+        stats = self.curves[policy]
+        row = CURVES.index(name)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        mean = stats.mean[row]
+        half_width = z * stats.std(ddof=1)[row] / np.sqrt(stats.count) if stats.count > 1 else np.full_like(mean, np.nan)
+        return mean, mean - half_width, mean + half_width
+
+    def report(self, confidence: float = 0.95):
+        lines = [f"{len(self)} replications, {confidence:.0%} confidence intervals"]
+        for policy, metrics in self.summary(confidence).items():
+            lines.append(f"\n{policy}:")
+            for metric, (mean, lo, hi) in metrics.items():
+                lines.append(f"  {metric:<12} {mean:12.2f}  [{lo:.2f}, {hi:.2f}]")
+        if 'utility' in self.samples and 'fcfs' in self.samples:
+            mean, lo, hi = self.difference(confidence=confidence)['net_utility']
+            lines.append(f"\nutility - fcfs net utility: {mean:.2f}  [{lo:.2f}, {hi:.2f}]")
+        if self.curves is not None:
+            lines.append(f"\nMean bed utilization over {self.resolution}-minute buckets:")
+            for policy, stats in self.curves.items():
+                utilization = stats.mean[CURVES.index('occupancy')] / self.capacity
+                lines.append(f"  {policy:<12} mean {utilization.mean():.1%}, peak bucket {utilization.max():.1%}")
+        return '\n'.join(lines)
+
+def mean_ci(values, confidence: float = 0.95, axis: int = 0):
+    '''Mean and normal-approximation confidence interval along `axis`'''
+    values = np.asarray(values, dtype=float)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    mean = values.mean(axis=axis)
+    n = values.shape[axis]
+    half_width = z * values.std(axis=axis, ddof=1) / np.sqrt(n) if n > 1 else np.full_like(mean, np.nan)
+    return mean, mean - half_width, mean + half_width
+
+def _summarize(values, confidence: float):
+    mean, lo, hi = mean_ci(values, confidence)
+    return {metric: (mean[k], lo[k], hi[k]) for k, metric in enumerate(METRICS)}
+################################################################################################################################################
+'''Runner'''
+def run_replications(config: SimConfig, n_reps: int, seed=None, policies=POLICIES, workers: int = None, resolution: int = None):
+    '''
+    Run n_reps independent replications across `workers` processes (default: all cores, 1 = in-process)
+    Replication k uses child k of RandomStreams(seed), so results do not depend on `workers` or task order
+    resolution: also keep per-bucket curves (CURVES) of every replication, folded into running means and variances
+    '''
+    seeds = RandomStreams(seed).spawn(n_reps)
+    if resolution is None:
+        outputs = pool_map(run_replication, [(config, s, policies) for s in seeds], workers)
+        return Replications({policy: np.array([out[policy] for out in outputs]) for policy in policies})
+
+    chunks = [seeds[start:start + CURVE_CHUNK] for start in range(0, n_reps, CURVE_CHUNK)]
+    outputs = pool_map(run_curve_chunk, [(config, chunk, policies, resolution) for chunk in chunks], workers)
+    samples = {policy: np.concatenate([totals[policy] for totals, _ in outputs]) for policy in policies}
+    curves = {policy: Welford() for policy in policies}
+    for _, chunk_curves in outputs:
+        for policy in policies:
+            curves[policy].merge(chunk_curves[policy])
+    return Replications(samples, curves, resolution, config.m)
+################################################################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo replications of the utility policy vs FCFS')
+    parser.add_argument('--reps', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--n-day', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--resolution', type=int, default=None, help='minutes per bucket of utilization curves')
+    args = parser.parse_args()
+
+    results = run_replications(SimConfig(n_day=args.n_day, days=args.days), args.reps, seed=args.seed, workers=args.workers,
+                               resolution=args.resolution)
+    print(results.report())
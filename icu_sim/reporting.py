@@ -0,0 +1,163 @@
+################################################################################################################################################
+'''
+Headless report rendering for long and many runs
+
+Drawing every one of the 43,200 points of a month-long series (and more for longer runs) costs more than the
+simulation, yet a subplot is only about a thousand pixels wide. Reports are therefore built in two steps:
+
+    report data     small, picklable arrays computed from a SimulationResult: every series decimated to `points`
+                    vertices (min/max per pixel column by default, so spikes survive, or LTTB), and utility
+                    histograms pre-binned per decision in one bincount pass instead of raw utility arrays
+    rendering       a matplotlib Figure on the non-interactive Agg canvas (no pyplot, no window), drawn by the same
+                    functions as icu_sim.plotting, so reports look like simulation_results.png
+
+write_reports renders many reports in parallel worker processes; only the report data is sent to them.
+
+    jobs = [(comparison_data(result), f"simulation_results_{seed}.png") for seed, result in results.items()]
+    write_reports(jobs, workers=8)
+
+    python -m icu_sim.reporting --seeds 1 2 3 4 --workers 4     # simulate (cached) and write one report per seed
+'''
+################################################################################################################################################
+import argparse
+import numpy as np
+from icu_sim.patients import DECISIONS
+from icu_sim.results import from_run
+################################################################################################################################################
+'''Constants'''
+DEFAULT_POINTS = 2000 # vertices per decimated series, about twice the pixel width of a subplot
+DEFAULT_BINS = 50
+UTILITY_RANGE = (0.0, 1.0)
+DEFAULT_DPI = 100
+MARGINS = {'left': 0.06, 'right': 0.98, 'bottom': 0.05, 'top': 0.97, 'wspace': 0.2, 'hspace': 0.2} # fixed, see render
+################################################################################################################################################
+'''Decimation'''
+def minmax_decimate(y, points: int = DEFAULT_POINTS, x=None):
+    '''
+    (x, y) with the first and last sample and the minimum and maximum of every one of (points - 2) // 2 equal-width
+    columns of samples, in the order they occur; a line through them spans the same x range and covers the same
+    pixels as the full series
+    '''
+    y = np.asarray(y)
+    x = np.arange(len(y)) if x is None else np.asarray(x)
+    n = len(y)
+    width = -(-n // max((points - 2) // 2, 1))
+    if n <= points or width < 2:
+        return x, y
+    # Columns of `width` samples; the last one is padded with the final sample, so its extremes stay in range
+    columns = -(-n // width)
+    padded = np.concatenate((y, np.repeat(y[-1:], columns * width - n))).reshape(columns, width)
+    first = np.arange(columns) * width
+    low_at = np.minimum(first + padded.argmin(axis=1), n - 1)
+    high_at = np.minimum(first + padded.argmax(axis=1), n - 1)
+    index = np.stack((np.minimum(low_at, high_at), np.maximum(low_at, high_at)), axis=1).ravel()
+    # Sorted already; unique also drops a column's extremes that fall on the same sample
+    index = np.unique(np.concatenate(([0], index, [n - 1])))
+    return x[index], y[index]
+
+def lttb(y, points: int = DEFAULT_POINTS, x=None):
+    '''(x, y) decimated to `points` vertices by Largest-Triangle-Three-Buckets (Steinarsson 2013), keeping shape'''
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(len(y), dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    n = len(y)
+    if points >= n or points < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64) # points - 2 buckets between the fixed endpoints
+    index = np.empty(points, dtype=np.int64)
+    index[0], index[-1] = 0, n - 1
+    previous = 0
+    for b in range(points - 2):
+        start, end = edges[b], max(edges[b + 1], edges[b] + 1)
+        following = slice(end, max(edges[b + 2], end + 1)) if b + 2 < len(edges) else slice(n - 1, n)
+        x_next, y_next = x[following].mean(), y[following].mean()
+        # Twice the area of the triangle (previous point, candidate, next bucket's average)
+        area = np.abs((x[previous] - x_next) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (y_next - y[previous]))
+        previous = start + int(np.argmax(area))
+        index[b + 1] = previous
+    return x[index], y[index]
+
+DECIMATORS = {'minmax': minmax_decimate, 'lttb': lttb}
+
+def decimate(y, points: int = DEFAULT_POINTS, method: str = 'minmax', x=None):
+    if method not in DECIMATORS:
+        raise ValueError(f"Unknown decimation {method!r}, expected one of {sorted(DECIMATORS)}")
+    return DECIMATORS[method](y, points, x)
+################################################################################################################################################
+'''Pre-binned Histograms'''
+def decision_histogram(u, decision, bins: int = DEFAULT_BINS, value_range: tuple = UTILITY_RANGE):
+    '''(edges, (bins, len(DECISIONS)) counts) of utilities per decision in one bincount pass; undecided patients are skipped'''
+    u = np.asarray(u)
+    decision = np.asarray(decision)
+    decided = decision >= 0
+    low, high = value_range
+    index = np.clip(((u[decided] - low) * (bins / (high - low))).astype(np.int64), 0, bins - 1)
+    counts = np.bincount(index * len(DECISIONS) + decision[decided], minlength=bins * len(DECISIONS))
+    return np.linspace(low, high, bins + 1), counts.reshape(bins, len(DECISIONS))
+################################################################################################################################################
+'''Report Data'''
+def _series(result, policy: str, name: str, points: int, method: str):
+    return decimate(result.series(policy, name), points, method)
+
+def comparison_data(result, policy: str = 'utility', baseline: str = 'fcfs', points: int = DEFAULT_POINTS,
+                    method: str = 'minmax', bins: int = DEFAULT_BINS):
+    '''Everything plot_comparison draws, decimated and pre-binned'''
+    series = {(name, key): _series(result, key, name, points, method)
+              for name in ('captured', 'beds', 'rejected') for key in (policy, baseline)}
+    hists = {}
+    for key in (policy, baseline):
+        edges, hists[key] = decision_histogram(result.patients.u, result[key].decision, bins)
+    return {'layout': 'comparison', 'policy': policy, 'baseline': baseline, 'series': series, 'edges': edges, 'hists': hists}
+
+def run_data(result, policy: str = 'utility', results=None, by_age: bool = False, points: int = DEFAULT_POINTS,
+             method: str = 'minmax', bins: int = DEFAULT_BINS):
+    '''
+    Everything plot_run draws, decimated and pre-binned
+    results: icu_sim.results.Results to read decisions from (e.g. a memory-mapped .cols artifact); built from the run by default
+    '''
+    results = from_run(result[policy], result.patients) if results is None else results
+    series = {name: _series(result, policy, name, points, method) for name in ('captured', 'rejected', 'at_home', 'beds')}
+    edges, hist = decision_histogram(results.columns['utility'], results.columns['decision'], bins)
+    return {'layout': 'run', 'policy': policy, 'series': series, 'edges': edges, 'hist': hist,
+            'age_counts': results.crosstab('age', 'decision') if by_age else None}
+################################################################################################################################################
+'''Rendering'''
+def render(data: dict, path: str, dpi: int = DEFAULT_DPI):
+    '''Draw report data on a headless Agg canvas and save it to path'''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from icu_sim.plotting import FIGSIZES, draw_comparison, draw_run
+    layout = data['layout'] if data['layout'] == 'comparison' or data['age_counts'] is None else 'run_by_age'
+    fig = Figure(figsize=FIGSIZES[layout])
+    FigureCanvasAgg(fig)
+    (draw_comparison if data['layout'] == 'comparison' else draw_run)(fig, data)
+    # Fixed margins instead of tight_layout, which draws the whole figure once more just to measure it
+    fig.subplots_adjust(**MARGINS)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+def write_reports(jobs, workers: int = None, dpi: int = DEFAULT_DPI):
+    '''
+    Render [(report data, path)] across `workers` processes (default: all cores, 1 = in-process); returns the paths
+    '''
+    from icu_sim.replications import pool_map
+    return pool_map(render, [(data, path, dpi) for data, path in jobs], workers)
+################################################################################################################################################
+if __name__ == '__main__':
+    from icu_sim.cache import RunCache
+    from icu_sim.config import SimConfig
+    from icu_sim.simulation import run_simulation
+    parser = argparse.ArgumentParser(description="Simulate several seeds and write sim.py's report for each, rendered in parallel")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1])
+    parser.add_argument('--n-day', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--points', type=int, default=DEFAULT_POINTS)
+    parser.add_argument('--method', choices=sorted(DECIMATORS), default='minmax')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='simulation_results_{seed}.png', help='path pattern with a {seed} field')
+    args = parser.parse_args()
+
+    config, cache = SimConfig(n_day=args.n_day, days=args.days), RunCache()
+    jobs = [(comparison_data(run_simulation(config, seed=seed, cache=cache), points=args.points, method=args.method),
+             args.out.format(seed=seed)) for seed in args.seeds]
+    for path in write_reports(jobs, args.workers):
+        print(f"Wrote {path}")
@@ -0,0 +1,85 @@
+################################################################################################################################################
+'''
+Resource pools for patients the ICU does not admit
+
+A patient a policy rejects (or who reneges from its waitlist) goes to the first pool whose utility range holds
+their utility and that has a free slot, recovering `factor` of their utility; the at-home program is the default
+pool. A pool with a capacity holds each slot for the patient's stay in that pool and frees it with a discharge event
+on the engine's single event heap, next to the ICU discharges, so every pool costs events per placement and nothing
+per simulated minute. Stays in a pool are drawn once per patient from the pool's own StayModel (icu_sim.durations),
+or are the patient's ICU stay when it has none.
+
+Pools are tried in order, e.g. ICU beds first (the policy), then ward beds, then at-home slots:
+
+    pools = (ResourcePool('ward', capacity=150, utility_range=(0.5, 1.0), factor=0.5),
+             ResourcePool('at_home', capacity=80, stay=GammaStay.from_moments(4 * 24 * 60, 0.6),
+                          utility_range=AT_HOME_RANGE, factor=AT_HOME_FACTOR))
+    result = run_simulation(SimConfig(pools=pools), seed=1)
+    result['utility'].pools                         # {name: {placed, turned_away}}
+
+A placement in the pool named AT_HOME_NAME is an AT_HOME decision (status 'at-home program') and adds to
+total_stay_at_home_u; a placement in any other pool is a POOLED decision (status 'in pool'). Run.pool_index records
+the pool of every placed patient, Run.pools the placements and recovered utility per pool, and net_utility counts
+the utility recovered by every pool.
+'''
+################################################################################################################################################
+import numpy as np
+from icu_sim.streams import stream
+################################################################################################################################################
+'''Constants'''
+AT_HOME_RANGE = (0.3, 0.5) # Rejected patients with utility in this range go to the at-home program
+AT_HOME_FACTOR = 0.75 # Share of utility recovered by the at-home program
+AT_HOME_NAME = 'at_home' # the pool whose placements are AT_HOME decisions and total_stay_at_home_u
+POOL_STATS = ('placed', 'turned_away') # Run.pools counts per pool, next to the 'utility' it recovered
+NO_POOL = -1 # Run.pool_index of patients not placed in any pool
+################################################################################################################################################
+'''Resource Pool'''
+class ResourcePool:
+    name: str
+    capacity: int # slots, None = unlimited (a placement then holds no slot and has no discharge event)
+    stay: object # optional StayModel of the time a slot is held, default: the patient's ICU stay
+    utility_range: tuple # (low, high) utilities the pool takes, inclusive
+    factor: float # share of a placed patient's utility recovered
+    def __init__(self, name: str, capacity: int = None, stay=None, utility_range: tuple = (0.0, 1.0), factor: float = 1.0):
+        self.name = name
+        self.capacity = capacity
+        self.stay = stay
+        self.utility_range = tuple(utility_range)
+        self.factor = factor
+
+    @property
+    def at_home(self):
+        '''Placements here are AT_HOME decisions counted in total_stay_at_home_u, elsewhere POOLED decisions'''
+        return self.name == AT_HOME_NAME
+
+    def stays(self, severity, age, icu_stay, rng=None):
+        '''Minutes (int64) each patient holds a slot'''
+        if self.stay is None:
+            return np.asarray(icu_stay, dtype=np.int64)
+        return self.stay.sample(severity, age, stream(rng, 'durations', key=f"pool:{self.name}"))
+
+    def to_dict(self):
+        # The stay model is not kept, stays already drawn are saved with the state that uses them
+        return {'name': self.name, 'capacity': self.capacity, 'utility_range': list(self.utility_range), 'factor': self.factor}
+
+    @classmethod
+    def from_dict(cls, params: dict):
+        return cls(params['name'], params['capacity'], None, params['utility_range'], params['factor'])
+
+    def __repr__(self):
+        return (f"ResourcePool({self.name!r}, capacity={self.capacity}, stay={self.stay!r}, utility_range={self.utility_range}, "
+                f"factor={self.factor})")
+
+AT_HOME_POOL = ResourcePool(AT_HOME_NAME, utility_range=AT_HOME_RANGE, factor=AT_HOME_FACTOR) # unlimited, the original program
+DEFAULT_POOLS = (AT_HOME_POOL,)
+################################################################################################################################################
+'''Stays'''
+def pool_stays(pools, patients, rows=None, rng=None):
+    '''
+    [int64 slot-holding minutes of patients[rows] per pool], None for unlimited pools (they hold no slot)
+    rng: RandomStreams or Generator; each pool draws from its own 'durations' sub-stream
+    '''
+    rows = slice(None) if rows is None else rows
+    severity, age = patients.severity[rows], patients.age[rows]
+    icu_stay = (patients.dispatch_time - patients.arrival_time)[rows]
+    return [None if pool.capacity is None else pool.stays(severity, age, icu_stay, rng) for pool in pools]
@@ -0,0 +1,139 @@
+################################################################################################################################################
+'''
+Memory-mapped readback of simulation results
+
+open_results() opens a results artifact without parsing it: a ColumnarSink directory (.cols) or structured .npy
+file is memory-mapped with NumPy, and an Arrow IPC file is memory-mapped through pyarrow. Ages and decisions stay
+integer codes, so filters and group counts are single vectorized passes over small int8 columns.
+
+Arrow columns are only zero-copy when they are a single record batch. ArrowSink writes one batch per chunk, so a
+file with more rows than its chunk_size has multi-chunk columns, and open_results concatenates each of them into
+one in-memory copy. Use .cols or .npy to stay memory-mapped at any size.
+
+    results = open_results('sim_results_1month.cols')
+    accepted_u = results.select('utility', decision='ACCEPTED')
+    counts = results.crosstab('age', 'decision') # 4 x 3 counts in one pass
+'''
+################################################################################################################################################
+import json
+import os
+import numpy as np
+from icu_sim.patients import AGE_GROUPS, DECISIONS
+from icu_sim.sinks import COLUMNAR_FORMAT
+################################################################################################################################################
+'''Results'''
+class Results:
+    columns: dict # {name: 1-D array, usually a read-only memmap}
+    labels: dict # {coded column: tuple of labels, code = index}
+    def __init__(self, columns: dict, labels: dict = None):
+        self.columns = columns
+        self.labels = {k: tuple(v) for k, v in (labels or {'age': AGE_GROUPS, 'decision': DECISIONS}).items()}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def code(self, column: str, value):
+        '''Integer code of a label (codes are passed through)'''
+        if isinstance(value, str):
+            return self.labels[column].index(value)
+        return value
+
+    def where(self, **filters):
+        '''Boolean mask of the rows matching every filter, e.g. where(decision='ACCEPTED', age='65+')'''
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in filters.items():
+            mask &= self.columns[column] == self.code(column, value)
+        return mask
+
+    def select(self, column: str, **filters):
+        '''Values of `column` for the rows matching the filters'''
+        values = self.columns[column]
+        return values[self.where(**filters)] if filters else values
+
+    def counts(self, column: str):
+        '''Row count per code of a coded column'''
+        return np.bincount(self.columns[column], minlength=len(self.labels[column]))
+
+    def crosstab(self, row: str, col: str, weights: str = None):
+        '''
+        (len(labels[row]), len(labels[col])) table of counts, or of summed `weights` column, in a single pass
+        '''
+        n_row, n_col = len(self.labels[row]), len(self.labels[col])
+        key = self.columns[row].astype(np.int64) * n_col + self.columns[col]
+        w = None if weights is None else self.columns[weights]
+        return np.bincount(key, weights=w, minlength=n_row * n_col).reshape(n_row, n_col)
+
+    def to_frame(self, rows=slice(None), columns=None):
+        '''pandas DataFrame of a slice of rows, with coded columns turned back into categoricals'''
+        import pandas as pd
+        frame = {}
+        for name in columns or self.columns:
+            values = np.asarray(self.columns[name][rows])
+            frame[name] = pd.Categorical.from_codes(values, self.labels[name]) if name in self.labels else values
+        return pd.DataFrame(frame)
+################################################################################################################################################
+'''Readers'''
+def open_results(path):
+    '''
+    Open a .cols directory or structured .npy file without reading it into memory, or an Arrow IPC file
+    (memory-mapped when every column is a single batch, otherwise each column is copied into memory once)
+    '''
+    path = str(path)
+    if os.path.isdir(path):
+        return _open_columnar(path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        data = np.load(path, mmap_mode='r')
+        return Results({name: data[name] for name in data.dtype.names})
+    if ext in ('.arrow', '.feather'):
+        return _open_arrow(path)
+    raise ValueError(f"Cannot memory-map {path!r}; expected a .cols directory, .npy or .arrow file")
+
+def from_run(run, patients):
+    '''In-memory Results of a finished icu_sim.engine.Run, one row per arrived patient in arrival order'''
+    arrived = np.flatnonzero(run.decision >= 0)
+    arrived = arrived[np.argsort(patients.arrival_time[arrived], kind='stable')]
+    columns = {
+        'person_id': patients.id[arrived],
+        'age': patients.age[arrived],
+        'arrival_time': patients.arrival_time[arrived],
+        'dispatch_time': patients.dispatch_time[arrived],
+        'utility': patients.u[arrived],
+        'decision': run.decision[arrived],
+    }
+    if run.admission_time is not None:
+        # Patients admitted from a waitlist are discharged after their stay counted from admission
+        admitted = run.admission_time[arrived]
+        columns['admission_time'] = admitted
+        columns['dispatch_time'] = columns['dispatch_time'] + np.where(admitted >= 0, admitted - columns['arrival_time'], 0)
+    if run.remaining_beds is not None:
+        columns['remaining_beds'] = run.remaining_beds[arrived]
+    if run.pool_index is not None:
+        columns['pool'] = run.pool_index[arrived] # index into run.pools, NO_POOL (-1) when not placed
+    return Results(columns)
+
+def _open_columnar(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('format') != COLUMNAR_FORMAT:
+        raise ValueError(f"{path} is columnar format {meta.get('format')}, this version only reads format {COLUMNAR_FORMAT}")
+    columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in meta['columns']}
+    return Results(columns, meta['labels'])
+
+def _open_arrow(path):
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError as err:
+        raise ImportError("Reading Arrow results needs pyarrow (pip install pyarrow)") from err
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(path, 'r')).read_all()
+    # Columns written by ArrowSink have no nulls, so every chunk converts without a copy. A column of several
+    # chunks (one per ArrowSink chunk) is not contiguous in the file, so it is concatenated into a copy
+    columns = {}
+    for name in table.column_names:
+        chunks = [chunk.to_numpy(zero_copy_only=True) for chunk in table.column(name).chunks]
+        columns[name] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    return Results(columns)
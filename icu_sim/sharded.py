@@ -0,0 +1,150 @@
+################################################################################################################################################
+'''
+Sharded parallel execution of the multi-hospital network
+
+Hospitals are partitioned into shards (whole cities per shard by default) and every shard runs its part of the
+network event loop in its own worker process. Workers only synchronize at window boundaries: a window is as long
+as the transfer delay, so a transfer sent during a window cannot arrive before it ends (conservative lookahead).
+At each boundary the driver routes transfers to the shard owning their destination and publishes the bed board.
+Within a window each hospital decides its patients in the same order as the single-process run, and network
+totals are rebuilt from per-hospital deltas in a fixed order, so the result is bit-identical to simulate_network.
+
+    python -m icu_sim.sharded --shards 8 --routing statewide --seed 1 --check
+'''
+################################################################################################################################################
+import argparse
+import multiprocessing
+import os
+import time
+import numpy as np
+from icu_sim.config import SimConfig
+from icu_sim.hospitals import HOSPITALS_CSV, load_hospitals
+from icu_sim.streams import RandomStreams
+from icu_sim.network import (DEFAULT_TRANSFER_DELAY, NETWORK_POLICIES, HospitalNetwork, Routing, make_routing,
+                             simulate_network, _shards, _run_windows, _collect)
+################################################################################################################################################
+'''Partitioning'''
+def partition_by_city(network: HospitalNetwork, n_shards: int):
+    '''
+    Shard id per hospital: cities are kept whole and handed, busiest first, to the shard with the least expected
+    arrivals so far (longest-processing-time greedy balancing)
+    '''
+    n_shards = max(1, min(n_shards, len(network.cities)))
+    load = np.bincount(network.city_codes, weights=network.daily_arrivals + 1e-9 * network.capacity, minlength=len(network.cities))
+    shard_load = np.zeros(n_shards)
+    city_shard = np.empty(len(network.cities), dtype=np.int64)
+    for city in np.argsort(-load, kind='stable').tolist():
+        k = int(np.argmin(shard_load))
+        city_shard[city] = k
+        shard_load[k] += load[city]
+    return city_shard[network.city_codes]
+################################################################################################################################################
+'''Worker Processes'''
+def _serve(conn, shard):
+    '''Worker loop: advance the shard once per message until None, then send its results'''
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                conn.send(shard.finish())
+                return
+            conn.send(shard.advance(*message))
+    finally:
+        conn.close()
+
+class _ShardProcesses:
+    '''One worker process per shard, driven in lockstep over pipes'''
+    def __init__(self, shards: list):
+        context = multiprocessing.get_context()
+        self.conns = []
+        self.processes = []
+        for shard in shards:
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, args=(child, shard), daemon=True)
+            process.start()
+            child.close()
+            self.conns.append(parent)
+            self.processes.append(process)
+
+    def advance(self, messages: list):
+        # Send every window first so the shards run it concurrently, then wait for all of them
+        for conn, message in zip(self.conns, messages):
+            conn.send(message)
+        return [conn.recv() for conn in self.conns]
+
+    def finish(self):
+        for conn in self.conns:
+            conn.send(None)
+        return [conn.recv() for conn in self.conns]
+
+    def close(self):
+        for conn in self.conns:
+            conn.close()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+################################################################################################################################################
+'''Sharded Engine'''
+def simulate_network_sharded(network: HospitalNetwork, patients, origin, policy: str = 'utility', routing: Routing = None,
+                             shards: int = None, shard_of=None, parallel: bool = True, t_n=None, rng=None):
+    '''
+    simulate_network with the hospitals split across worker processes; same arguments and bit-identical NetworkRun
+    shards: number of shards for partition_by_city (default: one per CPU); shard_of: explicit shard id per hospital
+    parallel=False runs the shards one after another in this process (same result, no processes)
+    '''
+    t_n = network.config.t_n if t_n is None else t_n
+    routing = Routing.none(len(network)) if routing is None else routing
+    if shard_of is None:
+        shard_of = partition_by_city(network, shards or os.cpu_count() or 1)
+    workers = _shards(network, patients, origin, policy, routing, shard_of, rng)
+
+    if not parallel or len(workers) == 1:
+        in_transit = _run_windows(lambda messages: [s.advance(*m) for s, m in zip(workers, messages)], len(workers),
+                                  shard_of, network, routing, t_n)
+        return _collect(network, len(patients), [s.finish() for s in workers], in_transit)
+
+    processes = _ShardProcesses(workers)
+    try:
+        in_transit = _run_windows(processes.advance, len(workers), shard_of, network, routing, t_n)
+        finished = processes.finish()
+    finally:
+        processes.close()
+    return _collect(network, len(patients), finished, in_transit)
+
+def same_run(a, b):
+    '''True when two NetworkRuns are bit-identical (totals, per-patient outcomes and the network log)'''
+    arrays = ('captured', 'rejected', 'at_home', 'pool_utility', 'pool_placed', 'pool_full', 'admitted', 'transfers_out', 'transfers_in',
+              'in_transit', 'decision', 'placed', 'pool_index', 'transfers')
+    logs = ('times', 'captured', 'rejected', 'at_home', 'beds')
+    return (all(np.array_equal(getattr(a, name), getattr(b, name)) for name in arrays)
+            and all(getattr(a.log, name) == getattr(b.log, name) for name in logs))
+################################################################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate the patients.csv network with hospitals sharded across processes')
+    parser.add_argument('--csv', default=HOSPITALS_CSV)
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--policy', choices=NETWORK_POLICIES, default='utility')
+    parser.add_argument('--routing', choices=('none', 'city', 'statewide'), default='city')
+    parser.add_argument('--max-transfers', type=int, default=1)
+    parser.add_argument('--delay', type=int, default=DEFAULT_TRANSFER_DELAY)
+    parser.add_argument('--arrival-scale', type=float, default=1.0)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', action='store_true', help='also run single-process and compare')
+    args = parser.parse_args()
+
+    network = HospitalNetwork(load_hospitals(args.csv), SimConfig(days=args.days), args.arrival_scale)
+    routing_kwargs = {} if args.routing == 'none' else {'max_transfers': args.max_transfers, 'delay': args.delay}
+    routing = make_routing(args.routing, network, **routing_kwargs)
+    streams = RandomStreams(args.seed)
+    patients, origin = network.cohort(streams)
+
+    start = time.perf_counter()
+    run = simulate_network_sharded(network, patients, origin, args.policy, routing, shards=args.shards, rng=streams)
+    print(f"Sharded: net utility={run.net_utility:.2f}, transfers={int(run.transfers_out.sum())} ({time.perf_counter() - start:.2f}s)")
+    if args.check:
+        start = time.perf_counter()
+        single = simulate_network(network, patients, origin, args.policy, routing, rng=streams)
+        print(f"Single process: net utility={single.net_utility:.2f} ({time.perf_counter() - start:.2f}s), "
+              f"bit-identical: {same_run(run, single)}")
@@ -0,0 +1,220 @@
+################################################################################################################################################
+'''
+Library entry point: one SimConfig in, one SimulationResult out
+
+Importing this module (or icu_sim) only pulls in NumPy, so it is safe to call from worker processes and
+notebooks; pandas is imported on demand by the frame helpers and matplotlib only by icu_sim.plotting.
+
+    from icu_sim import SimConfig, run_simulation
+    result = run_simulation(SimConfig(n_day=1500), seed=42) # the same numbers on every run with seed=42
+    print(result['utility'].net_utility, result['fcfs'].net_utility)
+'''
+################################################################################################################################################
+import functools
+import numpy as np
+from icu_sim.config import SimConfig
+from icu_sim.checkpoint import checkpoint_path, load_checkpoint, save_checkpoint
+from icu_sim.engine import run_until, simulate_policies
+from icu_sim.metrics import StreamingLog
+from icu_sim.patients import PatientTable
+from icu_sim.policies import AdmissionPolicy, make_policy
+from icu_sim.resources import DEFAULT_POOLS
+from icu_sim.streams import RandomStreams, stream
+################################################################################################################################################
+'''Constants'''
+DEFAULT_POLICIES = ('utility', 'fcfs') # names in icu_sim.policies.POLICY_REGISTRY
+SERIES = ('captured', 'rejected', 'at_home', 'beds')
+################################################################################################################################################
+'''Simulation Result'''
+class SimulationResult:
+    config: SimConfig
+    patients: object # PatientTable the policies were run on
+    runs: dict # {policy name: icu_sim.engine.Run}
+    def __init__(self, config: SimConfig, patients, runs: dict):
+        self.config = config
+        self.patients = patients
+        self.runs = runs
+
+    def __getitem__(self, policy: str):
+        return self.runs[policy]
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    @property
+    def policies(self):
+        return list(self.runs)
+
+    def series(self, policy: str, name: str, tau=1):
+        '''Per-step series of one policy: name in SERIES (e.g. utility_over_time = series('utility', 'captured'))'''
+        return self.runs[policy].log.series(name, self.config.t_n, tau)
+
+    def utilities(self, policy: str, *decisions: int):
+        return self.runs[policy].utilities(self.patients, *decisions)
+
+    def summary(self):
+        '''{policy: {captured, rejected, at_home, pooled (every pool, at-home included), net_utility}}'''
+        return {name: {'captured': run.total_u_captured, 'rejected': run.total_u_rejected,
+                       'at_home': run.total_stay_at_home_u, 'pooled': run.total_pool_u, 'net_utility': run.net_utility}
+                for name, run in self.runs.items()}
+
+    def results_frame(self, policy: str):
+        return self.runs[policy].results_frame(self.patients)
+
+    def __repr__(self):
+        nets = ', '.join(f"{name}={run.net_utility:.2f}" for name, run in self.runs.items())
+        return f"SimulationResult({self.config!r}, net_utility: {nets})"
+################################################################################################################################################
+'''Entry Point'''
+def seed_policies(policies: dict, rng):
+    '''Give every policy without a generator of its own the policy sub-stream of its name'''
+    for name, policy in policies.items():
+        if policy.rng is None:
+            policy.rng = stream(rng, 'policies', key=str(name))
+
+def run_simulation(config: SimConfig = None, policies=DEFAULT_POLICIES, seed=None, rng=None, patients=None, sinks: dict = None,
+                   cache=None, checkpoint_every: int = None, checkpoint_dir: str = None, metrics: int = None):
+    '''
+    Draw a cohort from `config` and run every policy over it in a single pass
+
+    policies: registered policy names, or a {name: AdmissionPolicy or registered name} dict
+    seed / rng: seed (int, SeedSequence or RandomStreams) of the run's RandomStreams, or a RandomStreams or
+                np.random.Generator to draw from (fresh entropy if neither); each policy gets its own
+                'policies' sub-stream, so adding a policy does not change the others' draws
+    patients: run on an existing PatientTable instead of drawing a new cohort
+    sinks: optional {policy name: ResultSink} streaming that policy's decisions to disk
+    cache: optional icu_sim.cache.RunCache; cohorts and per-policy runs are looked up by a hash of the config, the
+           seed and the policy, and only the missing ones are computed (needs a seed or RandomStreams, not a Generator)
+    checkpoint_every / checkpoint_dir: save the engine state every checkpoint_every minutes and at t_n as
+           checkpoint_dir/checkpoint-<t>.npz (icu_sim.checkpoint), to resume, extend or fork the run with
+           resume_simulation; checkpointed runs are always simulated, never read from the cache
+    metrics: optional resolution in minutes; each run then keeps an icu_sim.metrics.StreamingLog of per-bucket
+           rollups and an occupancy histogram instead of a per-event log (such runs are never cached or checkpointed)
+    '''
+    config = SimConfig() if config is None else config
+    if not isinstance(policies, dict):
+        policies = {name: name for name in policies}
+    deciders = {name: policy if isinstance(policy, AdmissionPolicy) else make_policy(policy, config)
+                for name, policy in policies.items()}
+
+    rng = RandomStreams(seed) if rng is None else rng
+    # Policies bringing their own generator are not determined by the seed, so they are never cached
+    cacheable = {name for name, policy in deciders.items() if policy.rng is None}
+    seed_policies(deciders, rng)
+    if cache is not None and patients is None and isinstance(rng, RandomStreams) and not checkpoint_every and not metrics:
+        return _cached_simulation(config, policies, deciders, cacheable, rng, sinks, cache)
+    drawn = patients is None
+    if drawn:
+        patients = config.cohort(rng)
+
+    on_checkpoint = None
+    if checkpoint_every:
+        if checkpoint_dir is None:
+            raise ValueError("checkpoint_every needs a checkpoint_dir")
+        def on_checkpoint(state):
+            # The seed is only recorded for cohorts drawn here, so resume_simulation can extend them
+            if drawn and isinstance(rng, RandomStreams):
+                state.seed_sequence, state.days = rng.seed_sequence, config.days
+            save_checkpoint(state, checkpoint_path(checkpoint_dir, state.t))
+    runs = simulate_policies(patients, config.m, config.t_n, deciders, sinks=sinks, checkpoint_every=checkpoint_every,
+                             on_checkpoint=on_checkpoint, waitlist=config.waitlist, pools=config.pools, rng=rng,
+                             log=None if not metrics else functools.partial(StreamingLog, t_n=config.t_n, resolution=metrics))
+    return SimulationResult(config, patients, runs)
+
+def resume_simulation(checkpoint, config: SimConfig = None, policies=DEFAULT_POLICIES, sinks: dict = None,
+                      checkpoint_every: int = None, checkpoint_dir: str = None):
+    '''
+    Continue a run from a checkpoint (path or EngineState, which is forked so it can seed several branches) up
+    to config.t_n, without recomputing the prefix
+
+    config: the run's config, possibly changed from the checkpoint onwards (e.g. e or base_threshold for a
+            what-if branch); a longer `days` extends the horizon, drawing the extra days' cohort from the seed
+            recorded in the checkpoint
+    policies: the same policy names as the checkpointed run, as names or AdmissionPolicy instances (which may
+              differ from the original ones); their generators continue from the checkpointed states
+    sinks: optional {policy name: ResultSink} receiving the decisions made after the checkpoint
+    Waitlists continue with the queues and rules saved in the checkpoint (config.waitlist is not applied again);
+    config.pools must name the checkpoint's pools with the same capacities, and gives the stay models of patients
+    added by a longer horizon
+    Returns a SimulationResult of the whole run, from t = 0
+    '''
+    config = SimConfig() if config is None else config
+    state = load_checkpoint(checkpoint) if isinstance(checkpoint, str) else checkpoint.fork()
+    if not isinstance(policies, dict):
+        policies = {name: name for name in policies}
+    if sorted(map(str, policies)) != sorted(map(str, state.names)):
+        raise ValueError(f"Checkpoint has policies {state.names}, got {list(policies)}")
+    by_name = {str(name): policy for name, policy in policies.items()}
+    deciders = {}
+    for name in state.names:
+        policy = by_name[str(name)]
+        deciders[name] = policy if isinstance(policy, AdmissionPolicy) else make_policy(policy, config)
+    streams = None if state.seed_sequence is None else RandomStreams(state.seed_sequence)
+    seed_policies(deciders, streams)
+
+    pools = DEFAULT_POOLS if config.pools is None else tuple(config.pools)
+    if [(pool.name, pool.capacity) for pool in pools] != [(pool.name, pool.capacity) for pool in state.pools]:
+        raise ValueError(f"Checkpoint has pools {[pool.name for pool in state.pools]} with other capacities or names than the config")
+    state.pools = pools
+
+    if state.days is not None and config.days > state.days:
+        if streams is None:
+            raise ValueError("Extending the horizon needs a checkpoint that recorded its cohort's seed")
+        state.extend(extend_cohort(config, state.patients, streams, state.days), streams)
+        state.days = config.days
+
+    if checkpoint_every and checkpoint_dir is None:
+        raise ValueError("checkpoint_every needs a checkpoint_dir")
+    run_until(state, deciders, config.t_n, sinks, checkpoint_every,
+              lambda s: save_checkpoint(s, checkpoint_path(checkpoint_dir, s.t)))
+    return SimulationResult(config, state.patients, state.runs(copy=False))
+
+def extend_cohort(config: SimConfig, patients, streams, start_day: int):
+    '''
+    `patients` (the cohort of days 0..start_day - 1) followed by n_day new patients for each day start_day..days - 1
+    Day d is drawn from streams.branch(d), so extending in one step or several gives the same patients
+    '''
+    fields = ('severity', 'age', 'arrival_time', 'dispatch_time', 'u')
+    columns = [[getattr(patients, name)] for name in fields]
+    for day in range(start_day, config.days):
+        process = config.arrival_process
+        if process is not None:
+            process = {name: p.shifted(day) for name, p in process.items()} if isinstance(process, dict) else process.shifted(day)
+        extra = config.replace(days=1, arrival_process=process).cohort(streams.branch(day))
+        for column, name in zip(columns, fields):
+            column.append(getattr(extra, name) + (day * 24 * 60 if name.endswith('_time') else 0))
+    return PatientTable(*(np.concatenate(column) for column in columns))
+
+def _cached_simulation(config: SimConfig, policies: dict, deciders: dict, cacheable: set, streams, sinks, cache):
+    keys = {name: cache.run_key(config, streams, name, policies[name]) for name in cacheable}
+    runs = {name: cache.load_run(keys[name]) for name in keys}
+    missing = {name: decider for name, decider in deciders.items() if runs.get(name) is None}
+
+    cohort_key = cache.cohort_key(config, streams)
+    patients = cache.load_cohort(cohort_key)
+    if patients is None:
+        patients = config.cohort(streams)
+        cache.save_cohort(cohort_key, patients)
+
+    if missing:
+        # Simulated without sinks so the cached run keeps remaining_beds; sinks are filled from it below
+        runs_missing = simulate_policies(patients, config.m, config.t_n, missing, waitlist=config.waitlist, pools=config.pools,
+                                         rng=streams)
+        for name, run in runs_missing.items():
+            runs[name] = run
+            if name in keys:
+                cache.save_run(keys[name], run)
+    for name, sink in (sinks or {}).items():
+        replay(runs[name], patients, sink)
+    return SimulationResult(config, patients, {name: runs[name] for name in deciders})
+
+def replay(run, patients, sink):
+    '''
+    Write a finished run's decisions to a ResultSink in arrival order (the order the engine makes them, except
+    that waitlisted patients are decided when they get a bed or renege)
+    '''
+    arrived = np.flatnonzero(run.decision >= 0)
+    arrived = arrived[np.argsort(patients.arrival_time[arrived], kind='stable')]
+    sink.bind(patients)
+    sink.extend(arrived.astype(np.int32), run.decision[arrived], run.remaining_beds[arrived], run.admission_time[arrived])
+    sink.flush()
@@ -0,0 +1,254 @@
+################################################################################################################################################
+'''
+Streaming results writers
+
+Instead of collecting one dict per patient and writing a DataFrame at the end, the engine hands every decision
+to a sink as it is made. A sink buffers at most `chunk_size` rows (patient index, decision code, remaining beds,
+admission time),
+then looks the patient columns up in the PatientTable and appends the whole chunk to disk, so memory stays
+bounded no matter how long the run is.
+
+    with CSVSink('sim_results_1month.csv') as sink:
+        simulate(patients, m, t_n, policy, sink=sink)
+
+Backends: CSVSink (same layout as sim_results_1month.csv), NpySink (.npy structured array with integer codes),
+ColumnarSink (directory of per-column .npy files), ParquetSink and ArrowSink (Arrow IPC file); the last two
+need pyarrow. TeeSink writes the same chunks to several of them.
+'''
+################################################################################################################################################
+import json
+import os
+from abc import ABC, abstractmethod
+from array import array
+import numpy as np
+from icu_sim.patients import AGE_GROUPS, DECISIONS
+################################################################################################################################################
+'''Constants'''
+RESULT_DTYPE = np.dtype([ # one row per arrived patient, ages and decisions as int8 codes
+    ('person_id', np.int32),
+    ('age', np.int8),
+    ('arrival_time', np.int32),
+    ('admission_time', np.int32), # -1 when the patient never got an ICU bed
+    ('dispatch_time', np.int32), # counted from admission_time for patients admitted from a waitlist
+    ('utility', np.float32),
+    ('decision', np.int8),
+    ('remaining_beds', np.int32),
+])
+DEFAULT_CHUNK_SIZE = 65536
+COLUMNAR_FORMAT = 3 # version written to meta.json by ColumnarSink; only this format is read back
+################################################################################################################################################
+'''Base Sink'''
+class ResultSink(ABC):
+    def __init__(self, path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._patients = None
+        self._index = array('i')
+        self._decision = bytearray()
+        self._beds = array('i')
+        self._admitted = array('i')
+
+    def bind(self, patients):
+        '''Called by the engine before the first row so chunks can look up patient columns'''
+        self._patients = patients
+
+    def add(self, i: int, decision: int, remaining_beds: int, admission_time: int):
+        self._index.append(i)
+        self._decision.append(decision)
+        self._beds.append(remaining_beds)
+        self._admitted.append(admission_time)
+        if len(self._index) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, index, decision, remaining_beds, admission_time):
+        '''Append many rows at once (e.g. a run loaded from icu_sim.cache), written in chunk_size pieces'''
+        self.flush()
+        for start in range(0, len(index), self.chunk_size):
+            end = start + self.chunk_size
+            self._write_rows(index[start:end], decision[start:end], remaining_beds[start:end], admission_time[start:end])
+
+    def flush(self):
+        if not self._index:
+            return
+        self._write_rows(np.frombuffer(self._index, dtype=np.int32), np.frombuffer(self._decision, dtype=np.int8),
+                         np.frombuffer(self._beds, dtype=np.int32), np.frombuffer(self._admitted, dtype=np.int32))
+        self._index = array('i')
+        self._decision = bytearray()
+        self._beds = array('i')
+        self._admitted = array('i')
+
+    def _write_rows(self, index, decision, remaining_beds, admission_time):
+        p = self._patients
+        chunk = np.empty(len(index), dtype=RESULT_DTYPE)
+        chunk['person_id'] = p.id[index]
+        chunk['age'] = p.age[index]
+        chunk['arrival_time'] = p.arrival_time[index]
+        chunk['admission_time'] = admission_time
+        chunk['dispatch_time'] = p.dispatch_time[index] + np.where(admission_time >= 0, admission_time - chunk['arrival_time'], 0)
+        chunk['utility'] = p.u[index]
+        chunk['decision'] = decision
+        chunk['remaining_beds'] = remaining_beds
+        self._write_chunk(chunk)
+        self.rows_written += len(chunk)
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Backends implement these
+    @abstractmethod
+    def _write_chunk(self, chunk: np.ndarray):
+        '''Append a RESULT_DTYPE chunk to the output'''
+
+    def _close(self):
+        pass
+################################################################################################################################################
+'''Backends'''
+class CSVSink(ResultSink):
+    '''Text CSV with age group and decision labels, the layout of sim_results_1month.csv'''
+    def _write_chunk(self, chunk):
+        import pandas as pd
+        frame = pd.DataFrame(chunk)
+        frame['age'] = pd.Categorical.from_codes(chunk['age'], AGE_GROUPS)
+        frame['decision'] = pd.Categorical.from_codes(chunk['decision'], DECISIONS)
+        frame.to_csv(self.path, mode='w' if self.rows_written == 0 else 'a', header=self.rows_written == 0, index=False)
+
+    def _close(self):
+        if self.rows_written == 0:
+            with open(self.path, 'w') as f:
+                f.write(','.join(RESULT_DTYPE.names) + '\n')
+
+class _NpyAppender:
+    '''
+    Appends rows to a 1-D .npy file. The header is written with room for any row count and patched with the
+    final count on close, so the file can be opened with np.load(path, mmap_mode='r')
+    '''
+    def __init__(self, path, dtype):
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        # Reserve room for a 20-digit row count; total header size is padded to a multiple of 64 bytes
+        self._header_len = -(-(10 + len(self._header_text(10 ** 20)) + 1) // 64) * 64
+        self._file = open(path, 'wb')
+        self._file.write(self._header(0))
+
+    def _header_text(self, n: int):
+        return repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (n,)})
+
+    def _header(self, n: int):
+        prefix = np.lib.format.magic(1, 0) + (self._header_len - 10).to_bytes(2, 'little')
+        return prefix + self._header_text(n).ljust(self._header_len - 11).encode('latin1') + b'\n'
+
+    def append(self, values):
+        self._file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header(self.rows))
+        self._file.close()
+
+class NpySink(ResultSink):
+    '''Structured .npy file (RESULT_DTYPE), loadable with np.load(path, mmap_mode='r')'''
+    def __init__(self, path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(path, chunk_size)
+        self._file = _NpyAppender(path, RESULT_DTYPE)
+
+    def _write_chunk(self, chunk):
+        self._file.append(chunk)
+
+    def _close(self):
+        self._file.close()
+
+class ColumnarSink(ResultSink):
+    '''
+    Columnar results directory: one .npy file per column plus meta.json with the row count and the labels behind
+    the integer age and decision codes. Read it back with icu_sim.results.open_results, which memory-maps each
+    column, so a single column of a multi-GB result set can be sliced without parsing anything else.
+    '''
+    def __init__(self, path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(path, chunk_size)
+        os.makedirs(path, exist_ok=True)
+        self._columns = {name: _NpyAppender(os.path.join(path, f'{name}.npy'), RESULT_DTYPE[name]) for name in RESULT_DTYPE.names}
+
+    def _write_chunk(self, chunk):
+        for name, column in self._columns.items():
+            column.append(chunk[name])
+
+    def _close(self):
+        for column in self._columns.values():
+            column.close()
+        meta = {
+            'format': COLUMNAR_FORMAT,
+            'rows': self.rows_written,
+            'columns': {name: RESULT_DTYPE[name].str for name in RESULT_DTYPE.names},
+            'labels': {'age': list(AGE_GROUPS), 'decision': list(DECISIONS)},
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+class ArrowSink(ResultSink):
+    '''
+    Arrow IPC file (Feather v2) with int8 age and decision codes, one record batch per chunk; needs pyarrow
+    Only a single-batch file reads back zero-copy (see icu_sim.results.open_results)
+    '''
+    def __init__(self, path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(path, chunk_size)
+        pa = _pyarrow()
+        self._schema = pa.schema([(name, pa.from_numpy_dtype(RESULT_DTYPE[name])) for name in RESULT_DTYPE.names])
+        self._writer = self._open_writer(pa)
+
+    def _open_writer(self, pa):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.path, self._schema)
+
+    def _write_chunk(self, chunk):
+        pa = _pyarrow()
+        self._writer.write_table(pa.Table.from_arrays([chunk[name] for name in RESULT_DTYPE.names], schema=self._schema))
+
+    def _close(self):
+        self._writer.close()
+
+class ParquetSink(ArrowSink):
+    '''Parquet file, one row group per chunk; needs pyarrow'''
+    def _open_writer(self, pa):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.path, self._schema)
+
+class TeeSink(ResultSink):
+    '''Writes every chunk to several sinks, e.g. a CSV for people and a columnar copy for analysis'''
+    def __init__(self, *sinks, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(None, chunk_size)
+        self.sinks = sinks
+
+    def _write_chunk(self, chunk):
+        for sink in self.sinks:
+            sink._write_chunk(chunk)
+            sink.rows_written += len(chunk)
+
+    def _close(self):
+        for sink in self.sinks:
+            sink._close()
+################################################################################################################################################
+'''Helpers'''
+SINKS = {'.csv': CSVSink, '.npy': NpySink, '.cols': ColumnarSink, '.arrow': ArrowSink, '.feather': ArrowSink, '.parquet': ParquetSink}
+
+def open_sink(path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    '''Pick a sink from the file extension'''
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"No results sink for {ext!r} files, expected one of {sorted(SINKS)}")
+    return SINKS[ext](path, chunk_size)
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as err:
+        raise ImportError("Parquet and Arrow results need pyarrow (pip install pyarrow)") from err
+    return pyarrow
@@ -0,0 +1,81 @@
+################################################################################################################################################
+'''
+Seeded random number streams
+
+One seed gives a RandomStreams: an np.random.SeedSequence root from which every consumer derives its own named
+np.random.Generator (patient attributes, arrivals, durations, policies, bootstrap resampling). A stream's seed depends only on the root
+and the stream's name, never on which other streams were used or in which order, so e.g. switching the stay model
+leaves arrival times and utilities untouched. Replications spawn numbered children the same way, so replication k
+draws the same numbers whether it runs first, last, or in any worker process.
+
+    streams = RandomStreams(42)
+    patients = config.cohort(streams)               # severity/age/utility, arrivals and stays from separate streams
+    children = streams.spawn(100)                   # one independent RandomStreams per replication
+'''
+################################################################################################################################################
+import zlib
+import numpy as np
+################################################################################################################################################
+'''Constants'''
+STREAMS = ('patients', 'arrivals', 'durations', 'policies', 'bootstrap') # named streams, keyed by position (append new ones)
+_NAMED_BRANCH = 2 ** 32 - 1 # spawn-key element that separates named streams from numbered children
+_BRANCHES = 2 ** 32 - 2 # spawn-key element of branch() hierarchies
+################################################################################################################################################
+'''Streams'''
+class RandomStreams:
+    seed_sequence: np.random.SeedSequence # root of this hierarchy
+    def __init__(self, seed=None):
+        '''seed: None (fresh entropy), an int, a SeedSequence or another RandomStreams'''
+        if isinstance(seed, RandomStreams):
+            seed = seed.seed_sequence
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self._generators = {}
+
+    def _child(self, *key):
+        root = self.seed_sequence
+        return np.random.SeedSequence(root.entropy, spawn_key=tuple(root.spawn_key) + key, pool_size=root.pool_size)
+
+    def generator(self, name: str, key=None):
+        '''
+        Generator of the named stream; the same object on every call, so consecutive draws continue the stream
+        key: optional sub-stream (int or str, e.g. a policy name) with its own independent generator
+        '''
+        cache_key = (name, key)
+        if cache_key not in self._generators:
+            if name not in STREAMS:
+                raise ValueError(f"Unknown stream {name!r}, expected one of {STREAMS}")
+            sub = () if key is None else (key if isinstance(key, int) else zlib.crc32(str(key).encode()),)
+            self._generators[cache_key] = np.random.default_rng(self._child(_NAMED_BRANCH, STREAMS.index(name), *sub))
+        return self._generators[cache_key]
+
+    def branch(self, key: int):
+        '''
+        Independent RandomStreams for part `key` of the same run (e.g. the cohort of days key.. when a run is
+        extended), never equal to a spawn() child or a named stream
+        '''
+        return RandomStreams(self._child(_BRANCHES, key))
+
+    def spawn(self, n: int, start: int = 0):
+        '''Children start..start + n - 1 (the same children on every call, unlike SeedSequence.spawn)'''
+        return [RandomStreams(self._child(k)) for k in range(start, start + n)]
+
+    def __getstate__(self):
+        # Ship only the seed, so a worker rebuilds fresh generators positioned at the start of every stream
+        return {'seed_sequence': self.seed_sequence}
+
+    def __setstate__(self, state):
+        self.seed_sequence = state['seed_sequence']
+        self._generators = {}
+
+    def __repr__(self):
+        root = self.seed_sequence
+        return f"RandomStreams(entropy={root.entropy}, spawn_key={tuple(root.spawn_key)})"
+
+def stream(rng, name: str, key=None):
+    '''
+    Generator for stream `name` from a RandomStreams; a plain Generator is returned as it is (every draw from one
+    stream, the behaviour before named streams), and None gives fresh entropy
+    '''
+    if isinstance(rng, RandomStreams):
+        return rng.generator(name, key)
+    return np.random.default_rng() if rng is None else rng
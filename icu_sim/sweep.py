@@ -0,0 +1,203 @@
+################################################################################################################################################
+'''
+Parameter sweeps of the acceptance-threshold policy
+
+Evaluates the utility policy over a grid of the growth factor e, the base threshold, bed count m and n_day,
+and reports net utility against FCFS at every grid point. Grid points share cohorts (common random numbers):
+replication r draws one cohort per n_day and every (e, base_threshold, m) point is run on that same cohort,
+so differences between grid points are not swamped by cohort noise.
+
+    python -m icu_sim.sweep --e 1.0 1.0008 1.00165 1.0025 --base-threshold 0.05 0.1 --reps 20
+'''
+################################################################################################################################################
+import argparse
+import itertools
+import numpy as np
+from icu_sim.cache import RunCache, cache_key
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.policies import make_policy
+from icu_sim.replications import mean_ci, pool_map
+from icu_sim.simulation import seed_policies
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Constants'''
+SWEEP_PARAMS = ('e', 'base_threshold', 'm', 'n_day')
+INTEGER_PARAMS = ('m', 'n_day')
+################################################################################################################################################
+'''Single Cohort'''
+def _evaluate_cohort(config: SimConfig, seed, points: list, cache: RunCache = None):
+    '''
+    Draw one cohort from `seed` and run every point (dict of e, base_threshold, m) on it
+    Returns an (n_points, 2) array of [utility net utility, FCFS net utility]
+    With a RunCache, points evaluated before (same config, seed and point) are read back instead of simulated
+    '''
+    streams = RandomStreams(seed)
+    net = {}
+    keys = {}
+    policies = {}
+    capacity = {}
+    for k, point in enumerate(points):
+        point_config = config.replace(**point)
+        # FCFS only depends on m
+        for name, policy in ((k, 'utility'), (('fcfs', point_config.m), 'fcfs')):
+            if name in policies or name in net:
+                continue
+            if cache is not None:
+                keys[name] = cache_key('summary', point_config if policy == 'utility' else config.replace(m=point_config.m),
+                                       streams, policy)
+                totals = cache.load_summary(keys[name])
+                if totals is not None:
+                    net[name] = totals[0] + totals[3] - totals[1]
+                    continue
+            policies[name] = make_policy(policy, point_config)
+            capacity[name] = point_config.m
+
+    if policies:
+        # Every remaining grid point and FCFS baseline in a single pass over the cohort
+        patients = None
+        if cache is not None:
+            cohort_key = cache.cohort_key(config, streams)
+            patients = cache.load_cohort(cohort_key)
+        if patients is None:
+            patients = config.cohort(streams)
+            if cache is not None:
+                cache.save_cohort(cohort_key, patients)
+        seed_policies(policies, streams)
+        runs = simulate_policies(patients, capacity, config.t_n, policies, waitlist=config.waitlist, pools=config.pools,
+                                 rng=streams)
+        for name, run in runs.items():
+            net[name] = run.net_utility
+            if cache is not None:
+                cache.save_summary(keys[name], [run.total_u_captured, run.total_u_rejected, run.total_stay_at_home_u, run.total_pool_u])
+    return np.array([[net[k], net[('fcfs', config.replace(**point).m)]] for k, point in enumerate(points)])
+################################################################################################################################################
+'''Sweep Result'''
+class SweepResult:
+    points: list # one dict of swept parameters per grid point
+    net: np.ndarray # (n_points, n_reps) net utility of the utility policy
+    fcfs: np.ndarray # (n_points, n_reps) net utility of FCFS on the same cohorts
+    def __init__(self, points: list, net, fcfs):
+        self.points = points
+        self.net = net
+        self.fcfs = fcfs
+
+    @property
+    def difference(self):
+        return self.net - self.fcfs
+
+    def summary(self, confidence: float = 0.95):
+        '''One row per grid point: parameters, mean net utility, mean FCFS and the paired difference with its interval'''
+        diff, lo, hi = mean_ci(self.difference, confidence, axis=1)
+        net = self.net.mean(axis=1)
+        fcfs = self.fcfs.mean(axis=1)
+        return [dict(point, net_utility=net[k], fcfs_net_utility=fcfs[k], difference=diff[k], ci_low=lo[k], ci_high=hi[k])
+                for k, point in enumerate(self.points)]
+
+    def to_frame(self, confidence: float = 0.95):
+        import pandas as pd
+        return pd.DataFrame(self.summary(confidence))
+
+    def best(self):
+        '''Grid point with the largest mean improvement over FCFS'''
+        return self.points[int(np.argmax(self.difference.mean(axis=1)))]
+
+    def surface(self, x: str, y: str, fixed: dict = None):
+        '''
+        Response surface of the mean difference over parameters x and y
+        Other swept parameters are held at `fixed` (default: their values at the best point)
+        Returns (x values, y values, Z) with Z[i, j] at (xs[i], ys[j]); missing combinations are NaN
+        '''
+        fixed = {k: v for k, v in (fixed or self.best()).items() if k not in (x, y)}
+        xs = sorted({p[x] for p in self.points})
+        ys = sorted({p[y] for p in self.points})
+        Z = np.full((len(xs), len(ys)), np.nan)
+        diff = self.difference.mean(axis=1)
+        for k, p in enumerate(self.points):
+            if all(p.get(name) == value for name, value in fixed.items()):
+                Z[xs.index(p[x]), ys.index(p[y])] = diff[k]
+        return xs, ys, Z
+################################################################################################################################################
+'''Grid Search'''
+def sweep(config: SimConfig, grid: dict, n_reps: int, seed=None, workers: int = None, cache: RunCache = None):
+    '''
+    Evaluate every combination of the values in `grid` ({param: values}, params from SWEEP_PARAMS)
+    Unswept parameters come from `config`. Work is split into one task per (n_day, replication) and spread
+    across `workers` processes; results do not depend on `workers`.
+    cache: optional RunCache of per-point totals, so grid points already evaluated with this seed are not re-run
+    '''
+    unknown = set(grid) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}, expected some of {SWEEP_PARAMS}")
+
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    seeds = RandomStreams(seed).spawn(n_reps) # the same seeds for every n_day
+
+    # Group points by the parameters that change the cohort
+    groups = {}
+    for k, point in enumerate(points):
+        groups.setdefault(point.get('n_day', config.n_day), []).append(k)
+
+    tasks = []
+    for n_day, members in groups.items():
+        group_config = config.replace(n_day=n_day)
+        group_points = [{name: value for name, value in points[k].items() if name != 'n_day'} for k in members]
+        tasks += [(group_config, s, group_points, cache) for s in seeds]
+    outputs = pool_map(_evaluate_cohort, tasks, workers)
+
+    values = np.empty((len(points), n_reps, 2))
+    task = 0
+    for members in groups.values():
+        for r in range(n_reps):
+            values[members, r] = outputs[task]
+            task += 1
+    return SweepResult(points, values[..., 0], values[..., 1])
+################################################################################################################################################
+'''Adaptive Search'''
+def refine(config: SimConfig, bounds: dict, n_reps: int, rounds: int = 3, points: int = 5, seed=None, workers: int = None,
+           cache: RunCache = None):
+    '''
+    Zoom-in grid search: each round sweeps `points` evenly spaced values per parameter inside the current bounds,
+    then shrinks the bounds to one grid step either side of the best point
+    bounds: {param: (low, high)}. Every round reuses the same seeds, so rounds are comparable.
+    Returns the list of SweepResults, one per round (the last one holds the final best point)
+    With a RunCache, grid points revisited by a later round are read back instead of simulated again
+    '''
+    seed = RandomStreams(seed) # drawn once, so seed=None still gives every round the same seeds
+    history = []
+    current = dict(bounds)
+    for _ in range(rounds):
+        grid = {}
+        for name, (lo, hi) in current.items():
+            values = np.linspace(lo, hi, points)
+            grid[name] = sorted(set(np.rint(values).astype(int).tolist())) if name in INTEGER_PARAMS else values.tolist()
+        result = sweep(config, grid, n_reps, seed=seed, workers=workers, cache=cache)
+        history.append(result)
+
+        best = result.best()
+        for name, (lo, hi) in current.items():
+            step = (hi - lo) / (points - 1)
+            low, high = bounds[name]
+            current[name] = (max(low, best[name] - step), min(high, best[name] + step))
+    return history
+################################################################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Grid sweep of the acceptance-threshold policy against FCFS')
+    parser.add_argument('--e', type=float, nargs='+', default=[1.00165])
+    parser.add_argument('--base-threshold', type=float, nargs='+', default=[0.1])
+    parser.add_argument('--m', type=int, nargs='+', default=[722])
+    parser.add_argument('--n-day', type=int, nargs='+', default=[1000])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--reps', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', action='store_true', help='reuse grid points from the run cache (icu_sim.cache)')
+    args = parser.parse_args()
+
+    grid = {'e': args.e, 'base_threshold': args.base_threshold, 'm': args.m, 'n_day': args.n_day}
+    result = sweep(SimConfig(days=args.days), grid, args.reps, seed=args.seed, workers=args.workers,
+                   cache=RunCache() if args.cache else None)
+    for row in result.summary():
+        print(', '.join(f"{k}={v:g}" for k, v in row.items()))
+    print(f"\nBest: {result.best()}")
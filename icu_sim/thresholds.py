@@ -0,0 +1,103 @@
+################################################################################################################################################
+'''
+Acceptance threshold schedules: when beds available = x, acceptance threshold = thresholds[x]
+
+A ThresholdSchedule holds one contiguous float64 array of m + 1 thresholds, so a batch of arrivals is
+checked with a single vectorized `u > thresholds[beds]`. The scripts' backward recurrence
+thresholds[i] = thresholds[i+1] * e * (1 + 1/(m+1)) is a geometric series and is built in closed form.
+'''
+################################################################################################################################################
+import numpy as np
+################################################################################################################################################
+'''Threshold Schedule'''
+class ThresholdSchedule:
+    values: np.ndarray # values[x] = acceptance threshold with x free beds, x = 0..m
+    def __init__(self, values):
+        if isinstance(values, ThresholdSchedule):
+            values = values.values
+        elif isinstance(values, dict):
+            values = [values[x] for x in range(len(values))]
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+
+    @property
+    def m(self):
+        return len(self.values) - 1
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, beds):
+        return self.values[beds]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values if dtype is None else self.values.astype(dtype)
+
+    def accept(self, u, beds):
+        '''Vectorized u > thresholds[beds]; u and beds may be scalars or arrays (no patient is admitted at 0 beds)'''
+        beds = np.asarray(beds)
+        return (np.asarray(u) > self.values[beds]) & (beds > 0)
+
+    def __repr__(self):
+        return f"ThresholdSchedule(m={self.m}, full={self.values[-1]:.4g}, empty={self.values[0]:.4g})"
+
+    # Built-in schedules
+    @classmethod
+    def geometric(cls, m: int, e: float = 1.0, base: float = 0.1):
+        '''thresholds[x] = base * (e * (1 + 1/(m+1))) ** (m - x), the closed form of the scripts' recurrence'''
+        ratio = e * (1 + 1 / (m + 1))
+        return cls(base * ratio ** np.arange(m, -1, -1, dtype=np.float64))
+
+    @classmethod
+    def linear(cls, m: int, full: float = 0.1, empty: float = 1.0):
+        '''Threshold rises linearly from `full` (all m beds free) to `empty` (no beds free)'''
+        return cls(np.linspace(empty, full, m + 1))
+
+    @classmethod
+    def logistic(cls, m: int, full: float = 0.1, empty: float = 1.0, midpoint: float = 0.8, steepness: float = 10.0):
+        '''
+        S-shaped schedule in occupancy (1 - x/m): stays near `full` while the hospital is quiet, then climbs
+        to `empty` around `midpoint` occupancy
+        '''
+        occupancy = 1 - np.arange(m + 1) / max(m, 1)
+        s = 1 / (1 + np.exp(-steepness * (occupancy - midpoint)))
+        return cls(full + (empty - full) * s)
+
+    @classmethod
+    def from_decisions(cls, m: int, free_beds, u, admitted, default: float = 0.1):
+        '''
+        Learn a schedule from observed admissions (e.g. a results CSV: free beds = remaining_beds + 1 for accepted rows)
+        At every free-bed count where both admitted and declined patients were seen, the threshold is placed midway
+        between the highest declined and lowest admitted utility. Those points are fitted with a non-increasing
+        isotonic regression weighted by the number of observations, and interpolated over the other counts.
+        '''
+        free_beds = np.asarray(free_beds, dtype=np.int64)
+        u = np.asarray(u, dtype=np.float64)
+        admitted = np.asarray(admitted, dtype=bool)
+
+        lowest_admitted = np.full(m + 1, np.inf)
+        highest_declined = np.full(m + 1, -np.inf)
+        np.minimum.at(lowest_admitted, free_beds[admitted], u[admitted])
+        np.maximum.at(highest_declined, free_beds[~admitted], u[~admitted])
+
+        known = np.flatnonzero(np.isfinite(lowest_admitted) & np.isfinite(highest_declined))
+        if len(known) == 0:
+            return cls(np.full(m + 1, default))
+        midpoints = (lowest_admitted[known] + highest_declined[known]) / 2
+        weights = np.bincount(free_beds, minlength=m + 1)[known]
+        return cls(np.interp(np.arange(m + 1), known, _decreasing_fit(midpoints, weights)))
+################################################################################################################################################
+'''Helpers'''
+def _decreasing_fit(y, w):
+    '''Weighted isotonic regression constrained to be non-increasing (pool adjacent violators)'''
+    blocks = [] # [mean, weight, length]
+    for value, weight in zip(y.tolist(), w.tolist()):
+        blocks.append([value, weight, 1])
+        while len(blocks) > 1 and blocks[-2][0] < blocks[-1][0]:
+            v2, w2, n2 = blocks.pop()
+            v1, w1, n1 = blocks.pop()
+            blocks.append([(v1 * w1 + v2 * w2) / (w1 + w2), w1 + w2, n1 + n2])
+    return np.repeat([b[0] for b in blocks], [b[2] for b in blocks])
+
+def acceptance_thresholds(m: int, e: float = 1.0, base: float = 0.1):
+    '''The scripts' schedule: geometric growth by e * (1 + 1/(m+1)) per occupied bed, starting from base'''
+    return ThresholdSchedule.geometric(m, e, base)
@@ -0,0 +1,217 @@
+################################################################################################################################################
+'''
+Waitlist for patients who find no free bed
+
+With a Waitlist rule, a policy's blocked patients (no free bed when they arrive) and optionally the ones it
+declined are queued instead of rejected on the spot. Every bed freed by a discharge goes to the highest-priority
+waiting patient, ranked by utility, severity or time waited; a patient still waiting `patience` minutes after
+arriving reneges and is rejected then (joining the at-home program if eligible).
+
+The queue is an IndexedHeap: a binary heap that also knows where every patient sits in it, so insert, pop and
+removing an arbitrary patient are all O(log n). Each queue keeps two of them, one ranked by priority and one by
+reneging deadline; admitting a patient removes them from the deadline heap and reneging removes them from the
+priority heap, so surges with tens of thousands of waiting patients never rescan the queue.
+
+    config = SimConfig(waitlist=Waitlist(priority='severity', patience=(240, 480, 720)))
+    result = run_simulation(config, seed=1)
+    result['utility'].waitlist                     # {admitted, reneged, waiting, longest}
+    result['utility'].admission_time               # minute each patient got a bed, after their wait
+'''
+################################################################################################################################################
+import numpy as np
+################################################################################################################################################
+'''Constants'''
+WAITLIST_PRIORITIES = ('utility', 'severity', 'wait')
+WAITLIST_STATS = ('admitted', 'reneged', 'waiting', 'longest') # Run.waitlist counts
+################################################################################################################################################
+'''Indexed Heap'''
+class IndexedHeap:
+    '''Min-heap of (key, item) pairs with unique, hashable items; push, pop, remove(item) and update in O(log n)'''
+    def __init__(self):
+        self._keys = []
+        self._items = []
+        self._pos = {} # item -> index in the heap lists
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._pos
+
+    def peek(self):
+        return self._keys[0], self._items[0]
+
+    def push(self, item, key):
+        if item in self._pos:
+            raise KeyError(f"{item!r} is already in the heap")
+        self._keys.append(key)
+        self._items.append(item)
+        self._pos[item] = len(self._items) - 1
+        self._sift_up(len(self._items) - 1)
+
+    def pop(self):
+        '''Remove and return the (key, item) with the smallest key'''
+        key, item = self._keys[0], self._items[0]
+        self._remove_at(0)
+        return key, item
+
+    def remove(self, item):
+        '''Remove `item` wherever it is; returns its key'''
+        index = self._pos[item]
+        key = self._keys[index]
+        self._remove_at(index)
+        return key
+
+    def update(self, item, key):
+        index = self._pos[item]
+        old = self._keys[index]
+        self._keys[index] = key
+        if key < old:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def items(self):
+        '''[(key, item)] in heap order'''
+        return list(zip(self._keys, self._items))
+
+    # Heap maintenance
+    def _remove_at(self, index: int):
+        last = len(self._items) - 1
+        del self._pos[self._items[index]]
+        if index != last:
+            self._keys[index], self._items[index] = self._keys[last], self._items[last]
+            self._pos[self._items[index]] = index
+        self._keys.pop()
+        self._items.pop()
+        if index < last:
+            self._sift_down(index)
+            self._sift_up(index)
+
+    def _sift_up(self, index: int):
+        keys, items, pos = self._keys, self._items, self._pos
+        key, item = keys[index], items[index]
+        while index > 0:
+            parent = (index - 1) >> 1
+            if not key < keys[parent]:
+                break
+            keys[index], items[index] = keys[parent], items[parent]
+            pos[items[index]] = index
+            index = parent
+        keys[index], items[index] = key, item
+        pos[item] = index
+
+    def _sift_down(self, index: int):
+        keys, items, pos = self._keys, self._items, self._pos
+        n = len(keys)
+        key, item = keys[index], items[index]
+        while True:
+            child = 2 * index + 1
+            if child >= n:
+                break
+            if child + 1 < n and keys[child + 1] < keys[child]:
+                child += 1
+            if not keys[child] < key:
+                break
+            keys[index], items[index] = keys[child], items[child]
+            pos[items[index]] = index
+            index = child
+        keys[index], items[index] = key, item
+        pos[item] = index
+################################################################################################################################################
+'''Waitlist Rule'''
+class Waitlist:
+    priority: str # 'utility' (highest u first), 'severity' (most severe first, then highest u) or 'wait' (FIFO)
+    patience: np.ndarray # float64 (3,) minutes a patient of each severity waits before reneging, inf = never
+    declined: bool # also queue patients the policy declined while beds were free
+    capacity: int # most patients waiting at once, later ones are rejected on arrival (None = unbounded)
+    def __init__(self, priority: str = 'utility', patience=np.inf, declined: bool = False, capacity: int = None):
+        if priority not in WAITLIST_PRIORITIES:
+            raise ValueError(f"Unknown waitlist priority {priority!r}, expected one of {WAITLIST_PRIORITIES}")
+        self.priority = priority
+        self.patience = np.broadcast_to(np.asarray(patience, dtype=np.float64), (3,)).copy()
+        self.declined = declined
+        self.capacity = capacity
+
+    def to_dict(self):
+        return {'priority': self.priority, 'patience': [None if np.isinf(p) else float(p) for p in self.patience],
+                'declined': self.declined, 'capacity': self.capacity}
+
+    @classmethod
+    def from_dict(cls, params: dict):
+        patience = [np.inf if p is None else p for p in params['patience']]
+        return cls(params['priority'], patience, params['declined'], params['capacity'])
+
+    def __repr__(self):
+        return (f"Waitlist(priority={self.priority!r}, patience={tuple(self.patience.tolist())}, declined={self.declined}, "
+                f"capacity={self.capacity})")
+################################################################################################################################################
+'''Queue'''
+class WaitQueue:
+    '''One policy's waiting patients under a Waitlist rule (engine state)'''
+    rule: Waitlist
+    ranked: IndexedHeap # patient index by priority key
+    deadlines: IndexedHeap # patient index by (reneging time, entry order)
+    entered: dict # {patient index: (arrival time, entry order)}
+    admitted: int # patients admitted from the queue so far
+    reneged: int # patients who left the queue unserved
+    longest: int # most patients waiting at once
+    def __init__(self, rule: Waitlist):
+        self.rule = rule
+        self.ranked = IndexedHeap()
+        self.deadlines = IndexedHeap()
+        self.entered = {}
+        self.seq = 0
+        self.admitted = 0
+        self.reneged = 0
+        self.longest = 0
+
+    def __len__(self):
+        return len(self.entered)
+
+    def stats(self):
+        return {'admitted': self.admitted, 'reneged': self.reneged, 'waiting': len(self.entered), 'longest': self.longest}
+
+    def _key(self, u: float, severity: int, t: int, seq: int):
+        priority = self.rule.priority
+        if priority == 'utility':
+            return (-u, seq)
+        if priority == 'severity':
+            return (severity, -u, seq)
+        return (t, seq)
+
+    def push(self, i: int, t: int, u: float, severity: int, seq: int = None):
+        '''Queue patient i arriving at t; False when the queue is full'''
+        capacity = self.rule.capacity
+        if capacity is not None and len(self.entered) >= capacity:
+            return False
+        if seq is None:
+            seq = self.seq
+        self.seq = max(self.seq, seq + 1)
+        self.entered[i] = (t, seq)
+        self.ranked.push(i, self._key(u, severity, t, seq))
+        patience = self.rule.patience[severity]
+        if patience != np.inf:
+            self.deadlines.push(i, (t + int(patience), seq))
+        self.longest = max(self.longest, len(self.entered))
+        return True
+
+    def pop(self):
+        '''Highest-priority waiting patient, removed from the queue'''
+        _, i = self.ranked.pop()
+        if i in self.deadlines:
+            self.deadlines.remove(i)
+        del self.entered[i]
+        self.admitted += 1
+        return i
+
+    def next_deadline(self):
+        return self.deadlines.peek()[0][0] if len(self.deadlines) else None
+
+    def renege(self):
+        '''Remove the patient with the earliest deadline; returns (deadline, patient index)'''
+        (deadline, _), i = self.deadlines.pop()
+        self.ranked.remove(i)
+        del self.entered[i]
+        self.reneged += 1
+        return deadline, i
@@ -0,0 +1,62 @@
+################################################################################################################################################
+'''Sampled arrivals follow the configured rates: daily buckets, day-of-week factors and surges'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.arrivals import MINUTES_PER_DAY, ArrivalProcess, Surge
+from icu_sim.config import ARRIVAL_TIMES, SimConfig
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+DAYS = 28
+WEEKDAY = (1.2, 1.0, 1.0, 1.0, 1.0, 0.8, 0.6)
+SURGE = Surge(start=10 * MINUTES_PER_DAY, end=13 * MINUTES_PER_DAY, factor=2.0)
+
+def test_intensity_profile():
+    process = ArrivalProcess.from_buckets(ARRIVAL_TIMES['urgent'], weekday=WEEKDAY, surges=[SURGE])
+    rate = process.intensity(DAYS).reshape(DAYS, MINUTES_PER_DAY)
+    assert process.daily.sum() == pytest.approx(1.0)
+    assert rate.sum(axis=1)[:7] == pytest.approx(WEEKDAY)
+    assert rate[10:13].sum(axis=1) == pytest.approx(2 * np.array(WEEKDAY)[[3, 4, 5]])
+    shares = np.array(list(ARRIVAL_TIMES['urgent'].values()))
+    assert rate[0, :360].sum() == pytest.approx(shares[0] / shares.sum() * WEEKDAY[0])
+
+def test_sample_matches_the_configured_shares():
+    process = ArrivalProcess.from_buckets(ARRIVAL_TIMES['urgent'], weekday=WEEKDAY, surges=[SURGE])
+    n = 400000
+    minutes = process.sample(n, DAYS, rng=np.random.default_rng(3))
+    assert len(minutes) == n and minutes.min() >= 0 and minutes.max() < DAYS * MINUTES_PER_DAY
+    rate = process.intensity(DAYS)
+    per_day = np.bincount(minutes // MINUTES_PER_DAY, minlength=DAYS)
+    expected = n * rate.reshape(DAYS, MINUTES_PER_DAY).sum(axis=1) / rate.sum()
+    assert per_day == pytest.approx(expected, rel=0.03)
+    bucket = np.searchsorted([360, 840], minutes % MINUTES_PER_DAY, side='right')
+    assert np.bincount(bucket) / n == pytest.approx(np.array(list(ARRIVAL_TIMES['urgent'].values())) / 100, abs=0.005)
+
+def test_thinning_matches_the_configured_rate():
+    per_day = 500
+    process = ArrivalProcess.sinusoidal(0.8, peak_minute=720, weekday=WEEKDAY, surges=[Surge(7 * MINUTES_PER_DAY, 14 * MINUTES_PER_DAY, 1.5, ramp=720)])
+    minutes = process.thinning(per_day, DAYS, rng=np.random.default_rng(4))
+    expected = per_day * process.intensity(DAYS)
+    assert np.all(np.diff(minutes) >= 0)
+    assert len(minutes) == pytest.approx(expected.sum(), rel=0.02)
+    # Surge week vs the week before, and the peak vs the trough half of the day
+    weeks = np.bincount(minutes // (7 * MINUTES_PER_DAY), minlength=4)
+    assert weeks[1] / weeks[0] == pytest.approx(expected[7 * MINUTES_PER_DAY:14 * MINUTES_PER_DAY].sum() / expected[:7 * MINUTES_PER_DAY].sum(), rel=0.05)
+    peak = np.abs(minutes % MINUTES_PER_DAY - 720) < 360
+    assert peak.mean() == pytest.approx(expected.reshape(DAYS, MINUTES_PER_DAY)[:, 360:1080].sum() / expected.sum(), abs=0.01)
+
+def test_shifted_process_continues_the_original():
+    process = ArrivalProcess.sinusoidal(0.5, weekday=WEEKDAY, surges=[SURGE], start_weekday=2)
+    assert process.shifted(5).intensity(DAYS - 5) == pytest.approx(process.intensity(DAYS)[5 * MINUTES_PER_DAY:])
+
+def test_cohort_uses_the_arrival_process():
+    config = SimConfig(n_day=2000, days=DAYS, arrival_process=ArrivalProcess.sinusoidal(0.0, weekday=WEEKDAY, surges=[SURGE]))
+    patients = config.cohort(RandomStreams(5))
+    per_day = np.bincount(patients.arrival_time // MINUTES_PER_DAY, minlength=DAYS)
+    rate = config.arrival_process.intensity(DAYS).reshape(DAYS, MINUTES_PER_DAY).sum(axis=1)
+    assert per_day == pytest.approx(len(patients) * rate / rate.sum(), rel=0.1)
+
+def test_invalid_profile():
+    with pytest.raises(ValueError, match='Daily profile'):
+        ArrivalProcess(np.zeros(MINUTES_PER_DAY))
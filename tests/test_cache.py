@@ -0,0 +1,64 @@
+################################################################################################################################################
+'''A cache hit returns exactly the run that was simulated, and only what determines a run is part of its key'''
+################################################################################################################################################
+import os
+import numpy as np
+import pytest
+from icu_sim import simulation
+from icu_sim.cache import RunCache
+from icu_sim.config import SimConfig
+from icu_sim.simulation import run_simulation
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=300, days=2)
+ARRAYS = ('status', 'decision', 'pool_index', 'remaining_beds', 'admission_time')
+TOTALS = ('total_u_captured', 'total_u_rejected', 'total_stay_at_home_u', 'total_pool_u')
+
+def assert_same_run(a, b):
+    for name in ARRAYS:
+        assert np.array_equal(getattr(a, name), getattr(b, name)), name
+    for name in TOTALS:
+        assert getattr(a, name) == getattr(b, name), name
+    for name in ('times', 'captured', 'rejected', 'at_home', 'beds'):
+        assert np.array_equal(getattr(a.log, name), getattr(b.log, name)), name
+    assert a.pools == b.pools and a.waitlist == b.waitlist
+
+def test_cache_hit_returns_identical_arrays(tmp_path, monkeypatch):
+    cache = RunCache(str(tmp_path))
+    simulated = run_simulation(CONFIG, seed=4, cache=cache)
+    assert len(cache.entries()) == 1 + len(simulated.runs) # the cohort and one entry per policy
+    assert_same_run(simulated.runs['utility'], run_simulation(CONFIG, seed=4).runs['utility'])
+
+    monkeypatch.setattr(simulation, 'simulate_policies', lambda *args, **kwargs: pytest.fail('cache miss'))
+    cached = run_simulation(CONFIG, seed=4, cache=cache)
+    for field in ('severity', 'age', 'arrival_time', 'dispatch_time', 'u'):
+        assert np.array_equal(getattr(cached.patients, field), getattr(simulated.patients, field))
+    for name, run in simulated.runs.items():
+        assert_same_run(cached.runs[name], run)
+
+def test_new_policy_reuses_the_cohort(tmp_path):
+    cache = RunCache(str(tmp_path))
+    run_simulation(CONFIG, ('fcfs',), seed=4, cache=cache)
+    run_simulation(CONFIG.replace(m=40), ('fcfs', 'utility'), seed=4, cache=cache)
+    kinds = sorted(os.path.basename(path).split('-')[0] for _, _, path in cache.entries())
+    assert kinds == ['cohort', 'run', 'run', 'run']
+
+def test_keys_follow_what_determines_a_run():
+    cache = RunCache()
+    streams = RandomStreams(4)
+    assert cache.run_key(CONFIG, streams, 'fcfs', 'fcfs') == cache.run_key(SimConfig(m=60, n_day=300, days=2), RandomStreams(4), 'fcfs', 'fcfs')
+    assert cache.run_key(CONFIG, streams, 'fcfs', 'fcfs') != cache.run_key(CONFIG.replace(e=1.001), streams, 'fcfs', 'fcfs')
+    assert cache.run_key(CONFIG, streams, 'fcfs', 'fcfs') != cache.run_key(CONFIG, RandomStreams(5), 'fcfs', 'fcfs')
+    assert cache.cohort_key(CONFIG, streams) == cache.cohort_key(CONFIG.replace(m=10, e=1.01), streams)
+    assert cache.cohort_key(CONFIG, streams) != cache.cohort_key(CONFIG.replace(days=3), streams)
+
+def test_eviction_keeps_the_most_recent_entries(tmp_path):
+    cache = RunCache(str(tmp_path))
+    for k in range(4):
+        cache.save_summary(f'k{k}', [k])
+        os.utime(cache._path('summary', f'k{k}'), (k, k))
+    cache.load_summary('k0') # refreshes k0
+    cache.evict(2 * os.path.getsize(cache._path('summary', 'k0')))
+    assert [cache.load_summary(f'k{k}') is not None for k in range(4)] == [True, False, False, True]
+    assert not [name for name in os.listdir(tmp_path) if '.tmp' in name]
@@ -0,0 +1,80 @@
+################################################################################################################################################
+'''Resuming a checkpointed run gives the run that was never interrupted'''
+################################################################################################################################################
+import json
+import numpy as np
+import pytest
+from icu_sim.checkpoint import CHECKPOINT_FORMAT, list_checkpoints, load_checkpoint
+from icu_sim.config import SimConfig
+from icu_sim.durations import GammaStay
+from icu_sim.resources import AT_HOME_POOL, ResourcePool
+from icu_sim.simulation import run_simulation, resume_simulation
+from icu_sim.waitlist import Waitlist
+################################################################################################################################################
+'''Helpers'''
+RUN_ARRAYS = ('status', 'decision', 'pool_index', 'remaining_beds', 'admission_time')
+RUN_TOTALS = ('total_u_captured', 'total_u_rejected', 'total_stay_at_home_u', 'total_pool_u')
+LOG_FIELDS = ('times', 'captured', 'rejected', 'at_home', 'beds')
+
+def assert_same_run(a, b):
+    for name in RUN_ARRAYS:
+        assert np.array_equal(getattr(a, name), getattr(b, name)), name
+    for name in RUN_TOTALS:
+        assert getattr(a, name) == getattr(b, name), name
+    for name in LOG_FIELDS:
+        assert list(getattr(a.log, name)) == list(getattr(b.log, name)), name
+    assert a.waitlist == b.waitlist
+    assert a.pools == b.pools
+
+CONFIGS = {
+    'default': SimConfig(m=80, n_day=300, days=4),
+    # Waitlist queues and a capacity-limited pool are part of the saved state too
+    'waitlist and pools': SimConfig(m=80, n_day=300, days=4, waitlist=Waitlist('severity', (120, 240, 480)),
+                                    pools=(ResourcePool('ward', capacity=10, stay=GammaStay.from_moments(12 * 60, 0.5),
+                                                        utility_range=(0.5, 1.0), factor=0.5), AT_HOME_POOL)),
+}
+################################################################################################################################################
+'''Tests'''
+@pytest.mark.parametrize('name', list(CONFIGS))
+def test_resume_matches_uninterrupted_run(tmp_path, name):
+    config = CONFIGS[name]
+    full = run_simulation(config, seed=7, checkpoint_every=24 * 60, checkpoint_dir=str(tmp_path))
+    checkpoints = list_checkpoints(str(tmp_path))
+    assert [t for t, _ in checkpoints] == [24 * 60 * day for day in range(1, config.days + 1)]
+    for t, path in checkpoints[:-1]:
+        resumed = resume_simulation(path, config)
+        for policy in full.runs:
+            assert_same_run(resumed[policy], full[policy])
+
+def test_extending_in_one_step_or_two_is_the_same(tmp_path):
+    config = CONFIGS[list(CONFIGS)[-1]] # the richest state
+    run_simulation(config, seed=7, checkpoint_every=24 * 60, checkpoint_dir=str(tmp_path / 'run'))
+    end = list_checkpoints(str(tmp_path / 'run'))[-1][1]
+    once = resume_simulation(end, config.replace(days=config.days + 2))
+    resume_simulation(end, config.replace(days=config.days + 1), checkpoint_every=24 * 60, checkpoint_dir=str(tmp_path / 'step'))
+    twice = resume_simulation(list_checkpoints(str(tmp_path / 'step'))[-1][1], config.replace(days=config.days + 2))
+    assert len(once.patients) > len(load_checkpoint(end).patients)
+    assert np.array_equal(once.patients.arrival_time, twice.patients.arrival_time)
+    for policy in once.runs:
+        assert_same_run(once[policy], twice[policy])
+
+def test_forked_state_is_independent(tmp_path):
+    config = CONFIGS['default']
+    run_simulation(config, seed=7, checkpoint_every=24 * 60, checkpoint_dir=str(tmp_path))
+    state = load_checkpoint(list_checkpoints(str(tmp_path))[0][1])
+    first = resume_simulation(state, config)
+    second = resume_simulation(state, config)
+    for policy in first.runs:
+        assert_same_run(first[policy], second[policy])
+
+def test_other_formats_are_rejected(tmp_path):
+    run_simulation(CONFIGS['default'], seed=7, checkpoint_every=24 * 60, checkpoint_dir=str(tmp_path))
+    path = list_checkpoints(str(tmp_path))[0][1]
+    with np.load(path) as saved:
+        arrays = {name: saved[name] for name in saved.files}
+    meta = json.loads(str(arrays['meta']))
+    meta['format'] = CHECKPOINT_FORMAT - 1
+    arrays['meta'] = np.array(json.dumps(meta))
+    np.savez(tmp_path / 'old.npz', **arrays)
+    with pytest.raises(ValueError, match=f'only reads format {CHECKPOINT_FORMAT}'):
+        load_checkpoint(str(tmp_path / 'old.npz'))
@@ -0,0 +1,46 @@
+################################################################################################################################################
+'''The vectorized cohort follows the scripts' per-severity tables'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.cohort import MIN_STAY, UTILITY_RANGES
+from icu_sim.config import ARRIVAL_TIMES, DISTRIBUTION_DATA, OVERALL_PROBS, SimConfig
+from icu_sim.patients import AGE_GROUPS, SEVERITIES
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(n_day=20000, days=10)
+
+@pytest.fixture(scope='module')
+def cohort():
+    return CONFIG.cohort(RandomStreams(8))
+
+def test_size_and_horizon(cohort):
+    assert len(cohort) == CONFIG.n
+    assert cohort.arrival_time.min() >= 0 and cohort.arrival_time.max() < CONFIG.t_n
+    assert np.all(cohort.dispatch_time - cohort.arrival_time >= MIN_STAY)
+
+def test_severity_and_age_shares(cohort):
+    shares = np.bincount(cohort.severity, minlength=len(SEVERITIES)) / len(cohort)
+    assert shares == pytest.approx([OVERALL_PROBS[s] for s in SEVERITIES], abs=0.005)
+    for code, name in enumerate(SEVERITIES):
+        ages = cohort.age[cohort.severity == code]
+        assert np.bincount(ages, minlength=len(AGE_GROUPS)) / len(ages) == pytest.approx(DISTRIBUTION_DATA[name], abs=0.01)
+
+def test_utility_ranges(cohort):
+    for code, (low, high) in enumerate(UTILITY_RANGES):
+        u = cohort.u[cohort.severity == code]
+        assert u.min() >= np.float32(low) and u.max() <= np.float32(high)
+        assert u.mean() == pytest.approx((low + high) / 2, abs=0.005)
+
+def test_arrival_bucket_shares(cohort):
+    minute = cohort.arrival_time % (24 * 60)
+    bucket = np.searchsorted([360, 840], minute, side='right')
+    for code, name in enumerate(SEVERITIES):
+        shares = np.bincount(bucket[cohort.severity == code], minlength=3) / np.sum(cohort.severity == code)
+        assert shares == pytest.approx(np.array(list(ARRIVAL_TIMES[name].values())) / 100, abs=0.01)
+
+def test_same_seed_same_cohort():
+    a, b = CONFIG.replace(days=2).cohort(RandomStreams(3)), CONFIG.replace(days=2).cohort(RandomStreams(3))
+    for name in ('severity', 'age', 'arrival_time', 'dispatch_time', 'u'):
+        assert np.array_equal(getattr(a, name), getattr(b, name))
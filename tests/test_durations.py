@@ -0,0 +1,77 @@
+################################################################################################################################################
+'''Stay models reproduce the moments they are built from or fitted to'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim import durations
+from icu_sim.durations import CELLS, EmpiricalStay, GammaStay, LognormalStay, StayModel, fit_stay_model, matched_stay_model
+################################################################################################################################################
+'''Tests'''
+N = 400000
+MEAN = np.array([1200.0, 600.0, 300.0])
+CV = np.array([0.8, 0.5, 1.2])
+
+@pytest.fixture(scope='module')
+def cells():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, CELLS[0], N), rng.integers(0, CELLS[1], N)
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(durations, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(durations, '_FITTED', {})
+    return tmp_path
+
+def sample_moments(model, severity, age, seed=1):
+    stay = model.sample(severity, age, np.random.default_rng(seed)).astype(np.float64)
+    mean = np.array([stay[severity == s].mean() for s in range(CELLS[0])])
+    std = np.array([stay[severity == s].std() for s in range(CELLS[0])])
+    return mean, std / mean
+
+@pytest.mark.parametrize('model', [LognormalStay, GammaStay])
+def test_from_moments_hits_the_targets(cells, model):
+    built = model.from_moments(MEAN, CV)
+    assert built.mean() == pytest.approx(np.broadcast_to(MEAN[:, None], CELLS), rel=1e-9)
+    mean, cv = sample_moments(built, *cells)
+    # Stays are rounded up to whole minutes, so the sampled mean is about half a minute higher
+    assert mean == pytest.approx(MEAN + 0.5, rel=0.01)
+    assert cv == pytest.approx(CV, rel=0.03)
+
+@pytest.mark.parametrize('kind, family', [('lognormal', LognormalStay), ('gamma', GammaStay)])
+def test_fitted_moments_match_the_data(cells, cache_dir, kind, family):
+    severity, age = cells
+    observed = family.from_moments(MEAN, CV).sample(severity, age, np.random.default_rng(2))
+    fitted = fit_stay_model(kind, observed, severity, age)
+    mean, cv = sample_moments(fitted, severity, age)
+    data_mean = np.array([observed[severity == s].mean() for s in range(CELLS[0])])
+    data_cv = np.array([observed[severity == s].std() for s in range(CELLS[0])]) / data_mean
+    assert mean == pytest.approx(data_mean, rel=0.02)
+    assert cv == pytest.approx(data_cv, rel=0.05)
+
+def test_fit_is_cached(cells, cache_dir, monkeypatch):
+    severity, age = cells
+    observed = LognormalStay.from_moments(MEAN, CV).sample(severity, age, np.random.default_rng(3))
+    fitted = fit_stay_model('lognormal', observed, severity, age)
+    assert [path.suffix for path in cache_dir.iterdir()] == ['.npz']
+    monkeypatch.setattr(durations, '_FITTED', {})
+    monkeypatch.setattr(durations, '_cell_moments', lambda *args, **kwargs: pytest.fail('cache miss'))
+    cached = fit_stay_model('lognormal', observed, severity, age)
+    assert np.array_equal(cached.mu, fitted.mu) and np.array_equal(cached.sigma, fitted.sigma)
+
+def test_empirical_resamples_its_cell(cells):
+    severity, age = cells
+    observed = (1 + 100 * severity + 10 * age).astype(np.float64) # one value per cell
+    model = EmpiricalStay.from_observations(observed, severity, age)
+    stay = model.sample(severity[:1000], age[:1000], np.random.default_rng(4))
+    assert np.array_equal(stay, observed[:1000].astype(np.int64))
+
+def test_matched_model_keeps_the_scripts_moments():
+    lo, hi, scale, std_ratio = np.array([0.5, 0.5, 0.5]), np.array([1.5, 1.5, 1.5]), (1.0, 0.66, 0.33), 0.1
+    model = matched_stay_model('gamma', scale, tuple(zip(lo.tolist(), hi.tolist())), std_ratio)
+    expected_var = (np.array(scale) * (hi - lo)) ** 2 / 12 + (2 * std_ratio) ** 2
+    assert model.mean()[:, 0] == pytest.approx(np.array(scale) * (lo + hi) / 2)
+    assert (model.shape * model.scale ** 2)[:, 0] == pytest.approx(expected_var)
+
+def test_stay_model_is_abstract():
+    with pytest.raises(TypeError):
+        StayModel()
@@ -0,0 +1,87 @@
+################################################################################################################################################
+'''
+Engine vs the per-minute loop it replaced
+
+The reference walks every minute like the original sim.py: free the beds of patients dispatched at t, then decide
+the patients arriving at t in arrival order. The heap engine has to give the same decisions, totals and bed series.
+'''
+################################################################################################################################################
+from collections import defaultdict
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.patients import ACCEPTED, REJECTED, AT_HOME, UNDECIDED
+from icu_sim.policies import make_policy
+from icu_sim.resources import AT_HOME_RANGE, AT_HOME_FACTOR
+from icu_sim.streams import RandomStreams
+from icu_sim.thresholds import acceptance_thresholds
+################################################################################################################################################
+'''Reference'''
+def per_minute(patients, m, t_n, admit):
+    '''admit(u, free beds) -> bool; returns (decisions, captured, rejected, at_home, free beds at the end of every minute)'''
+    u = patients.u.tolist()
+    dispatch = patients.dispatch_time.tolist()
+    arriving, leaving = defaultdict(list), defaultdict(list)
+    for i in np.argsort(patients.arrival_time, kind='stable').tolist():
+        arriving[int(patients.arrival_time[i])].append(i)
+    decision = np.full(len(patients), UNDECIDED, dtype=np.int8)
+    beds, captured, rejected, at_home = m, 0.0, 0.0, 0.0
+    beds_over_time = []
+    for t in range(t_n):
+        for _ in leaving.pop(t, ()):
+            beds = min(beds + 1, m)
+        for i in arriving.get(t, ()):
+            if beds > 0 and admit(u[i], beds):
+                beds -= 1
+                captured += u[i]
+                decision[i] = ACCEPTED
+                leaving[dispatch[i]].append(i)
+            else:
+                rejected += u[i]
+                if AT_HOME_RANGE[0] <= u[i] <= AT_HOME_RANGE[1]:
+                    at_home += u[i] * AT_HOME_FACTOR
+                    decision[i] = AT_HOME
+                else:
+                    decision[i] = REJECTED
+        beds_over_time.append(beds)
+    return decision, captured, rejected, at_home, np.array(beds_over_time)
+################################################################################################################################################
+'''Tests'''
+@pytest.fixture(scope='module')
+def congested():
+    # Few beds for the arrivals, so both policies run out of beds and the thresholds matter
+    config = SimConfig(m=60, n_day=400, days=4)
+    return config, config.cohort(RandomStreams(11))
+
+@pytest.mark.parametrize('policy', ['utility', 'fcfs'])
+def test_engine_matches_per_minute_loop(congested, policy):
+    config, patients = congested
+    thresholds = acceptance_thresholds(config.m, config.e, config.base_threshold).values.tolist()
+    admit = (lambda u, beds: u > thresholds[beds]) if policy == 'utility' else (lambda u, beds: True)
+    decision, captured, rejected, at_home, beds = per_minute(patients, config.m, config.t_n, admit)
+
+    run = simulate_policies(patients, config.m, config.t_n, {policy: make_policy(policy, config)})[policy]
+    assert np.array_equal(run.decision, decision)
+    assert (run.decision == REJECTED).any() and (run.decision == AT_HOME).any()
+    assert run.total_u_captured == pytest.approx(captured, rel=1e-12)
+    assert run.total_u_rejected == pytest.approx(rejected, rel=1e-12)
+    assert run.total_stay_at_home_u == pytest.approx(at_home, rel=1e-12)
+    assert np.array_equal(run.log.series('beds', config.t_n), beds)
+
+def test_policies_in_one_pass_match_separate_runs(congested):
+    config, patients = congested
+    policies = ('utility', 'fcfs', 'batch_threshold')
+    together = simulate_policies(patients, config.m, config.t_n, {name: make_policy(name, config) for name in policies})
+    for name in policies:
+        alone = simulate_policies(patients, config.m, config.t_n, {name: make_policy(name, config)})[name]
+        assert np.array_equal(together[name].decision, alone.decision)
+        assert together[name].net_utility == alone.net_utility
+        assert together[name].log.beds == alone.log.beds
+
+def test_policies_get_their_own_bed_counts(congested):
+    config, patients = congested
+    runs = simulate_policies(patients, {'small': 30, 'large': 90}, config.t_n,
+                             {'small': make_policy('fcfs'), 'large': make_policy('fcfs')})
+    assert max(runs['small'].log.beds) <= 30 and min(runs['small'].log.beds) == 0
+    assert (runs['large'].decision == ACCEPTED).sum() > (runs['small'].decision == ACCEPTED).sum()
@@ -0,0 +1,63 @@
+################################################################################################################################################
+'''Fairness tables account for every decided patient and agree with the runs' totals'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.fairness import DAY, FairnessTables, fairness_replications
+from icu_sim.patients import ACCEPTED, AGE_GROUPS, SEVERITIES
+from icu_sim.resources import AT_HOME_POOL, ResourcePool
+from icu_sim.simulation import run_simulation
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=300, days=3,
+                   pools=(ResourcePool('ward', capacity=10, utility_range=(0.5, 1.0), factor=0.5), AT_HOME_POOL))
+POLICIES = ('utility', 'fcfs')
+
+@pytest.fixture(scope='module')
+def result():
+    return run_simulation(CONFIG, POLICIES, seed=6)
+
+def test_tables_sum_to_the_cohort(result):
+    tables = FairnessTables.from_result(result, POLICIES)
+    counts, utility, recovered = tables.total()
+    patients = result.patients
+    for k, policy in enumerate(POLICIES):
+        run = result[policy]
+        decided = run.decision >= 0
+        assert counts[k].sum() == decided.sum() == len(patients)
+        assert np.array_equal(counts[k].sum(axis=(1, 2)), np.bincount(patients.age[decided], minlength=len(AGE_GROUPS)))
+        assert np.array_equal(counts[k].sum(axis=(0, 2)), np.bincount(patients.severity[decided], minlength=len(SEVERITIES)))
+        assert counts[k][..., ACCEPTED].sum() == np.sum(run.decision == ACCEPTED)
+        assert utility[k][..., ACCEPTED].sum() == pytest.approx(run.total_u_captured, rel=1e-6)
+        assert recovered[k].sum() == pytest.approx(run.total_pool_u, rel=1e-6)
+
+def test_blocks_add_up_to_the_whole_run(result):
+    whole = FairnessTables.from_result(result, POLICIES)
+    days = FairnessTables.from_result(result, POLICIES, block=DAY)
+    assert len(days) == CONFIG.days
+    assert np.array_equal(days.total()[0], whole.total()[0])
+    with pytest.raises(ValueError, match='autocorrelated'):
+        days.bootstrap('acceptance_rates')
+
+def test_metrics_from_the_tables(result):
+    tables = FairnessTables.from_result(result, POLICIES)
+    run, patients = result['fcfs'], result.patients
+    for a in range(len(AGE_GROUPS)):
+        group = patients.age == a
+        assert tables.acceptance_rates('fcfs')[a] == pytest.approx(np.mean(run.decision[group] == ACCEPTED))
+    assert np.nanmax(tables.rate_ratios('utility')) == pytest.approx(1.0)
+    assert np.all(tables.utility_loss('utility') <= tables.utility_loss('utility', gross=True))
+
+def test_bootstrap_draws_from_its_own_stream():
+    tables = fairness_replications(CONFIG.replace(days=1), 6, seed=3, policies=('utility',), workers=1)
+    assert len(tables) == 6
+    estimate, lo, hi = tables.bootstrap('acceptance_rates', 'utility', n_boot=200, seed=RandomStreams(3))
+    assert np.all((lo <= estimate) & (estimate <= hi))
+    again = tables.bootstrap('acceptance_rates', 'utility', n_boot=200, seed=RandomStreams(3))
+    assert np.array_equal(lo, again[1]) and np.array_equal(hi, again[2])
+    # Using the policies stream first changes nothing
+    streams = RandomStreams(3)
+    streams.generator('policies', key='bootstrap').random(100)
+    assert np.array_equal(lo, tables.bootstrap('acceptance_rates', 'utility', n_boot=200, seed=streams)[1])
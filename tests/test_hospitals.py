@@ -0,0 +1,54 @@
+################################################################################################################################################
+'''patients.csv parses into typed columns, and the cache returns the same table without re-parsing'''
+################################################################################################################################################
+import shutil
+import numpy as np
+import pytest
+from icu_sim import hospitals
+from icu_sim.hospitals import COLUMNS, HOSPITALS_CSV, load_hospitals, parse_hospitals
+################################################################################################################################################
+'''Tests'''
+@pytest.fixture
+def csv_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(hospitals, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(hospitals, '_LOADED', {})
+    path = tmp_path / 'patients.csv'
+    shutil.copy(HOSPITALS_CSV, path)
+    return path
+
+def test_parse_numbers_and_labels():
+    table = parse_hospitals('Hospital Name,City,Staffed Beds,Total Discharges,Patient Days,Gross Patient Revenue ($000)\n'
+                            'A ,Boston,114,"4,472","29,935","$62,427 "\n'
+                            'B,Salem,,,,\n')
+    assert table.name.tolist() == ['A', 'B'] and table.city.tolist() == ['Boston', 'Salem']
+    assert table.staffed_beds.dtype == np.int32 and table.staffed_beds.tolist() == [114, 0]
+    assert table.total_discharges[0] == 4472 and table.patient_days[0] == 29935 and table['Gross Patient Revenue ($000)'][0] == 62427
+    assert np.isnan(table.total_discharges[1]) and np.isnan(table.gross_patient_revenue[1])
+
+def test_patients_csv_matches_pandas():
+    pd = pytest.importorskip('pandas')
+    table = load_hospitals(cache=False)
+    frame = pd.read_csv(HOSPITALS_CSV, thousands=',')
+    assert len(table) == len(frame)
+    assert table.name.tolist() == frame['Hospital Name'].str.strip().tolist()
+    assert np.array_equal(table.total_discharges, frame['Total Discharges'].astype(float), equal_nan=True)
+
+def test_cache_hit_returns_identical_arrays(csv_copy, monkeypatch):
+    parsed = load_hospitals(csv_copy)
+    assert len(list((csv_copy.parent / 'cache').iterdir())) == 1
+    assert load_hospitals(csv_copy) is parsed # same process: the table already in memory
+
+    # New process: loaded from the cache file, without parsing
+    monkeypatch.setattr(hospitals, '_LOADED', {})
+    monkeypatch.setattr(hospitals, 'parse_hospitals', lambda text: pytest.fail('cache miss'))
+    cached = load_hospitals(csv_copy)
+    for name, _, dtype in COLUMNS:
+        assert np.array_equal(getattr(cached, name), getattr(parsed, name), equal_nan=dtype is np.float64)
+        assert not getattr(cached, name).flags.writeable
+
+def test_edited_csv_gets_a_new_entry(csv_copy):
+    before = load_hospitals(csv_copy)
+    csv_copy.write_text(csv_copy.read_text().replace('AdCare Hospital,Worcester,114', 'AdCare Hospital,Worcester,115'))
+    after = load_hospitals(csv_copy)
+    assert after.staffed_beds[0] == before.staffed_beds[0] + 1
+    assert len(list((csv_copy.parent / 'cache').iterdir())) == 2
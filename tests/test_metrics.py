@@ -0,0 +1,53 @@
+################################################################################################################################################
+'''StreamingLog rollups agree with the full EventLog they replace'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.metrics import LOG_SERIES, StreamingLog, Welford
+from icu_sim.simulation import run_simulation
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=400, days=3)
+
+@pytest.fixture(scope='module')
+def runs():
+    # The same seed gives the same cohort and decisions, only the logs differ
+    return run_simulation(CONFIG, seed=4), run_simulation(CONFIG, seed=4, metrics=60)
+
+@pytest.mark.parametrize('resolution', [60, 24 * 60])
+@pytest.mark.parametrize('name', LOG_SERIES)
+def test_series_match_event_log_at_the_resolution(runs, name, resolution):
+    full, _ = runs
+    for policy, run in full.runs.items():
+        streaming = StreamingLog(CONFIG.m, CONFIG.t_n, resolution)
+        for values in zip(*(getattr(run.log, field) for field in ('times',) + LOG_SERIES)):
+            streaming.record(*values)
+        expected = run.log.series(name, CONFIG.t_n, resolution)
+        assert np.array_equal(streaming.series(name, CONFIG.t_n, resolution), expected)
+        assert np.array_equal(streaming.series(name, CONFIG.t_n, 2 * resolution), expected[::2])
+
+def test_engine_streaming_logs_match_event_logs(runs):
+    full, streamed = runs
+    for policy in full.runs:
+        event_log, streaming = full[policy].log, streamed[policy].log
+        assert isinstance(streaming, StreamingLog)
+        assert np.array_equal(streamed[policy].decision, full[policy].decision)
+        for name in LOG_SERIES:
+            assert np.array_equal(streaming.series(name, CONFIG.t_n, 60), event_log.series(name, CONFIG.t_n, 60))
+        # Per-minute values are what the beds hold for that minute, so the time-weighted means are plain means
+        beds = event_log.series('beds', CONFIG.t_n)
+        assert np.allclose(streaming.beds_mean, beds.reshape(-1, 60).mean(axis=1))
+        assert streaming.occupancy.total == CONFIG.t_n
+        assert streaming.occupancy.mean() == pytest.approx(CONFIG.m - beds.mean())
+
+def test_welford_merge_matches_one_pass():
+    values = np.random.default_rng(0).gamma(2.0, size=1000)
+    whole, left, right = Welford(), Welford(), Welford()
+    whole.add_many(values)
+    left.add_many(values[:300])
+    right.add_many(values[300:])
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.mean == pytest.approx(values.mean())
+    assert left.variance(ddof=1) == pytest.approx(whole.variance(ddof=1))
@@ -0,0 +1,49 @@
+################################################################################################################################################
+'''A one-hospital network decides like the engine, and every patient of a network run is accounted for'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.hospitals import HospitalTable
+from icu_sim.network import HospitalNetwork, Routing, simulate_network
+from icu_sim.patients import ACCEPTED, UNDECIDED
+from icu_sim.policies import make_policy
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(days=3)
+
+def network(beds, discharges, cities):
+    # 5-day average stays; arrivals are scaled so every hospital is congested
+    days = 5 * np.asarray(discharges, dtype=float)
+    table = HospitalTable([f'H{h}' for h in range(len(beds))], cities, beds, discharges, days)
+    return HospitalNetwork(table, CONFIG, arrival_scale=4.0)
+
+@pytest.mark.parametrize('policy', ['utility', 'fcfs'])
+def test_one_hospital_network_matches_the_engine(policy):
+    net = network([40], [365 * 30], ['A'])
+    patients, origin = net.cohort(RandomStreams(6))
+    run = simulate_network(net, patients, origin, policy)
+    m = int(net.capacity[0])
+    single = simulate_policies(patients, m, CONFIG.t_n, {policy: make_policy(policy, CONFIG.replace(m=m))})[policy]
+    assert np.array_equal(run.decision, single.decision)
+    assert run.total_u_captured == pytest.approx(single.total_u_captured, rel=1e-9)
+    assert run.net_utility == pytest.approx(single.net_utility, rel=1e-9)
+    assert run.total_in_transit == 0
+
+def test_every_patient_is_decided_or_in_transit():
+    net = network([10, 40, 25], [365 * 20, 365 * 10, 365 * 15], ['A', 'A', 'B'])
+    patients, origin = net.cohort(RandomStreams(9))
+    run = simulate_network(net, patients, origin, 'utility', Routing.statewide(len(net), max_transfers=2, delay=240))
+    assert run.transfers_out.sum() > 0 and run.total_in_transit > 0
+    assert np.sum(run.decision == UNDECIDED) == run.total_in_transit
+    assert run.transfers_in.sum() + run.total_in_transit == run.transfers_out.sum()
+    assert np.array_equal(np.bincount(run.placed[run.decision == ACCEPTED], minlength=len(net)), run.admitted)
+    assert sum(row['in_transit'] for row in run.hospital_summary(net)) == run.total_in_transit
+
+def test_routing_never_returns_to_the_origin():
+    routing = Routing.statewide(3)
+    board = np.array([5, 0, 9])
+    dest = routing.route(np.array([0, 1, 1]), np.array([0, 2, 1]), board)
+    assert dest.tolist() == [2, 0, 2]
@@ -0,0 +1,22 @@
+################################################################################################################################################
+'''Columnar patient store'''
+################################################################################################################################################
+import numpy as np
+from icu_sim.patients import PatientTable
+################################################################################################################################################
+'''Tests'''
+def test_columns_are_compact_arrays():
+    patients = PatientTable(severity=[0, 2, 1], age=[3, 0, 1], arrival_time=[5, 0, 9], dispatch_time=[65, 40, 100],
+                            u=[0.9, 0.1, 0.5])
+    assert len(patients) == 3
+    assert patients.id.tolist() == [0, 1, 2]
+    dtypes = {name: getattr(patients, name).dtype for name in ('id', 'severity', 'age', 'arrival_time', 'dispatch_time', 'u')}
+    assert dtypes == {'id': np.int32, 'severity': np.int8, 'age': np.int8, 'arrival_time': np.int32,
+                      'dispatch_time': np.int32, 'u': np.float32}
+    assert patients.nbytes == 3 * (4 + 1 + 1 + 4 + 4 + 4)
+    assert patients.u.tolist() == np.float32([0.9, 0.1, 0.5]).tolist()
+
+def test_columns_are_not_copied_from_typed_arrays():
+    arrival = np.array([0, 1, 2], dtype=np.int32)
+    patients = PatientTable(np.zeros(3, np.int8), np.zeros(3, np.int8), arrival, arrival + 30, np.ones(3, np.float32))
+    assert patients.arrival_time is arrival
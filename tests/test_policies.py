@@ -0,0 +1,67 @@
+################################################################################################################################################
+'''Every registered policy builds from a SimConfig and decides a batch of same-minute arrivals'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.patients import ACCEPTED, AGE_GROUPS, SEVERITIES
+from icu_sim.policies import POLICY_REGISTRY, AdmissionPolicy, AgeWeightedPolicy, make_policy
+from icu_sim.streams import RandomStreams
+from icu_sim.thresholds import acceptance_thresholds
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=400, days=2)
+
+@pytest.fixture(scope='module')
+def patients():
+    return CONFIG.cohort(RandomStreams(4))
+
+@pytest.mark.parametrize('name', sorted(POLICY_REGISTRY))
+def test_make_policy_builds_every_registered_name(patients, name):
+    policy = make_policy(name, SimConfig())
+    arrivals = np.arange(8)
+    admit = np.asarray(policy.decide(patients, arrivals, 3, 10, 0), dtype=bool)
+    assert admit.shape == arrivals.shape and admit.sum() <= 3
+    assert not np.any(policy.decide(patients, arrivals, 0, 10, 0))
+
+def test_unknown_policy():
+    with pytest.raises(ValueError, match='Unknown policy'):
+        make_policy('lottery')
+
+def test_policy_without_decide_cannot_be_built():
+    class Undecided(AdmissionPolicy):
+        pass
+    with pytest.raises(TypeError):
+        Undecided()
+
+def test_fcfs_admits_the_first_arrivals(patients):
+    assert list(make_policy('fcfs').decide(patients, np.arange(5), 2, 10, 0)) == [True, True, False, False, False]
+
+def test_unit_age_weights_match_the_threshold_rule(patients):
+    runs = simulate_policies(patients, CONFIG.m, CONFIG.t_n, {name: make_policy(name, CONFIG) for name in ('utility', 'age_weighted')})
+    assert np.array_equal(runs['utility'].decision, runs['age_weighted'].decision)
+    assert np.array_equal(make_policy('age_weighted', CONFIG).weights, np.ones(len(AGE_GROUPS)))
+
+def test_zero_weight_group_is_never_admitted(patients):
+    weights = np.ones(len(AGE_GROUPS))
+    weights[0] = 0
+    policy = AgeWeightedPolicy(acceptance_thresholds(CONFIG.m, CONFIG.e, CONFIG.base_threshold), weights)
+    run = simulate_policies(patients, CONFIG.m, CONFIG.t_n, {'aw': policy})['aw']
+    assert (patients.age == 0).any() and np.all(run.decision[patients.age == 0] != ACCEPTED)
+
+def test_severity_priority_serves_most_severe_first(patients):
+    # One arrival of each severity, least severe first; the single free bed goes to the urgent one
+    arrivals = np.array([np.flatnonzero(patients.severity == code)[0] for code in reversed(range(len(SEVERITIES)))])
+    admit = make_policy('severity_priority', reserve=(0, 0, 0)).decide(patients, arrivals, 1, 10, 0)
+    assert admit == [False] * (len(SEVERITIES) - 1) + [True]
+
+def test_severity_priority_reserves_beds(patients):
+    policy = make_policy('severity_priority', reserve=(0.0, 0.0, 0.5))
+    least_severe = np.flatnonzero(patients.severity == len(SEVERITIES) - 1)[:1]
+    assert not any(policy.decide(patients, least_severe, 5, 10, 0))
+    assert all(policy.decide(patients, least_severe, 6, 10, 0))
+
+def test_batch_threshold_caps_admissions_at_free_beds(patients):
+    policy = make_policy('batch_threshold', thresholds=np.zeros(11))
+    assert list(policy.decide(patients, np.arange(6), 4, 10, 0)) == [True] * 4 + [False] * 2
@@ -0,0 +1,42 @@
+################################################################################################################################################
+'''Monte Carlo replications are independent of the worker count and match single runs'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.replications import METRICS, mean_ci, run_replication, run_replications
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=300, days=2)
+
+def test_workers_do_not_change_results():
+    serial = run_replications(CONFIG, 6, seed=5, workers=1)
+    parallel = run_replications(CONFIG, 6, seed=5, workers=2)
+    assert len(serial) == 6
+    for policy in serial.samples:
+        assert np.array_equal(serial.samples[policy], parallel.samples[policy])
+
+def test_replication_k_is_child_k_of_the_seed():
+    reps = run_replications(CONFIG, 3, seed=5, workers=1)
+    child = RandomStreams(5).spawn(3)[2]
+    single = run_replication(CONFIG, child)
+    for policy, totals in single.items():
+        assert np.array_equal(reps.samples[policy][2], totals)
+    # Different children draw different cohorts
+    assert not np.array_equal(reps.samples['fcfs'][0], reps.samples['fcfs'][1])
+
+def test_curves_fold_every_replication():
+    reps = run_replications(CONFIG, 4, seed=5, workers=1, resolution=60)
+    for policy in reps.samples:
+        assert reps.curves[policy].count == 4
+    # The mean captured curve only grows, up to the mean final total
+    mean, low, high = reps.curve('utility', 'captured')
+    assert len(mean) == CONFIG.t_n // 60 and np.all(low <= mean) and np.all(mean <= high)
+    assert np.all(np.diff(mean) >= 0) and mean[-1] <= reps.samples['utility'][:, METRICS.index('captured')].mean()
+
+def test_mean_ci_covers_the_mean():
+    values = np.random.default_rng(0).normal(10.0, 2.0, size=(4000, 2))
+    mean, low, high = mean_ci(values)
+    assert mean == pytest.approx([10.0, 10.0], abs=0.1)
+    assert high - low == pytest.approx(2 * 1.96 * values.std(axis=0, ddof=1) / np.sqrt(4000), rel=1e-3)
@@ -0,0 +1,51 @@
+################################################################################################################################################
+'''Decimated series keep their endpoints and, with minmax, every column's extremes'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.reporting import decimate, lttb, minmax_decimate
+################################################################################################################################################
+'''Helpers'''
+def walk(n: int, seed: int = 0):
+    # A random walk with a few one-sample spikes, the shape decimation must not flatten
+    rng = np.random.default_rng(seed)
+    y = rng.normal(size=n).cumsum()
+    spikes = rng.choice(n, size=5, replace=False)
+    y[spikes] += np.where(np.arange(5) % 2, 50.0, -50.0)
+    return y
+################################################################################################################################################
+'''Tests'''
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+@pytest.mark.parametrize('n', [5, 500, 2001, 43200])
+def test_endpoints_and_size(method, n):
+    y = walk(n)
+    x, values = decimate(y, 200, method)
+    assert len(x) <= 200
+    assert x[0] == 0 and x[-1] == n - 1
+    assert values[0] == y[0] and values[-1] == y[-1]
+    assert np.all(np.diff(x) > 0)
+    assert np.array_equal(values, y[x.astype(np.int64)])
+
+def test_minmax_keeps_every_column_extreme():
+    y = walk(43200)
+    points = 400
+    x, values = minmax_decimate(y, points)
+    assert values.max() == y.max() and values.min() == y.min()
+    width = -(-len(y) // ((points - 2) // 2))
+    for start in range(0, len(y), width):
+        column = y[start:start + width]
+        kept = values[(x >= start) & (x < start + width)]
+        assert column.max() in kept and column.min() in kept
+
+def test_minmax_passes_short_series_through():
+    y = walk(150)
+    x, values = minmax_decimate(y, 200)
+    assert np.array_equal(x, np.arange(150)) and np.array_equal(values, y)
+
+def test_lttb_keeps_explicit_x_and_spikes():
+    y = walk(10000, seed=1)
+    t = np.arange(len(y)) * 5.0 # e.g. minutes on a coarser grid
+    x, values = lttb(y, 500, x=t)
+    assert x[0] == t[0] and x[-1] == t[-1]
+    # The largest-triangle choice picks isolated spikes, which dominate their bucket's triangle areas
+    assert values.max() == y.max() and values.min() == y.min()
@@ -0,0 +1,62 @@
+################################################################################################################################################
+'''Resource pools never hold more patients than their capacity and account for every placement'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.patients import AT_HOME, POOLED, REJECTED
+from icu_sim.policies import make_policy
+from icu_sim.resources import AT_HOME_POOL, NO_POOL, ResourcePool
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=400, days=3)
+WARD = ResourcePool('ward', capacity=15, utility_range=(0.4, 1.0), factor=0.5) # slots held for the patient's ICU stay
+POOLS = (WARD, AT_HOME_POOL)
+UNLIMITED = (ResourcePool('ward', utility_range=WARD.utility_range, factor=WARD.factor), AT_HOME_POOL)
+
+@pytest.fixture(scope='module')
+def runs():
+    patients = CONFIG.cohort(RandomStreams(12))
+    policies = {'utility': make_policy('utility', CONFIG)}
+    limited = simulate_policies(patients, CONFIG.m, CONFIG.t_n, policies, pools=POOLS, rng=RandomStreams(12))['utility']
+    unlimited = simulate_policies(patients, CONFIG.m, CONFIG.t_n, policies, pools=UNLIMITED)['utility']
+    return patients, limited, unlimited
+
+def test_pool_never_exceeds_its_capacity(runs):
+    patients, run, unlimited = runs
+    ward = np.flatnonzero(run.pool_index == 0)
+    # Without a waitlist patients are placed on arrival and hold the slot for their ICU stay
+    events = np.concatenate([patients.arrival_time[ward], patients.dispatch_time[ward]])
+    change = np.concatenate([np.ones(len(ward)), -np.ones(len(ward))])
+    order = np.lexsort((change, events)) # discharges before placements in the same minute
+    assert np.cumsum(change[order]).max() == WARD.capacity
+    assert run.pools['ward']['turned_away'] > 0
+    assert run.pools['ward']['placed'] == len(ward) < np.sum(unlimited.pool_index == 0)
+    assert unlimited.pools['ward']['turned_away'] == 0
+
+def test_decision_codes_follow_the_pool(runs):
+    _, run, _ = runs
+    assert np.all(run.decision[run.pool_index == 0] == POOLED)
+    assert np.all(run.decision[run.pool_index == 1] == AT_HOME)
+    assert np.all(run.pool_index[run.decision == REJECTED] == NO_POOL)
+    assert np.all(run.pool_index[(run.decision != POOLED) & (run.decision != AT_HOME)] == NO_POOL)
+
+def test_recovered_utility_adds_up(runs):
+    patients, run, _ = runs
+    u = patients.u.astype(np.float64)
+    for p, pool in enumerate(POOLS):
+        placed = run.pool_index == p
+        assert run.pools[pool.name]['placed'] == placed.sum()
+        assert run.pools[pool.name]['utility'] == pytest.approx(pool.factor * u[placed].sum(), rel=1e-9)
+    assert run.total_pool_u == pytest.approx(sum(counts['utility'] for counts in run.pools.values()), rel=1e-12)
+    assert run.total_stay_at_home_u == pytest.approx(run.pools['at_home']['utility'], rel=1e-12)
+    assert run.net_utility == pytest.approx(run.total_u_captured + run.total_pool_u - run.total_u_rejected, rel=1e-12)
+
+def test_patients_turned_away_by_the_ward_fall_through(runs):
+    patients, run, unlimited = runs
+    # Utilities in both ranges go to the ward while it has room and home when it is full
+    both = (patients.u >= WARD.utility_range[0]) & (patients.u <= AT_HOME_POOL.utility_range[1])
+    assert not np.any(both & (unlimited.decision == AT_HOME))
+    assert 0 < np.sum(both & (run.decision == AT_HOME)) <= run.pools['ward']['turned_away']
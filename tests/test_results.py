@@ -0,0 +1,79 @@
+################################################################################################################################################
+'''open_results reads back what the sinks wrote, memory-mapped, and its group counts match pandas'''
+################################################################################################################################################
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.patients import AGE_GROUPS, DECISIONS
+from icu_sim.policies import make_policy
+from icu_sim.results import from_run, open_results
+from icu_sim.sinks import COLUMNAR_FORMAT, ColumnarSink, NpySink, open_sink
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=400, days=2)
+
+@pytest.fixture(scope='module')
+def run():
+    patients = CONFIG.cohort(RandomStreams(2))
+    run = simulate_policies(patients, CONFIG.m, CONFIG.t_n, {'utility': make_policy('utility', CONFIG)})['utility']
+    return patients, run
+
+def write(path, sink, patients):
+    with sink:
+        simulate_policies(patients, CONFIG.m, CONFIG.t_n, {'utility': make_policy('utility', CONFIG)}, {'utility': sink})
+    return open_results(path)
+
+def assert_same(results, expected):
+    for name in results.columns:
+        assert np.array_equal(results[name], expected[name]), name
+
+@pytest.mark.parametrize('ext, sink', [('.cols', ColumnarSink), ('.npy', NpySink)])
+def test_numpy_artifacts_are_memory_mapped(tmp_path, run, ext, sink):
+    patients, r = run
+    results = write(tmp_path / f'results{ext}', sink(tmp_path / f'results{ext}', 100), patients)
+    assert all(isinstance(column, np.memmap) or isinstance(column.base, np.memmap) for column in results.columns.values())
+    assert len(results) == int(np.sum(r.decision >= 0))
+    assert_same(results, from_run(r, patients))
+
+@pytest.mark.parametrize('chunk_size', [10 ** 6, 100])
+def test_arrow_round_trip(tmp_path, run, chunk_size):
+    pytest.importorskip('pyarrow')
+    patients, r = run
+    results = write(tmp_path / 'results.arrow', open_sink(tmp_path / 'results.arrow', chunk_size), patients)
+    assert_same(results, from_run(r, patients))
+
+def test_crosstab_matches_pandas(run):
+    patients, r = run
+    results = from_run(r, patients)
+    frame = results.to_frame()
+    counts = pd.crosstab(frame['age'], frame['decision'], dropna=False).reindex(index=AGE_GROUPS, columns=DECISIONS, fill_value=0)
+    assert np.array_equal(results.crosstab('age', 'decision'), counts.to_numpy())
+    u = results.crosstab('age', 'decision', weights='utility')
+    assert u.sum() == pytest.approx(float(results['utility'].astype(np.float64).sum()), rel=1e-9)
+    assert u[:, DECISIONS.index('ACCEPTED')].sum() == pytest.approx(r.total_u_captured, rel=1e-6)
+
+def test_select_and_where(run):
+    patients, r = run
+    results = from_run(r, patients)
+    accepted = results.select('utility', decision='ACCEPTED')
+    assert len(accepted) == results.counts('decision')[DECISIONS.index('ACCEPTED')]
+    assert np.array_equal(results.where(decision='ACCEPTED', age=AGE_GROUPS[-1]),
+                          (results['decision'] == DECISIONS.index('ACCEPTED')) & (results['age'] == len(AGE_GROUPS) - 1))
+
+def test_unsupported_file(tmp_path):
+    with pytest.raises(ValueError, match='Cannot memory-map'):
+        open_results(tmp_path / 'results.csv')
+
+def test_other_columnar_formats_are_rejected(tmp_path, run):
+    patients, _ = run
+    path = tmp_path / 'results.cols'
+    write(path, ColumnarSink(path), patients)
+    meta = json.loads((path / 'meta.json').read_text())
+    meta['format'] = COLUMNAR_FORMAT - 1
+    (path / 'meta.json').write_text(json.dumps(meta))
+    with pytest.raises(ValueError, match=f'only reads format {COLUMNAR_FORMAT}'):
+        open_results(path)
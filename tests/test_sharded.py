@@ -0,0 +1,50 @@
+################################################################################################################################################
+'''Sharded network runs are bit-identical to the single-process event loop'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.durations import GammaStay
+from icu_sim.hospitals import HospitalTable
+from icu_sim.network import HospitalNetwork, make_routing, simulate_network
+from icu_sim.resources import AT_HOME_POOL, ResourcePool
+from icu_sim.sharded import partition_by_city, same_run, simulate_network_sharded
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Fixtures'''
+def small_network(pools=None):
+    # Six small, busy hospitals in three cities, so transfers and full wards happen within two days
+    hospitals = HospitalTable(name=[f"H{h}" for h in range(6)], city=['A', 'A', 'B', 'B', 'B', 'C'],
+                              staffed_beds=[12, 8, 10, 6, 9, 14], total_discharges=np.full(6, 365 * 40.0),
+                              patient_days=np.full(6, 365 * 40.0 * 1.5))
+    return HospitalNetwork(hospitals, SimConfig(days=2, pools=pools))
+
+WARD = ResourcePool('ward', capacity=2, stay=GammaStay.from_moments(12 * 60, 0.5), utility_range=(0.5, 1.0), factor=0.5)
+################################################################################################################################################
+'''Tests'''
+@pytest.mark.parametrize('policy', ['utility', 'fcfs'])
+@pytest.mark.parametrize('routing', ['none', 'city', 'statewide'])
+def test_in_process_shards_match_single_process(policy, routing):
+    network = small_network()
+    patients, origin = network.cohort(RandomStreams(3))
+    routes = make_routing(routing, network, max_transfers=2)
+    single = simulate_network(network, patients, origin, policy, routes)
+    sharded = simulate_network_sharded(network, patients, origin, policy, routes, shards=3, parallel=False)
+    assert same_run(single, sharded)
+
+def test_worker_processes_match_single_process_with_pools():
+    network = small_network(pools=(WARD, AT_HOME_POOL))
+    patients, origin = network.cohort(RandomStreams(3))
+    routes = make_routing('statewide', network, max_transfers=2)
+    # Pool stays are drawn from the streams, so each run gets a fresh RandomStreams positioned at the start
+    single = simulate_network(network, patients, origin, 'utility', routes, rng=RandomStreams(3))
+    sharded = simulate_network_sharded(network, patients, origin, 'utility', routes, shards=2, rng=RandomStreams(3))
+    assert single.transfers_out.sum() > 0 and single.pool_full.sum() > 0
+    assert same_run(single, sharded)
+
+def test_partition_keeps_cities_whole():
+    network = small_network()
+    shard_of = partition_by_city(network, 2)
+    for city in np.unique(network.city_codes):
+        assert len(np.unique(shard_of[network.city_codes == city])) == 1
+    assert len(np.unique(shard_of)) == 2
@@ -0,0 +1,75 @@
+################################################################################################################################################
+'''Every results sink writes the same rows as the in-memory Run'''
+################################################################################################################################################
+import numpy as np
+import pandas as pd
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.engine import simulate_policies
+from icu_sim.patients import AGE_GROUPS, DECISIONS
+from icu_sim.policies import make_policy
+from icu_sim.sinks import RESULT_DTYPE, CSVSink, NpySink, TeeSink, open_sink
+from icu_sim.streams import RandomStreams
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=400, days=2)
+CHUNK = 100 # several chunks per run
+
+@pytest.fixture(scope='module')
+def expected():
+    patients = CONFIG.cohort(RandomStreams(2))
+    run = simulate_policies(patients, CONFIG.m, CONFIG.t_n, {'utility': make_policy('utility', CONFIG)})['utility']
+    return patients, run.results_frame(patients)
+
+def streamed(patients, sink):
+    with sink:
+        run = simulate_policies(patients, CONFIG.m, CONFIG.t_n, {'utility': make_policy('utility', CONFIG)}, {'utility': sink})['utility']
+    assert run.remaining_beds is None and sink.rows_written == int(np.sum(run.decision >= 0))
+
+def coded(frame):
+    '''The sink layout: RESULT_DTYPE columns with integer age and decision codes'''
+    frame = frame.copy()
+    for name in ('age', 'decision'):
+        if isinstance(frame[name].dtype, pd.CategoricalDtype):
+            frame[name] = frame[name].cat.codes
+    return frame[list(RESULT_DTYPE.names)].astype({name: RESULT_DTYPE[name] for name in RESULT_DTYPE.names})
+
+def assert_same(frame, expected):
+    pd.testing.assert_frame_equal(coded(frame).reset_index(drop=True), coded(expected).reset_index(drop=True))
+
+def test_csv_round_trip(tmp_path, expected):
+    patients, frame = expected
+    streamed(patients, CSVSink(tmp_path / 'results.csv', CHUNK))
+    written = pd.read_csv(tmp_path / 'results.csv')
+    written['age'] = pd.Categorical(written['age'], AGE_GROUPS)
+    written['decision'] = pd.Categorical(written['decision'], DECISIONS)
+    assert_same(written, frame)
+
+def test_npy_round_trip(tmp_path, expected):
+    patients, frame = expected
+    streamed(patients, NpySink(tmp_path / 'results.npy', CHUNK))
+    data = np.load(tmp_path / 'results.npy', mmap_mode='r')
+    assert data.dtype == RESULT_DTYPE
+    assert_same(pd.DataFrame(np.asarray(data)), frame)
+
+@pytest.mark.parametrize('ext', ['.arrow', '.parquet'])
+def test_arrow_round_trip(tmp_path, expected, ext):
+    pytest.importorskip('pyarrow')
+    patients, frame = expected
+    streamed(patients, open_sink(tmp_path / f'results{ext}', CHUNK))
+    read = pd.read_parquet if ext == '.parquet' else pd.read_feather
+    assert_same(read(tmp_path / f'results{ext}'), frame)
+
+def test_tee_writes_every_sink(tmp_path, expected):
+    patients, frame = expected
+    streamed(patients, TeeSink(NpySink(tmp_path / 'a.npy'), CSVSink(tmp_path / 'b.csv'), chunk_size=CHUNK))
+    assert_same(pd.DataFrame(np.load(tmp_path / 'a.npy')), frame)
+    assert len(pd.read_csv(tmp_path / 'b.csv')) == len(frame)
+
+def test_empty_csv_has_a_header(tmp_path):
+    CSVSink(tmp_path / 'empty.csv').close()
+    assert list(pd.read_csv(tmp_path / 'empty.csv').columns) == list(RESULT_DTYPE.names)
+
+def test_unknown_extension(tmp_path):
+    with pytest.raises(ValueError, match='No results sink'):
+        open_sink(tmp_path / 'results.xlsx')
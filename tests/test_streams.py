@@ -0,0 +1,71 @@
+################################################################################################################################################
+'''Named streams and spawned children depend only on the seed and their name, never on what else drew numbers'''
+################################################################################################################################################
+import pickle
+import numpy as np
+import pytest
+from icu_sim.config import SimConfig
+from icu_sim.policies import AdmissionPolicy
+from icu_sim.simulation import run_simulation
+from icu_sim.streams import RandomStreams, stream
+################################################################################################################################################
+'''Helpers'''
+class CoinPolicy(AdmissionPolicy):
+    '''Admits each arrival with probability 1/2 while beds are free'''
+    def decide(self, patients, arrivals, beds, capacity, t):
+        coin = self.rng.random(len(arrivals)) < 0.5
+        return coin & (np.cumsum(coin) <= beds)
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=300, days=2)
+
+def test_same_seed_same_draws():
+    a, b = RandomStreams(7), RandomStreams(7)
+    for name in ('patients', 'arrivals', 'durations'):
+        assert np.array_equal(a.generator(name).random(5), b.generator(name).random(5))
+    assert not np.array_equal(RandomStreams(7).generator('patients').random(5), RandomStreams(8).generator('patients').random(5))
+
+def test_streams_do_not_depend_on_order():
+    a, b = RandomStreams(7), RandomStreams(7)
+    a.generator('patients').random(1000)
+    assert np.array_equal(a.generator('arrivals').random(5), b.generator('arrivals').random(5))
+    assert not np.array_equal(RandomStreams(7).generator('arrivals').random(5), RandomStreams(7).generator('durations').random(5))
+    assert not np.array_equal(RandomStreams(7).generator('policies', key='a').random(5), RandomStreams(7).generator('policies', key='b').random(5))
+
+def test_generator_continues_the_stream():
+    streams = RandomStreams(7)
+    first, second = streams.generator('durations').random(3), streams.generator('durations').random(3)
+    assert np.array_equal(np.concatenate([first, second]), RandomStreams(7).generator('durations').random(6))
+
+def test_spawn_is_deterministic_and_distinct():
+    children = RandomStreams(7).spawn(4)
+    again = RandomStreams(7).spawn(2, start=2)
+    assert np.array_equal(children[2].generator('patients').random(5), again[0].generator('patients').random(5))
+    draws = [child.generator('patients').random() for child in RandomStreams(7).spawn(4)]
+    branch = RandomStreams(7).branch(0).generator('patients').random()
+    assert len(set(draws + [branch])) == 5
+
+def test_pickled_streams_restart():
+    streams = RandomStreams(7)
+    streams.generator('arrivals').random(10)
+    copy = pickle.loads(pickle.dumps(streams))
+    assert np.array_equal(copy.generator('arrivals').random(5), RandomStreams(7).generator('arrivals').random(5))
+
+def test_unknown_stream_and_plain_generators():
+    with pytest.raises(ValueError, match='Unknown stream'):
+        RandomStreams(7).generator('weather')
+    rng = np.random.default_rng(0)
+    assert stream(rng, 'patients') is rng
+
+def test_stay_model_leaves_arrivals_and_utilities_alone():
+    default = CONFIG.cohort(RandomStreams(3))
+    gamma = CONFIG.replace(stay_model='gamma').cohort(RandomStreams(3))
+    for name in ('severity', 'age', 'arrival_time', 'u'):
+        assert np.array_equal(getattr(default, name), getattr(gamma, name))
+    assert not np.array_equal(default.dispatch_time, gamma.dispatch_time)
+
+def test_adding_a_policy_does_not_change_the_others():
+    alone = run_simulation(CONFIG, {'coin': CoinPolicy()}, seed=3)
+    together = run_simulation(CONFIG, {'other': CoinPolicy(), 'coin': CoinPolicy(), 'fcfs': 'fcfs'}, seed=3)
+    assert np.array_equal(alone.runs['coin'].decision, together.runs['coin'].decision)
+    assert not np.array_equal(together.runs['coin'].decision, together.runs['other'].decision)
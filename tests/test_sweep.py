@@ -0,0 +1,49 @@
+################################################################################################################################################
+'''Sweep grid points equal single runs on the same cohorts'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.cache import RunCache
+from icu_sim.config import SimConfig
+from icu_sim.simulation import run_simulation
+from icu_sim.streams import RandomStreams
+from icu_sim.sweep import refine, sweep
+################################################################################################################################################
+'''Tests'''
+CONFIG = SimConfig(m=60, n_day=300, days=2)
+GRID = {'e': [1.0, 1.003], 'm': [40, 60]}
+
+@pytest.fixture(scope='module')
+def result():
+    return sweep(CONFIG, GRID, 2, seed=9, workers=1)
+
+def test_points_match_single_runs(result):
+    assert result.points == [{'e': 1.0, 'm': 40}, {'e': 1.0, 'm': 60}, {'e': 1.003, 'm': 40}, {'e': 1.003, 'm': 60}]
+    for r, child in enumerate(RandomStreams(9).spawn(2)):
+        for k, point in enumerate(result.points):
+            single = run_simulation(CONFIG.replace(**point), seed=child)
+            assert result.net[k, r] == pytest.approx(single['utility'].net_utility, rel=1e-12)
+            assert result.fcfs[k, r] == pytest.approx(single['fcfs'].net_utility, rel=1e-12)
+
+def test_workers_and_cache_do_not_change_results(result, tmp_path):
+    pooled = sweep(CONFIG, GRID, 2, seed=9, workers=2)
+    cache = RunCache(str(tmp_path))
+    first = sweep(CONFIG, GRID, 2, seed=9, workers=1, cache=cache)
+    entries = len(cache.entries())
+    cached = sweep(CONFIG, GRID, 2, seed=9, workers=1, cache=cache)
+    assert entries > 0 and len(cache.entries()) == entries
+    for other in (pooled, first, cached):
+        assert np.array_equal(other.net, result.net) and np.array_equal(other.fcfs, result.fcfs)
+
+def test_summary_and_surface(result):
+    rows = result.summary()
+    best = result.best()
+    assert max(rows, key=lambda row: row['difference'])['e'] == best['e']
+    xs, ys, Z = result.surface('e', 'm')
+    assert xs == [1.0, 1.003] and ys == [40, 60]
+    assert np.allclose(Z.ravel(), result.difference.mean(axis=1))
+
+def test_refine_stays_inside_the_bounds():
+    history = refine(CONFIG, {'e': (1.0, 1.004)}, 1, rounds=2, points=3, seed=9, workers=1)
+    assert len(history) == 2
+    assert all(1.0 <= point['e'] <= 1.004 for round_ in history for point in round_.points)
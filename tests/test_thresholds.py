@@ -0,0 +1,48 @@
+################################################################################################################################################
+'''The closed-form schedule equals the scripts' backward recurrence, and accept() is the per-patient rule'''
+################################################################################################################################################
+import numpy as np
+import pytest
+from icu_sim.thresholds import ThresholdSchedule, acceptance_thresholds
+################################################################################################################################################
+'''Reference'''
+def recurrence(m, e, base):
+    '''sim.py's loop: thresholds[m] = base, thresholds[i] = thresholds[i+1] * e * (1 + 1/(m+1))'''
+    thresholds = {m: base}
+    for i in range(m - 1, -1, -1):
+        thresholds[i] = thresholds[i + 1] * e * (1 + 1 / (m + 1))
+    return thresholds
+################################################################################################################################################
+'''Tests'''
+@pytest.mark.parametrize('m, e, base', [(1, 1.0, 0.1), (60, 1.0, 0.1), (175, 1.003, 0.1), (300, 0.999, 0.05)])
+def test_closed_form_matches_recurrence(m, e, base):
+    schedule = acceptance_thresholds(m, e, base)
+    expected = recurrence(m, e, base)
+    assert len(schedule) == m + 1 and schedule.m == m
+    assert schedule.values == pytest.approx([expected[x] for x in range(m + 1)], rel=1e-12)
+    # A dict from the recurrence builds the same schedule
+    assert ThresholdSchedule(expected).values == pytest.approx(schedule.values, rel=1e-12)
+
+def test_accept_is_the_scalar_rule():
+    schedule = acceptance_thresholds(20, 1.01, 0.1)
+    rng = np.random.default_rng(0)
+    u = rng.uniform(0, 1, 1000)
+    beds = rng.integers(0, 21, 1000)
+    expected = [beds_ > 0 and u_ > schedule[beds_] for u_, beds_ in zip(u.tolist(), beds.tolist())]
+    assert np.array_equal(schedule.accept(u, beds), expected)
+    assert not schedule.accept(1e9, 0)
+
+@pytest.mark.parametrize('build', [ThresholdSchedule.linear, ThresholdSchedule.logistic])
+def test_schedules_rise_as_beds_fill(build):
+    values = build(40, full=0.1, empty=1.0).values
+    assert np.all(np.diff(values) <= 0)
+    assert 0.1 <= values[-1] < 0.2 and 0.8 < values[0] <= 1.0
+
+def test_from_decisions_recovers_a_schedule():
+    truth = ThresholdSchedule.linear(10, full=0.2, empty=0.8)
+    rng = np.random.default_rng(1)
+    free_beds = rng.integers(1, 11, 20000)
+    u = rng.uniform(0, 1, 20000)
+    learned = ThresholdSchedule.from_decisions(10, free_beds, u, truth.accept(u, free_beds))
+    assert learned.values[1:] == pytest.approx(truth.values[1:], abs=0.01)
+    assert np.all(np.diff(learned.values) <= 0)
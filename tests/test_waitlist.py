@@ -0,0 +1,86 @@
+################################################################################################################################################
+'''IndexedHeap, WaitQueue reneging and the engine's waitlist admissions'''
+################################################################################################################################################
+import random
+import numpy as np
+import pytest
+from icu_sim.engine import simulate_policies
+from icu_sim.patients import ACCEPTED, AT_HOME, PatientTable
+from icu_sim.policies import make_policy
+from icu_sim.resources import AT_HOME_FACTOR
+from icu_sim.waitlist import IndexedHeap, Waitlist, WaitQueue
+################################################################################################################################################
+'''Indexed Heap'''
+def test_indexed_heap_matches_a_sorted_reference():
+    rng = random.Random(0)
+    heap, reference = IndexedHeap(), {}
+    for _ in range(20000):
+        r = rng.random()
+        if r < 0.45 or not reference:
+            item = rng.randrange(10 ** 6)
+            if item not in reference:
+                reference[item] = rng.random()
+                heap.push(item, reference[item])
+        elif r < 0.65:
+            key, item = heap.pop()
+            assert key == min(reference.values()) == reference.pop(item)
+        elif r < 0.85:
+            item = rng.choice(list(reference))
+            assert heap.remove(item) == reference.pop(item)
+        else:
+            item = rng.choice(list(reference))
+            reference[item] = rng.random()
+            heap.update(item, reference[item])
+        assert len(heap) == len(reference)
+        if reference:
+            assert heap.peek()[0] == min(reference.values())
+    assert sorted(heap.items()) == sorted((key, item) for item, key in reference.items())
+
+def test_indexed_heap_rejects_duplicates():
+    heap = IndexedHeap()
+    heap.push('a', 1)
+    with pytest.raises(KeyError):
+        heap.push('a', 2)
+################################################################################################################################################
+'''Wait Queue'''
+def test_queue_reneges_by_deadline_and_admits_by_priority():
+    # Patience per severity: urgent patients wait 100 minutes, non-urgent ones 20
+    queue = WaitQueue(Waitlist('utility', patience=(100, 50, 20)))
+    for i, (t, u, severity) in enumerate([(0, 0.2, 2), (5, 0.9, 0), (10, 0.5, 1), (12, 0.7, 2)]):
+        assert queue.push(i, t, u, severity)
+    assert queue.next_deadline() == 20
+    assert queue.renege() == (20, 0)
+    # The best waiting patient gets the next bed and no longer has a deadline
+    assert queue.pop() == 1
+    assert queue.next_deadline() == 32
+    assert queue.renege() == (32, 3)
+    assert queue.renege() == (60, 2)
+    assert len(queue) == 0 and queue.next_deadline() is None
+    assert queue.stats() == {'admitted': 1, 'reneged': 3, 'waiting': 0, 'longest': 4}
+
+def test_full_queue_turns_patients_away():
+    queue = WaitQueue(Waitlist('wait', patience=np.inf, capacity=2))
+    assert queue.push(0, 0, 0.5, 0) and queue.push(1, 1, 0.5, 0)
+    assert not queue.push(2, 2, 0.5, 0)
+    assert queue.next_deadline() is None
+    assert [queue.pop(), queue.pop()] == [0, 1]
+################################################################################################################################################
+'''Engine'''
+def test_engine_admits_from_the_waitlist_and_records_admission_times():
+    # One bed. A holds it until 100; B (non-urgent, 50 minutes of patience) reneges at 60 into the at-home program;
+    # C and D wait, C (higher utility) gets A's bed at 100 and D gets C's at 130
+    patients = PatientTable(severity=[0, 2, 0, 1], age=[0, 1, 2, 3], arrival_time=[0, 10, 20, 30],
+                            dispatch_time=[100, 40, 50, 40], u=[0.9, 0.4, 0.8, 0.2])
+    run = simulate_policies(patients, 1, 200, {'fcfs': make_policy('fcfs')},
+                            waitlist=Waitlist('utility', patience=(1000, 1000, 50)))['fcfs']
+    assert run.decision.tolist() == [ACCEPTED, AT_HOME, ACCEPTED, ACCEPTED]
+    assert run.admission_time.tolist() == [0, -1, 100, 130]
+    assert run.waitlist == {'admitted': 2, 'reneged': 1, 'waiting': 0, 'longest': 3}
+    assert run.total_u_rejected == pytest.approx(0.4)
+    assert run.total_stay_at_home_u == pytest.approx(0.4 * AT_HOME_FACTOR)
+    assert run.log.series('beds', 200)[[0, 99, 100, 129, 130, 139, 140]].tolist() == [0, 0, 0, 0, 0, 0, 1]
+
+    frame = run.results_frame(patients)
+    assert frame['admission_time'].tolist() == [0, -1, 100, 130]
+    # Stays start at admission, so waitlisted patients leave a wait later than their cohort dispatch time
+    assert frame['dispatch_time'].tolist() == [100, 40, 130, 140]
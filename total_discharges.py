@@ -1,23 +1,12 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+from icu_sim.hospitals import HOSPITALS_CSV, load_hospitals
 
-df = pd.read_csv('patients.csv')
-print(df["Total Discharges"])
+def get_data(path=HOSPITALS_CSV):
+    '''patients.csv as a typed HospitalTable: every numeric column parsed once and cached (see icu_sim.hospitals)'''
+    return load_hospitals(path)
 
-df['Total Discharges'] = df['Total Discharges'].str.replace(',', '').astype(float)
+if __name__ == '__main__':
+    df = get_data()
+    print(df['Total Discharges'])
 
-def get_data():
-    print(df)
-    return df # For future use 
-
-plt.figure(figsize=(15, 8))
-plt.bar(df['Hospital Name'], df['Total Discharges'])
-
-plt.xticks(rotation=90)
-plt.xlabel('Hospital Name')
-plt.ylabel('Total Discharges')
-plt.title('Total Discharges by Hospital')
-
-plt.tight_layout()
-
-plt.show()
+    from icu_sim.plotting import plot_discharges
+    plot_discharges(df, show=True)